@@ -11,6 +11,7 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')
+# settings_asgi: LittleLemon.settings without persistent database connections
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings_asgi')
 
 application = get_asgi_application()
@@ -48,11 +48,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.metrics.MetricsMiddleware',  # first, so its latency covers the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'LittleLemonAPI.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,10 +82,60 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent writers (see LittleLemonAPI/database.py):
+# WAL lets reads run alongside the writer, synchronous=NORMAL is durable in WAL
+# mode except on power loss, and a 64 MB page cache plus 256 MB of memory-mapped
+# I/O keep hot pages out of read() calls.
+SQLITE_PRAGMAS = [
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'cache_size=-65536',
+    'mmap_size=268435456',
+    'temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse a thread's connection across requests (and its pragmas and page cache).
+        # WSGI only: settings_asgi turns this off for the ASGI server
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+            # Take the write lock at BEGIN, where waiting for it is safe, not at the first write
+            'transaction_mode': 'IMMEDIATE',
+            # Busy timeout: seconds to wait for another writer before "database is locked"
+            'timeout': 5,
+        },
+    },
+}
+
+# Read replica for catalog, rating and order reads (LittleLemonAPI/replicas.py).
+# Locally a second SQLite file, copied from the primary by `manage.py sync_replica`.
+# Off until enabled: it also needs a shared cache (CACHES) for read-your-writes.
+READ_REPLICA_ENABLED = False
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': BASE_DIR / 'db.replica.sqlite3',
+    # Tests read the test database through it
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['LittleLemonAPI.replicas.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Holds the versioned catalog responses. Point this at a shared backend
+# (Redis/Memcached) when running several worker processes. Credentials and
+# roles are only cached in a shared backend (LittleLemonAPI.authentication, roles).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'littlelemon',
     }
 }
 
@@ -136,11 +188,14 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    # JWT/Token authentication with the credential -> user lookup cached (LittleLemonAPI.authentication)
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedJWTAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.permissions.IsAuthenticatedOrReadOnly'
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '2/minute',
@@ -0,0 +1,12 @@
+"""
+Settings for the ASGI server (LittleLemon/asgi.py).
+
+Persistent connections are only safe under WSGI: Django closes expired ones
+at request boundaries in the request's thread, but async views run their
+queries in other threads, where connections would never be closed. Under ASGI
+every connection is closed at the end of its request instead.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {alias: {**database, 'CONN_MAX_AGE': 0} for alias, database in DATABASES.items()}  # noqa: F405
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonAPI'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the signal receivers)
+        from . import tasks  # noqa: F401  (registers the background jobs)
+        post_migrate.connect(_install_menu_search, sender=self)
+
+
+def _install_menu_search(using, **kwargs):
+    from django.db import connections
+    from .search import install_menu_search
+    install_menu_search(connections[using])
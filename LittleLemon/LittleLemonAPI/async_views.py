@@ -0,0 +1,244 @@
+"""Async versions of the read-heavy endpoints, mounted under ``api/async/``.
+
+Each view borrows its DRF counterpart for everything that decides who may see
+what: authentication, permissions, throttles, content negotiation and the
+filter backends run exactly as in the sync view, and the JSON is identical.
+Only the data reads go through the async ORM, so a slow query does not hold a
+worker for the whole request when served by LittleLemon.asgi.
+
+DRF's request setup may query the database (token/session lookup, role
+lookup, validating ?category= and similar filters), so it runs in a worker
+thread whenever the request carries credentials or a query string.
+Anonymous catalog reads with no query string stay on the event loop. Only
+JSON is rendered: the browsable API needs sync template rendering.
+
+orders/events/ is ASGI-only: a server-sent event stream of order changes
+(see events.py), filtered with the same rules as the order endpoints.
+"""
+import asyncio
+import inspect
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import views
+from .caching import acached_catalog_response
+from .cart import summary_aggregates, summary_from_lines, with_cart_totals
+from .conditional import not_modified_response, set_validators
+from .events import broadcaster, encode_event, KEEPALIVE_SECONDS, RECONNECT_MILLISECONDS, STREAM_MAX_SECONDS
+from .fast_serializers import menu_item_rows, serialize_menu_items, order_rows, aserialize_orders, order_items_prefetch
+from .fast_serializers import ORDER_FIELDSET
+from .metrics import record_render
+from .renderers import EventStreamRenderer
+from .roles import get_roles
+from .models import MenuItem, Order
+from .serializers import CartSummarySerializer, MenuItemSerializer, OrderReadSerializer
+
+
+def _needs_thread(request):
+    """Whether DRF's request setup may touch the database."""
+    return (bool(request.GET) or 'HTTP_AUTHORIZATION' in request.META
+            or settings.SESSION_COOKIE_NAME in request.COOKIES)
+
+
+def _initial(view, request):
+    view.initial(request, *view.args, **view.kwargs)
+
+
+def _filtered(view, request):
+    _initial(view, request)
+    return view.filter_queryset(view.get_queryset())
+
+
+async def _serve(view_class, request, handler, prepare=_filtered, renderers=(JSONRenderer,), **kwargs):
+    """Dispatch like ``view_class.as_view()`` would, with ``handler`` as the async GET handler.
+
+    ``prepare(view, request)`` runs the sync part (DRF's initial() and usually
+    the filtered queryset); its result is passed to ``handler``.
+    """
+    view = view_class(renderer_classes=list(renderers))
+    view.setup(request, **kwargs)
+    drf_request = view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    try:
+        if _needs_thread(request):
+            state = await sync_to_async(prepare)(view, drf_request)
+        else:
+            state = prepare(view, drf_request)
+        if request.method not in ('GET', 'HEAD'):
+            raise MethodNotAllowed(request.method)
+        response = await handler(view, drf_request, state)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return _rendered(request, view.finalize_response(drf_request, response, **kwargs))
+
+
+def _rendered(request, response):
+    """Render here, on the event loop, and hand Django a plain HttpResponse.
+
+    A response with a render() method would be rendered by Django in a thread.
+    """
+    if not isinstance(response, Response):
+        return response
+    started = time.perf_counter()
+    response.render()
+    record_render(request, time.perf_counter() - started)
+    rendered = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        rendered[header] = value
+    return rendered
+
+
+async def _paginated(view, request, rows, serialize):
+    """list() on the async ORM. ``serialize`` may be a coroutine function (for its own queries)."""
+    page = None
+    if view.paginator is not None:
+        page = await view.paginator.apaginate_queryset(rows, request, view)
+    data = serialize(page if page is not None else [row async for row in rows])
+    if inspect.isawaitable(data):
+        data = await data
+    return view.get_paginated_response(data) if page is not None else Response(data)
+
+
+def _serializer(view):
+    return lambda page: view.get_serializer(page, many=True).data
+
+
+# Catalog
+
+async def menu_items(request):
+    async def handler(view, request, queryset):
+        fields = view.sparse_fields()
+        return await acached_catalog_response(request, lambda: _paginated(
+            view, request, menu_item_rows(queryset, fields), lambda page: serialize_menu_items(page, fields)), live=True)
+    return await _serve(views.MenuItemsView, request, handler)
+
+
+async def single_item(request, pk):
+    async def handler(view, request, queryset):
+        async def build():
+            item = await aget_object_or_404(queryset, pk=pk)
+            view.check_object_permissions(request, item)
+            return Response(view.get_serializer(item).data)
+        return await acached_catalog_response(request, build, live=True)
+    return await _serve(views.SingleItemView, request, handler, pk=pk)
+
+
+async def item_of_the_day(request):
+    async def handler(view, request, state):
+        return await acached_catalog_response(request, _item_of_the_day_response, live=True)
+    return await _serve(views.item_of_the_day.cls, request, handler, prepare=_initial)
+
+
+async def _item_of_the_day_response():
+    # Unordered on purpose, see views._item_of_the_day_response
+    items = [item async for item in MenuItem.objects.filter(is_item_of_the_day=True).select_related('category')[:1]]
+    if not items:
+        return Response({'detail': 'No item of the day set.'}, status=404)
+    return Response(MenuItemSerializer(items[0]).data)
+
+
+async def categories(request):
+    async def handler(view, request, queryset):
+        return await acached_catalog_response(request, lambda: _paginated(view, request, queryset, _serializer(view)))
+    return await _serve(views.CategoriesView, request, handler)
+
+
+# Cart and orders
+
+async def cart_items(request):
+    async def handler(view, request, queryset):
+        mode = views.cart_summary_mode(request)
+        if mode == 'only':
+            summary = await queryset.aaggregate(**summary_aggregates())
+            return Response(CartSummarySerializer(summary).data)
+        if mode == 'include':
+            lines = [line async for line in with_cart_totals(queryset)]
+            return Response(views.cart_with_summary(view.get_serializer(lines, many=True).data, summary_from_lines(lines)))
+        return await _paginated(view, request, queryset, _serializer(view))
+    return await _serve(views.CartItemsView, request, handler)
+
+
+async def orders(request):
+    async def handler(view, request, queryset):
+        fields = view.sparse_fields()
+        return await _paginated(view, request, order_rows(queryset, fields), lambda page: aserialize_orders(page, fields))
+    return await _serve(views.OrdersView, request, handler)
+
+
+async def order_detail(request, pk):
+    async def handler(view, request, state):
+        user = request.user
+        fields = view.sparse_fields()
+        stamp = await Order.objects.filter(pk=pk).values_list('user_id', 'delivery_crew_id', 'updated_at').afirst()
+        if stamp is None:
+            raise Http404('No Order matches the given query.')
+        user_id, delivery_crew_id, updated_at = stamp
+        if user_id != user.id and not await sync_to_async(views.can_view_order)(user, user_id, delivery_crew_id):
+            return Response({"detail": "Not found."}, status=404)
+        etag, last_modified = views.order_validators(pk, updated_at)
+        not_modified = not_modified_response(request, etag, last_modified, private=True)
+        if not_modified is not None:
+            return not_modified
+        order = await aget_object_or_404(ORDER_FIELDSET.narrow(
+            Order.objects.select_related('user', 'delivery_crew').prefetch_related(order_items_prefetch()), fields), pk=pk)
+        response = Response(OrderReadSerializer(order, context={'fields': fields}).data)
+        return set_validators(request, response, etag, last_modified, private=True)
+    return await _serve(views.OrderDetailView, request, handler, prepare=_initial, pk=pk)
+
+
+def _subscriber(view, request):
+    _initial(view, request)
+    # Memoized on the user, so filtering the stream needs no queries
+    get_roles(request.user)
+
+
+def _may_see(user, event):
+    crew_ids = event.delivery_crew_ids or (None,)
+    return any(views.can_view_order(user, event.user_id, crew_id) for crew_id in crew_ids)
+
+
+async def _event_stream(user, last_event_id):
+    subscription, missed = await broadcaster.subscribe(last_event_id)
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    # The poller may be behind the client and deliver events it already has
+    sent = missed[-1].id if missed else (last_event_id or 0)
+    try:
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        for event in missed:
+            if _may_see(user, event):
+                yield encode_event(event)
+        while time.monotonic() < deadline:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Too far behind: end the stream, the client resumes from its Last-Event-ID
+                return
+            if event.id > sent and _may_see(user, event):
+                yield encode_event(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def order_events(request):
+    async def handler(view, request, state):
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID', ''))
+        except ValueError:
+            last_event_id = None
+        response = StreamingHttpResponse(_event_stream(request.user, last_event_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Proxies must not buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    return await _serve(views.OrdersView, request, handler, prepare=_subscriber,
+                        renderers=(JSONRenderer, EventStreamRenderer))
@@ -0,0 +1,132 @@
+"""Token and JWT authentication with the credential -> user lookup cached in process.
+
+TokenAuthentication loads the token row and its user on every request, and
+JWTAuthentication loads the user named by the token. These subclasses keep the
+result in a bounded LRU (AUTH_CACHE_SIZE entries, AUTH_CACHE_TTL seconds), so
+a repeat request needs no query.
+
+Each entry is checked against a per-user stamp in the cache.
+invalidate_user() bumps the stamp, which drops the user's entries in every
+worker. signals.py calls it when a token is deleted (djoser token/logout),
+when a refresh token is blacklisted (simplejwt TokenBlacklistView) and when
+the user is saved (deactivation, password change) or deleted.
+
+That only holds when every worker sees the same stamps, so nothing is cached
+unless CACHES['default'] is a shared backend (caching.is_shared_cache()). On
+LocMemCache a logout would reach one worker only; these classes then look up
+every request like their DRF parents.
+
+Callers get a copy of the cached User, so per-request state set on it (e.g.
+the roles memo) does not leak into later requests.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .caching import is_shared_cache
+
+AUTH_CACHE_SIZE = 10000
+AUTH_CACHE_TTL = 5 * 60
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded to ``maxsize`` entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_credentials = LRUCache(AUTH_CACHE_SIZE)
+
+
+def _stamp_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Forget every cached credential of ``user_id``, in all worker processes."""
+    # Outlives every entry, so an expired stamp can never match an old entry
+    cache.set(_stamp_key(user_id), time.time_ns(), AUTH_CACHE_TTL * 2)
+
+
+def clear_auth_cache():
+    _credentials.clear()
+
+
+def cached_credentials(kind, credential, load, user_id=None):
+    """Return ``load()``'s (user, auth) for ``credential``, cached until invalidated or expired.
+
+    ``load`` raises AuthenticationFailed for unknown credentials and inactive
+    users; failures are never cached. Pass ``user_id`` when the credential
+    names its user (JWT).
+    """
+    if not is_shared_cache():
+        return load()
+    key = (kind, credential)
+    entry = _credentials.get(key)
+    if entry is not None:
+        user, auth, stamp, expires = entry
+        if expires > time.monotonic() and cache.get(_stamp_key(user.pk)) == stamp:
+            return copy.copy(user), auth
+        _credentials.pop(key)
+    # Reading the stamp before the load means an invalidation racing with it
+    # leaves a stale-stamped entry, never a stale user under a fresh stamp
+    stamp = cache.get(_stamp_key(user_id)) if user_id is not None else None
+    user, auth = load()
+    if user_id is None:
+        # A token key only reveals its user once loaded
+        stamp = cache.get(_stamp_key(user.pk))
+    _credentials.set(key, (copy.copy(user), auth, stamp, time.monotonic() + AUTH_CACHE_TTL))
+    return user, auth
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        return cached_credentials('token', key, lambda: super(CachedTokenAuthentication, self).authenticate_credentials(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        load = lambda: (super(CachedJWTAuthentication, self).get_user(validated_token), None)
+        user, _ = cached_credentials('jwt', user_id, load, user_id=user_id)
+        return user
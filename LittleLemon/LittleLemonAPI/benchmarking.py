@@ -0,0 +1,83 @@
+"""Helpers shared by the benchmark management commands.
+
+Benchmarks never touch the configured database: they run against a scratch
+SQLite file created (and migrated) like a test database and removed afterwards.
+"""
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def scratch_database(alias='default'):
+    """Create a migrated throw-away database in a temporary file.
+
+    A file (rather than SQLite's in-memory test database) lets worker threads
+    open their own connections, like separate server workers would.
+    """
+    connection = connections[alias]
+    path = tempfile.NamedTemporaryFile(prefix='littlelemon-bench-', suffix='.sqlite3', delete=False).name
+    connection.settings_dict['TEST']['NAME'] = path
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # Test mirrors (the read replica) read the scratch database too, as in tests
+    mirrors = {other.alias: other.settings_dict['NAME'] for other in connections.all()
+               if other.settings_dict['TEST'].get('MIRROR') == alias}
+    for mirror in mirrors:
+        connections[mirror].close()
+        connections[mirror].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield path
+    finally:
+        for mirror, name in mirrors.items():
+            connections[mirror].close()
+            connections[mirror].settings_dict['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        for suffix in ('-wal', '-shm'):  # left behind by WAL journaling
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    """Latency percentiles (ms) and throughput for a list of durations in seconds."""
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+    }
+
+
+def compare_results(baseline, current, threshold_pct, noise_ms=1.0):
+    """Regressions of ``current`` against ``baseline`` (benchmark_endpoints JSON reports).
+
+    A scenario regresses when its p95 latency grew by more than ``threshold_pct``
+    percent (and more than ``noise_ms``), or when it runs more queries.
+    """
+    before = {result['label']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get(result['label'])
+        if old is None:
+            continue
+        if (result['p95_ms'] > old['p95_ms'] * (1 + threshold_pct / 100)
+                and result['p95_ms'] - old['p95_ms'] > noise_ms):
+            regressions.append(f"{result['label']}: p95 {old['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result['queries_max'] > old['queries_max']:
+            regressions.append(f"{result['label']}: queries {old['queries_max']} -> {result['queries_max']}")
+    return regressions
@@ -0,0 +1,204 @@
+"""Streaming bulk import/export of the menu catalog.
+
+Imports are read line by line from the request body and processed in batches:
+each batch is validated field by field without touching the database, then
+checked against the database with one query for categories and one for
+existing dish names, and written with bulk_create/bulk_update. Exports walk the
+table in primary-key chunks, so memory stays flat whatever the catalog size.
+"""
+import csv
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .caching import bump_catalog_version
+from .models import Category, MenuItem, OrderItem, normalize_name
+from .serializers import MenuItemImportRowSerializer
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+MENU_EXPORT_FIELDS = ['id', 'dish', 'price', 'stock', 'category_id', 'is_item_of_the_day']
+ORDER_EXPORT_FIELDS = ['order_id', 'user', 'delivery_crew', 'status', 'total', 'date',
+                       'item_id', 'menu_item', 'dish', 'quantity', 'unit_price', 'total_price']
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of rows of a values()/values_list() queryset in primary-key keyset chunks.
+
+    The queryset must select ``id`` first (values_list) or include it (values).
+    Each chunk is a separate short query, so no read transaction is held open
+    while the client downloads.
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk')[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+        last_id = last['id'] if isinstance(last, dict) else last[0]
+
+
+def chunked(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Like chunks(), one row at a time."""
+    for rows in chunks(queryset, chunk_size):
+        yield from rows
+
+
+def read_lines(stream, encoding='utf-8'):
+    for line in stream:
+        yield line.decode(encoding)
+
+
+def parse_rows(stream, fmt):
+    """Yield (line number, row dict or parse error message) from a CSV or NDJSON body."""
+    lines = read_lines(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, 'Invalid JSON.'
+            continue
+        yield number, row if isinstance(row, dict) else 'Each line must be a JSON object.'
+
+
+def import_menu_items(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Create or update menu items (matched by dish name, case-insensitively).
+
+    Returns ``{'created': n, 'updated': n, 'errors': [{'line': n, 'errors': {...}}]}``.
+    Valid rows are written even when other rows fail.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    state = {'categories': set(), 'seen_names': set()}
+    batch = []
+    for line, row in rows:
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            _import_batch(batch, state, result)
+            batch = []
+    if batch:
+        _import_batch(batch, state, result)
+    result['errors'].sort(key=lambda error: error['line'])
+    if result['created'] or result['updated']:
+        # bulk_create/bulk_update send no post_save
+        bump_catalog_version()
+    return result
+
+
+def _import_batch(batch, state, result):
+    valid = []
+    for line, row in batch:
+        if isinstance(row, str):
+            result['errors'].append({'line': line, 'errors': {'non_field_errors': [row]}})
+            continue
+        serializer = MenuItemImportRowSerializer(data=row)
+        if not serializer.is_valid():
+            result['errors'].append({'line': line, 'errors': serializer.errors})
+            continue
+        valid.append((line, serializer.validated_data))
+
+    # Set-based checks: one query for unknown categories, one for existing dishes
+    wanted = {data['category_id'] for _, data in valid} - state['categories']
+    if wanted:
+        state['categories'].update(Category.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+    names = {normalize_name(data['dish']) for _, data in valid}
+    existing = {item.name_normalized: item for item in MenuItem.objects.filter(name_normalized__in=names)}
+
+    to_create, to_update = [], []
+    for line, data in valid:
+        errors = {}
+        name = normalize_name(data['dish'])
+        if data['category_id'] not in state['categories']:
+            errors['category_id'] = [f"Invalid pk \"{data['category_id']}\" - object does not exist."]
+        if name in state['seen_names']:
+            errors['dish'] = ['Duplicate dish in this import.']
+        if errors:
+            result['errors'].append({'line': line, 'errors': errors})
+            continue
+        state['seen_names'].add(name)
+        item = existing.get(name)
+        if item is None:
+            item = MenuItem(name_normalized=name)
+            to_create.append(item)
+        else:
+            to_update.append(item)
+        item.name = data['dish']
+        item.price = data['price']
+        item.inventory = data['stock']
+        item.category_id = data['category_id']
+
+    with transaction.atomic():
+        MenuItem.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+        MenuItem.objects.bulk_update(to_update, ['name', 'price', 'inventory', 'category'], batch_size=IMPORT_BATCH_SIZE)
+    result['created'] += len(to_create)
+    result['updated'] += len(to_update)
+
+
+def export_menu_items(fmt):
+    """Yield the whole catalog as CSV or NDJSON lines."""
+    rows = chunked(MenuItem.objects.values_list('id', 'name', 'price', 'inventory', 'category_id', 'is_item_of_the_day'))
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(MENU_EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        record = dict(zip(MENU_EXPORT_FIELDS, row))
+        record['price'] = f"{record['price']:.2f}"
+        yield json.dumps(record) + '\n'
+
+
+def export_orders(orders, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield ``orders`` (a filtered Order queryset) with their lines as CSV or NDJSON.
+
+    Orders are read in keyset chunks of ``chunk_size`` and the lines of each
+    chunk with one more query. CSV has one row per order line (an order without lines gets one row
+    with empty line columns); NDJSON has one object per order, shaped like
+    OrderReadSerializer.
+    """
+    date_field = serializers.DateTimeField()
+    orders = orders.values('id', 'user__username', 'delivery_crew__username', 'status', 'total', 'date')
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(ORDER_EXPORT_FIELDS)
+    for chunk in chunks(orders, chunk_size):
+        lines = {}
+        items = (OrderItem.objects.filter(order_id__in=[order['id'] for order in chunk])
+                 .values_list('order_id', 'id', 'menu_item_id', 'menu_item__name', 'quantity', 'unit_price')
+                 .order_by('order_id', 'id'))
+        for order_id, *line in items:
+            lines.setdefault(order_id, []).append(line)
+        for order in chunk:
+            head = [order['id'], order['user__username'], order['delivery_crew__username'], order['status'],
+                    f"{order['total']:.2f}", date_field.to_representation(order['date'])]
+            order_lines = lines.get(order['id'], [])
+            if fmt == 'csv':
+                for item_id, menu_item, dish, quantity, unit_price in order_lines:
+                    yield writer.writerow(head + [item_id, menu_item, dish, quantity, f'{unit_price:.2f}', f'{unit_price * quantity:.2f}'])
+                if not order_lines:
+                    yield writer.writerow(head + [''] * 6)
+                continue
+            record = dict(zip(['id', 'user', 'delivery_crew', 'status', 'total', 'date'], head))
+            record['items'] = [
+                {'id': item_id, 'menu_item': menu_item, 'dish': dish, 'quantity': quantity,
+                 'unit_price': f'{unit_price:.2f}', 'total_price': f'{unit_price * quantity:.2f}'}
+                for item_id, menu_item, dish, quantity, unit_price in order_lines
+            ]
+            yield json.dumps(record) + '\n'
@@ -0,0 +1,211 @@
+"""Versioned response cache for the public catalog endpoints.
+
+Catalog reads (menu items, categories, item of the day) are cached as already
+serialized data, keyed on the full request URI (path + query string) and on a
+catalog version stamp. Every MenuItem/Category write bumps the version, which
+makes all previously cached entries unreachable; they simply expire later.
+
+The version stamp is a nanosecond timestamp rather than a counter, so losing it
+(cache restart, eviction) can never bring an old version back to life. It also
+serves as the ETag / Last-Modified of every catalog response (conditional.py).
+
+Stock and the rating aggregates change with every checkout and rating, so they
+are not versioned. Menu item responses are cached without trusting them: every
+request re-reads LIVE_FIELDS of the items it returns (one primary-key lookup),
+and their ETag covers those values. Lists filtered or ordered by a live column
+are not cached at all, since their membership and order depend on it.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+
+from .conditional import make_etag, not_modified_response, set_validators
+from .models import MenuItem
+
+CATALOG_VERSION_KEY = 'catalog:version'
+# Entries are invalidated by version bumps; the timeout only bounds memory use
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Menu item payload field -> column, for the columns checkouts and ratings write
+LIVE_FIELDS = {'stock': 'inventory', 'rating_count': 'rating_count', 'rating_sum': 'rating_sum',
+               'rating_avg': 'rating_avg'}
+# MenuItemFilterView parameters and MenuItemsView ordering fields on those columns
+LIVE_FILTERS = {'inventory_min', 'inventory_max', 'rating_min', 'rating_max', 'rating_count_min'}
+LIVE_ORDERINGS = {'inventory', 'rating_avg', 'rating_count'}
+
+
+def is_shared_cache():
+    """Whether the default cache is one store for every worker process.
+
+    LocMemCache lives in one process and DummyCache stores nothing. State that
+    must be invalidated everywhere at once (credentials, roles, replica pins)
+    is only cached in a shared backend.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # add() keeps the stamp another worker may have set in the meantime
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def catalog_cache_key(request, version):
+    """Key on scheme/host/path and the (order-independent) query string.
+
+    The host is part of the key because paginated payloads embed absolute
+    next/previous links.
+    """
+    query = request.GET.copy()
+    query_string = '&'.join(f'{k}={v}' for k in sorted(query) for v in sorted(query.getlist(k)))
+    uri = f'{request.scheme}://{request.get_host()}{request.path}?{query_string}'
+    digest = hashlib.md5(uri.encode()).hexdigest()
+    return f'catalog:{version}:{digest}'
+
+
+def catalog_validators(version):
+    """(ETag, Last-Modified timestamp) of any catalog response at ``version``."""
+    return make_etag('catalog', version), version / 1e9
+
+
+def reads_live_columns(request):
+    """Whether the menu items a request returns depend on stock or ratings."""
+    if LIVE_FILTERS.intersection(request.GET):
+        return True
+    return any(name.strip().lstrip('-') in LIVE_ORDERINGS for name in request.GET.get('ordering', '').split(','))
+
+
+def cached_catalog_response(request, build_response, live=False):
+    """Return a cached copy of ``build_response()`` for the current catalog version.
+
+    Only the response data and status are cached, so rendering still follows
+    the content negotiation of each request. Server errors are never cached.
+    Clients holding the current version get a 304 without any query.
+
+    ``live`` marks menu item responses: their LIVE_FIELDS are refreshed on
+    every request, and a 304 costs that one lookup.
+    """
+    if live:
+        if reads_live_columns(request):
+            return build_response()
+        version, key, cached = _live_lookup(request)
+        if cached is None:
+            return _live_store(request, build_response(), key, version)
+        status, data = cached
+        objects = _live_objects(data)
+        _refresh(objects, _live_rows(objects))
+        return _live_validators(request, Response(data, status=status), objects, version)
+    response, key, etag, last_modified = _lookup(request)
+    if response is not None:
+        return response
+    return _store(request, build_response(), key, etag, last_modified)
+
+
+async def acached_catalog_response(request, build_response, live=False):
+    """cached_catalog_response() for the async views; ``build_response`` is a coroutine function.
+
+    The cache is read with the sync API: the default LocMemCache never blocks,
+    while the async API would hop to a thread for every call.
+    """
+    if live:
+        if reads_live_columns(request):
+            return await build_response()
+        version, key, cached = _live_lookup(request)
+        if cached is None:
+            return _live_store(request, await build_response(), key, version)
+        status, data = cached
+        objects = _live_objects(data)
+        _refresh(objects, [row async for row in _live_rows(objects)])
+        return _live_validators(request, Response(data, status=status), objects, version)
+    response, key, etag, last_modified = _lookup(request)
+    if response is not None:
+        return response
+    return _store(request, await build_response(), key, etag, last_modified)
+
+
+def _lookup(request):
+    version = get_catalog_version()
+    etag, last_modified = catalog_validators(version)
+    key = catalog_cache_key(request, version)
+    response = not_modified_response(request, etag, last_modified)
+    if response is None:
+        cached = cache.get(key)
+        if cached is not None:
+            status, data = cached
+            response = set_validators(request, Response(data, status=status), etag, last_modified)
+    return response, key, etag, last_modified
+
+
+def _store(request, response, key, etag, last_modified):
+    if response.status_code < 500:
+        cache.set(key, (response.status_code, response.data), CATALOG_CACHE_TIMEOUT)
+    return set_validators(request, response, etag, last_modified)
+
+
+def _live_lookup(request):
+    version = get_catalog_version()
+    key = catalog_cache_key(request, version)
+    return version, key, cache.get(key)
+
+
+def _live_store(request, response, key, version):
+    objects = _live_objects(response.data)
+    # Without ids (e.g. ?fields=dish,stock) the live values can't be refreshed later
+    if response.status_code < 500 and all('id' in obj for obj in objects):
+        cache.set(key, (response.status_code, response.data), CATALOG_CACHE_TIMEOUT)
+    return _live_validators(request, response, objects, version)
+
+
+def _live_objects(data):
+    """The menu items of a payload (page, list or single item) that show live fields."""
+    objects = data.get('results', [data]) if isinstance(data, dict) else data
+    return [obj for obj in objects if isinstance(obj, dict) and not LIVE_FIELDS.keys().isdisjoint(obj)]
+
+
+def _live_rows(objects):
+    return MenuItem.objects.filter(pk__in=[obj['id'] for obj in objects]).values('id', *LIVE_FIELDS.values())
+
+
+def _refresh(objects, rows):
+    rows = {row['id']: row for row in rows}
+    for obj in objects:
+        # A deleted item bumps the version, so every cached item still exists
+        row = rows.get(obj['id'])
+        if row is not None:
+            for name in LIVE_FIELDS.keys() & obj.keys():
+                obj[name] = row[LIVE_FIELDS[name]]
+
+
+def _live_validators(request, response, objects, version):
+    """ETag from the version and the live values shown; no Last-Modified, they have no common timestamp."""
+    etag = make_etag('catalog', version, *[[obj.get(name) for name in ('id', *LIVE_FIELDS)] for obj in objects])
+    return not_modified_response(request, etag, None) or set_validators(request, response, etag, None)
+
+
+class CatalogCacheMixin:
+    """Serve list/retrieve GETs of catalog views through the versioned cache.
+
+    Set ``live_fields`` on menu item views (see cached_catalog_response).
+    """
+    live_fields = False
+
+    def list(self, request, *args, **kwargs):
+        return cached_catalog_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs),
+                                       self.live_fields)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_catalog_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs),
+                                       self.live_fields)
@@ -0,0 +1,107 @@
+"""Cart writes as set-based upserts, cart totals computed by the database.
+
+add_to_cart() inserts new lines and increments existing ones in a single
+INSERT ... ON CONFLICT (user, menu_item) DO UPDATE statement per batch, so
+concurrent adds of the same item can never lose an update and the number of
+queries does not grow with the number of lines. A write that finds the
+database locked is retried (database.retry_on_lock).
+
+with_cart_totals() annotates every line with the whole cart's totals through
+window functions, so the lines and the summary come back in one query;
+cart_summary() is the aggregate alone, for callers that only need the totals.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .database import retry_on_lock
+from .fieldsets import SparseFieldset
+from .models import CartItem
+
+# 5 parameters per line keeps a batch under SQLite's 999 variable limit
+UPSERT_BATCH_SIZE = 150
+
+# ?fields= of the cart endpoints (CartItemSerializer); dish is the only field that joins the menu item
+CART_ITEM_FIELDSET = SparseFieldset({
+    'id': ('id',),
+    'dish': ('menu_item__name',),
+    'quantity': ('quantity',),
+    'unit_price': ('unit_price',),
+    'total_price': ('quantity', 'unit_price'),
+})
+
+
+@retry_on_lock
+def add_to_cart(user, quantities, prices):
+    """Add ``quantities`` (menu item id -> quantity) to ``user``'s cart.
+
+    New lines snapshot ``prices`` (menu item id -> current price) as their
+    unit_price; existing lines keep theirs and only gain quantity.
+    """
+    opts = CartItem._meta
+    qn = connection.ops.quote_name
+    columns = [opts.get_field(name).column for name in ('user', 'menu_item', 'quantity', 'unit_price', 'added_at')]
+    user_column, menu_item_column, quantity_column = (qn(column) for column in columns[:3])
+    table = qn(opts.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    lines = [
+        (user.pk, menu_item_id, quantity, connection.ops.adapt_decimalfield_value(prices[menu_item_id], 6, 2), now)
+        for menu_item_id, quantity in sorted(quantities.items())
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(lines), UPSERT_BATCH_SIZE):
+            batch = lines[start:start + UPSERT_BATCH_SIZE]
+            values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(qn(column) for column in columns)}) VALUES {values} '
+                f'ON CONFLICT ({user_column}, {menu_item_column}) '
+                f'DO UPDATE SET {quantity_column} = {table}.{quantity_column} + excluded.{quantity_column}',
+                [param for line in batch for param in line],
+            )
+
+
+def _money():
+    return DecimalField(max_digits=10, decimal_places=2)
+
+
+def _line_total():
+    return ExpressionWrapper(F('quantity') * F('unit_price'), output_field=_money())
+
+
+def _aggregates():
+    return {
+        'item_count': Count('id'),
+        'total_quantity': Sum('quantity', output_field=IntegerField()),
+        'subtotal': Sum(_line_total(), output_field=_money()),
+    }
+
+
+def summary_aggregates():
+    """Aggregates for cart_summary(); zeros for an empty cart."""
+    zeros = {'item_count': Value(0), 'total_quantity': Value(0), 'subtotal': Value(Decimal('0.00'))}
+    return {
+        name: Coalesce(aggregate, zeros[name], output_field=aggregate.output_field)
+        for name, aggregate in _aggregates().items()
+    }
+
+
+def cart_summary(queryset):
+    return queryset.aggregate(**summary_aggregates())
+
+
+def with_cart_totals(queryset):
+    """Annotate each line with line_total and the totals of all lines in ``queryset``."""
+    return queryset.annotate(
+        line_total=_line_total(),
+        **{f'cart_{name}': Window(aggregate) for name, aggregate in _aggregates().items()},
+    )
+
+
+def summary_from_lines(lines):
+    """The summary carried by rows of with_cart_totals() (any row has it)."""
+    if not lines:
+        return {'item_count': 0, 'total_quantity': 0, 'subtotal': Decimal('0.00')}
+    return {name: getattr(lines[0], f'cart_{name}') for name in _aggregates()}
@@ -0,0 +1,54 @@
+"""Conditional GET (ETag / Last-Modified) from version stamps.
+
+Validators are derived from stamps that are cheap to read (the catalog version
+in the cache, Order.updated_at), never from the rendered body, so a matching
+If-None-Match / If-Modified-Since is answered with 304 before the main queryset
+or any serializer runs. Responses whose content has no single modification
+time (menu items, see caching.py) get an ETag only.
+
+Only JSON representations get validators: the browsable API embeds the
+logged-in user and forms, so its HTML is not a function of the stamps alone.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Strong ETag for the given stamp parts (and nothing else)."""
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def supports_validators(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return request.method in ('GET', 'HEAD') and getattr(renderer, 'format', None) == 'json'
+
+
+def not_modified_response(request, etag, last_modified, private=False):
+    """A 304 response if the client's copy is current, else None.
+
+    ``last_modified`` is a Unix timestamp (seconds), or None for an ETag only.
+    """
+    if not supports_validators(request):
+        return None
+    if last_modified is not None:
+        last_modified = int(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(request, response, etag, last_modified, private)
+    return response
+
+
+def set_validators(request, response, etag, last_modified, private=False):
+    """Add ETag/Last-Modified to a successful JSON response; clients must revalidate."""
+    if not supports_validators(request) or response.status_code not in (200, 304):
+        return response
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
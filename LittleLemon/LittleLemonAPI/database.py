@@ -0,0 +1,55 @@
+"""SQLite under concurrent writers.
+
+settings.DATABASES sets up every connection for many writers. It uses WAL
+journaling (readers never block the writer), a busy timeout, and BEGIN
+IMMEDIATE, so a transaction takes the write lock up front and cannot fail
+halfway through. A write can still lose the lock when the timeout runs out
+under a burst. retry_on_lock() then runs it again after a short, jittered
+back-off, instead of answering 500 "database is locked".
+"""
+import functools
+import random
+import time
+
+from django.db import OperationalError, transaction
+
+LOCK_RETRY_ATTEMPTS = 5
+LOCK_RETRY_BASE_SECONDS = 0.05
+LOCK_RETRY_MAX_SECONDS = 1.0
+
+_LOCK_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and str(exc).startswith(_LOCK_MESSAGES)
+
+
+def lock_retry_delay(attempt):
+    delay = min(LOCK_RETRY_MAX_SECONDS, LOCK_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def retry_on_lock(func=None, *, using=None):
+    """Retry ``func`` up to LOCK_RETRY_ATTEMPTS times while the database is locked.
+
+    ``func`` must be safe to run again: its own transaction, nothing sent
+    before it commits. Inside an outer transaction there is no retry. The
+    outer block has to roll back and be retried as a whole.
+    """
+    if func is None:
+        return functools.partial(retry_on_lock, using=using)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection(using).in_atomic_block:
+            return func(*args, **kwargs)
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if not is_lock_error(exc) or attempt >= LOCK_RETRY_ATTEMPTS:
+                    raise
+            time.sleep(lock_retry_delay(attempt))
+            attempt += 1
+    return wrapper
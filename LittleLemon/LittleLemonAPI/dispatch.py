@@ -0,0 +1,150 @@
+"""Batch dispatch of unassigned orders to the delivery crew.
+
+The engine keeps each crew member's load (open orders, status 0, assigned to
+them) in memory instead of counting it per order. A dispatch run:
+
+1. refreshes the load incrementally: only orders whose updated_at moved since
+   the last run are read (status changes, manual reassignments, our own
+   assignments from other workers); a full recount happens on first use and
+   every FULL_REFRESH_SECONDS, which also picks up orders deleted elsewhere,
+2. reads the oldest unassigned open orders (one query, partial index),
+3. hands each to the least-loaded crew member (a heap keyed by load),
+4. writes one UPDATE per crew member, guarded by ``delivery_crew IS NULL`` so
+   a concurrent manual assignment always wins, and publishes an order.updated
+   event per order it actually assigned (events.py). Orders taken meanwhile
+   are left out of the events, the load and the result.
+
+Each server process has its own engine; the guard keeps concurrent runs in
+different processes from assigning an order twice.
+"""
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .events import format_timestamp, new_event, publish
+from .models import Order
+from .roles import DELIVERY_CREW, GROUP_ROLES
+
+DISPATCH_BATCH_SIZE = 200
+DISPATCH_BATCH_MAX = 500
+FULL_REFRESH_SECONDS = 5 * 60
+# Re-read changes this far before the last sync, for writes that committed late
+SYNC_OVERLAP = timedelta(seconds=5)
+
+CREW_GROUPS = [name for name, role in GROUP_ROLES.items() if role == DELIVERY_CREW]
+
+
+class NoDeliveryCrew(Exception):
+    pass
+
+
+class DispatchEngine:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the load; the next run recounts it."""
+        self.open_orders = {}  # open assigned order id -> crew member id
+        self.load = Counter()
+        self.synced_at = None
+        self.full_refresh_at = 0.0
+
+    def forget(self, order_id):
+        """Drop a deleted order from the load (post_delete, this process)."""
+        with self._lock:
+            self._set(order_id, None)
+
+    def dispatch(self, limit=DISPATCH_BATCH_SIZE):
+        """Assign up to ``limit`` unassigned open orders, oldest first.
+
+        Returns (assignments, crew) where assignments is a list of
+        (order id, crew member id) and crew maps crew member id -> username.
+        Raises NoDeliveryCrew if nobody is in the delivery crew groups.
+        """
+        with self._lock:
+            crew = dict(User.objects.filter(groups__name__in=CREW_GROUPS, is_active=True)
+                        .values_list('id', 'username').distinct())
+            if not crew:
+                raise NoDeliveryCrew()
+            self._refresh()
+            pending = dict(Order.objects.filter(delivery_crew__isnull=True, status=0)
+                           .order_by('date', 'id').values_list('id', 'user_id')[:limit])
+            try:
+                assignments = self._write(self._plan(pending, crew), pending, crew)
+            except Exception:
+                self.reset()
+                raise
+            return assignments, crew
+
+    def _plan(self, pending, crew):
+        heap = [(self.load[member], member) for member in crew]
+        heapq.heapify(heap)
+        assignments = []
+        for order_id in pending:
+            load, member = heap[0]
+            heapq.heapreplace(heap, (load + 1, member))
+            assignments.append((order_id, member))
+        return assignments
+
+    def _write(self, assignments, customers, crew):
+        """Apply the planned assignments; returns those that were written."""
+        by_member = {}
+        for order_id, member in assignments:
+            by_member.setdefault(member, []).append(order_id)
+        now = timezone.now()
+        assigned = set()
+        with transaction.atomic():
+            for member, order_ids in by_member.items():
+                # updated_at by hand: update() skips auto_now, and it drives ETags and the refresh
+                updated = (Order.objects.filter(pk__in=order_ids, delivery_crew__isnull=True, status=0)
+                           .update(delivery_crew_id=member, updated_at=now))
+                if updated < len(order_ids):
+                    # Some were taken by a concurrent writer; ours are the rows this UPDATE stamped
+                    order_ids = (Order.objects.filter(pk__in=order_ids, delivery_crew_id=member, updated_at=now)
+                                 .values_list('id', flat=True))
+                assigned.update(order_ids)
+            written = [(order_id, member) for order_id, member in assignments if order_id in assigned]
+            if written:
+                updated_at = format_timestamp(now)
+                publish(*[new_event('order.updated', {'id': order_id, 'status': 0, 'delivery_crew': crew[member],
+                                                      'updated_at': updated_at}, customers[order_id], (member,))
+                          for order_id, member in written])
+        for order_id, member in written:
+            self._set(order_id, member)
+        if len(written) != len(assignments):
+            # Recount next time rather than trust the load around the concurrent writes
+            self.full_refresh_at = 0.0
+        return written
+
+    def _refresh(self):
+        started = timezone.now()
+        if self.synced_at is None or time.monotonic() - self.full_refresh_at > FULL_REFRESH_SECONDS:
+            self.open_orders = dict(Order.objects.filter(status=0, delivery_crew__isnull=False)
+                                    .values_list('id', 'delivery_crew_id'))
+            self.load = Counter(self.open_orders.values())
+            self.full_refresh_at = time.monotonic()
+        else:
+            changed = Order.objects.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP)
+            for order_id, member, status in changed.values_list('id', 'delivery_crew_id', 'status'):
+                self._set(order_id, member if status == 0 else None)
+        self.synced_at = started
+
+    def _set(self, order_id, member):
+        """Record that ``order_id`` is open and assigned to ``member`` (None: neither)."""
+        previous = self.open_orders.pop(order_id, None)
+        if previous is not None:
+            self.load[previous] -= 1
+        if member is not None:
+            self.open_orders[order_id] = member
+            self.load[member] += 1
+
+
+engine = DispatchEngine()
@@ -0,0 +1,147 @@
+"""Order change events, fanned out to server-sent event streams through the database.
+
+The order views and the dispatch engine write an event row (models.OrderEvent)
+in the transaction of the change (creation, manager/crew updates, deletion,
+batch dispatch). An event therefore exists exactly when its change committed,
+whichever process made it: WSGI workers, ASGI workers or commands.
+
+Each open ``api/async/orders/events/`` stream subscribes with a bounded queue
+and gets the events of the orders its user may see, so clients can stop
+polling the order endpoints. While an ASGI process has streams, one poller
+per event loop reads the rows added since its last read every POLL_SECONDS
+(one primary-key range query) and hands them out. SQLite commits one writer
+at a time, so ids become visible in order and the poller never skips one.
+
+The newest EVENT_BUFFER_SIZE rows are kept, so a reconnecting client that
+sends Last-Event-ID gets what it missed.
+"""
+import asyncio
+import json
+
+from rest_framework.fields import DateTimeField
+
+from .models import OrderEvent
+
+EVENT_BUFFER_SIZE = 1000
+# Older rows are deleted whenever an id crosses a multiple of this
+PRUNE_INTERVAL = 100
+SUBSCRIBER_QUEUE_SIZE = 100
+POLL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15
+# Streams end after this long; the client reconnects (and is authenticated again)
+STREAM_MAX_SECONDS = 5 * 60
+RECONNECT_MILLISECONDS = 3000
+
+_datetime = DateTimeField()
+
+
+def encode_event(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n'
+
+
+class Subscription:
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind reconnects and catches up with Last-Event-ID
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class Broadcaster:
+    """The streams of this process, and a poller per event loop that has any."""
+
+    def __init__(self):
+        self._subscriptions = {}  # loop -> set of Subscription
+        self._pollers = {}  # loop -> polling task
+
+    async def subscribe(self, last_event_id=None):
+        """Register a stream on the running loop; returns (subscription, missed events).
+
+        Missed events and delivered ones may overlap; the stream skips ids it has sent.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._pollers:
+            latest = await OrderEvent.objects.order_by('-id').values_list('id', flat=True).afirst()
+            if loop not in self._pollers:
+                self._pollers[loop] = loop.create_task(self._poll(loop, latest or 0))
+        subscription = Subscription(loop)
+        self._subscriptions.setdefault(loop, set()).add(subscription)
+        missed = []
+        if last_event_id is not None:
+            missed = [event async for event in OrderEvent.objects.filter(id__gt=last_event_id).order_by('id')[:EVENT_BUFFER_SIZE]]
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        subscriptions = self._subscriptions.get(subscription.loop, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self._subscriptions.pop(subscription.loop, None)
+            poller = self._pollers.pop(subscription.loop, None)
+            if poller is not None:
+                poller.cancel()
+
+    async def _poll(self, loop, after):
+        while True:
+            events = [event async for event in OrderEvent.objects.filter(id__gt=after).order_by('id')[:EVENT_BUFFER_SIZE]]
+            for event in events:
+                for subscription in list(self._subscriptions.get(loop, ())):
+                    subscription.deliver(event)
+            if events:
+                after = events[-1].id
+            if len(events) < EVENT_BUFFER_SIZE:
+                await asyncio.sleep(POLL_SECONDS)
+
+    def reset(self):
+        for poller in self._pollers.values():
+            poller.cancel()
+        self._subscriptions.clear()
+        self._pollers.clear()
+
+
+broadcaster = Broadcaster()
+
+
+def order_data(order):
+    """Event payload: what changes on an order; the full body is at orders/<pk>/."""
+    return {
+        'id': order.pk,
+        'status': order.status,
+        'delivery_crew': order.delivery_crew.username if order.delivery_crew_id else None,
+        'updated_at': format_timestamp(order.updated_at),
+    }
+
+
+def format_timestamp(value):
+    """Datetimes in event payloads render like the API's own."""
+    return _datetime.to_representation(value)
+
+
+def new_event(type, data, user_id, delivery_crew_ids=()):
+    """An unsaved event for publish()."""
+    return OrderEvent(type=type, data=data, user_id=user_id, delivery_crew_ids=sorted(set(delivery_crew_ids) - {None}))
+
+
+def publish(*events):
+    """Write ``events`` in the current transaction: streams see them once it commits."""
+    events = OrderEvent.objects.bulk_create(events)
+    first, last = events[0].id, events[-1].id
+    if (first - 1) // PRUNE_INTERVAL != last // PRUNE_INTERVAL:
+        OrderEvent.objects.filter(id__lte=last - EVENT_BUFFER_SIZE).delete()
+    return events
+
+
+def publish_order_event(type, order, previous_delivery_crew_id=None):
+    """``order.created`` / ``order.updated`` for a saved order."""
+    return publish(new_event(f'order.{type}', order_data(order), order.user_id,
+                             (order.delivery_crew_id, previous_delivery_crew_id)))[0]
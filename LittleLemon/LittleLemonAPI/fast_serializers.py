@@ -0,0 +1,162 @@
+"""Compiled, read-only serialization for the large list endpoints.
+
+Builds exactly the payloads of MenuItemSerializer and OrderReadSerializer, but
+from values() rows instead of model instances and without DRF's per-field
+machinery: each row becomes a dict built from one table of per-field getters,
+and price_after_tax is computed once per distinct price. Used by MenuItemsView and
+OrdersView list(); the regular serializers still handle everything else
+(writes, detail views, browsable API forms). tests.FastSerializerEquivalenceTests
+checks both paths produce identical data.
+
+Both take the requested sparse fieldset (fieldsets.py): the rows then hold
+only the columns those fields need and each object is built from those
+fields' getters alone; without one, from all of them.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .fieldsets import SparseFieldset
+from .models import OrderItem
+from .serializers import price_after_tax
+
+MENU_ITEM_VALUES = ('id', 'name', 'price', 'inventory', 'category_id', 'category__title', 'is_item_of_the_day',
+                    'rating_count', 'rating_sum', 'rating_avg')
+ORDER_VALUES = ('id', 'user__username', 'delivery_crew__username', 'status', 'total', 'date')
+
+
+def order_items_prefetch():
+    """Prefetch for OrderReadSerializer with lines in the same (id) order as serialize_orders()."""
+    return Prefetch('items', queryset=OrderItem.objects.select_related('menu_item').order_by('id'))
+
+
+MENU_ITEM_FIELDSET = SparseFieldset({
+    'id': ('id',),
+    'dish': ('name',),
+    'price': ('price',),
+    'price_after_tax': ('price',),
+    'stock': ('inventory',),
+    'category': ('category_id', 'category__title'),
+    'is_item_of_the_day': ('is_item_of_the_day',),
+    'rating_count': ('rating_count',),
+    'rating_sum': ('rating_sum',),
+    'rating_avg': ('rating_avg',),
+}, expandable=['category'],
+    # Keyset pagination reads the ordering columns (MenuItemsView.ordering_fields) from the rows
+    required=('id', 'price', 'inventory', 'rating_avg', 'rating_count'))
+
+ORDER_FIELDSET = SparseFieldset({
+    'id': ('id',),
+    'user': ('user__username',),
+    'delivery_crew': ('delivery_crew__username',),
+    'status': ('status',),
+    'total': ('total',),
+    'date': ('date',),
+    'items': (),
+}, expandable=['items'], prefetch={'items': order_items_prefetch},
+    # Access checks and validators (OrderDetailView), then the ordering columns for keyset pagination
+    required=('id', 'user_id', 'delivery_crew_id', 'updated_at', 'status', 'total', 'date'))
+
+
+def format_decimal(value):
+    """DecimalField(coerce_to_string=True) output for values already at the field's scale."""
+    return None if value is None else format(value, 'f')
+
+
+def format_datetime(value):
+    """DRF DateTimeField output (ISO 8601, current time zone, 'Z' for UTC)."""
+    if value is None:
+        return None
+    if settings.USE_TZ:
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def menu_item_rows(queryset, fields=None):
+    values = MENU_ITEM_VALUES if fields is None else MENU_ITEM_FIELDSET.values(fields)
+    return queryset.prefetch_related(None).values(*values)
+
+
+def serialize_menu_items(rows, fields=None):
+    """MenuItemSerializer(many=True).data for rows from menu_item_rows() (with the same ``fields``)."""
+    taxed = {}  # price -> price_after_tax, shared by the rows of one call
+    getters = [(name, _MENU_ITEM_GETTERS[name]) for name in (MENU_ITEM_FIELDSET.columns if fields is None else fields)]
+    return [{name: get(row, taxed) for name, get in getters} for row in rows]
+
+
+def _price_after_tax(row, taxed):
+    price = row['price']
+    if price not in taxed:
+        taxed[price] = price_after_tax(price)
+    return taxed[price]
+
+
+# Field name -> value from a menu_item_rows() row, in MenuItemSerializer's field order
+_MENU_ITEM_GETTERS = {
+    'id': lambda row, taxed: row['id'],
+    'dish': lambda row, taxed: row['name'],
+    'price': lambda row, taxed: format_decimal(row['price']),
+    'price_after_tax': _price_after_tax,
+    'stock': lambda row, taxed: row['inventory'],
+    'category': lambda row, taxed: {'id': row['category_id'], 'name': row['category__title']},
+    'is_item_of_the_day': lambda row, taxed: row['is_item_of_the_day'],
+    'rating_count': lambda row, taxed: row['rating_count'],
+    'rating_sum': lambda row, taxed: row['rating_sum'],
+    'rating_avg': lambda row, taxed: row['rating_avg'],
+}
+
+
+def order_rows(queryset, fields=None):
+    values = ORDER_VALUES if fields is None else ORDER_FIELDSET.values(fields)
+    return queryset.prefetch_related(None).values(*values)
+
+
+def serialize_orders(rows, fields=None):
+    """OrderReadSerializer(many=True).data for rows from order_rows(); lines come from one query."""
+    rows = list(rows)
+    if fields is not None and 'items' not in fields:
+        return _build_orders(rows, [], fields)
+    return _build_orders(rows, _order_lines(rows), fields)
+
+
+async def aserialize_orders(rows, fields=None):
+    """serialize_orders() with the lines read through the async ORM."""
+    if fields is not None and 'items' not in fields:
+        return _build_orders(rows, [], fields)
+    return _build_orders(rows, [line async for line in _order_lines(rows)], fields)
+
+
+def _order_lines(rows):
+    return (OrderItem.objects.filter(order_id__in=[row['id'] for row in rows])
+            .values_list('order_id', 'id', 'menu_item_id', 'menu_item__name', 'quantity', 'unit_price')
+            .order_by('order_id', 'id'))
+
+
+def _build_orders(rows, lines, fields=None):
+    items = {}
+    for order_id, item_id, menu_item_id, dish, quantity, unit_price in lines:
+        items.setdefault(order_id, []).append({
+            'id': item_id,
+            'menu_item': menu_item_id,
+            'dish': dish,
+            'quantity': quantity,
+            'unit_price': format_decimal(unit_price),
+            'total_price': unit_price * quantity,
+        })
+    getters = [(name, _ORDER_GETTERS[name]) for name in (ORDER_FIELDSET.columns if fields is None else fields)]
+    return [{name: get(row, items) for name, get in getters} for row in rows]
+
+
+# Field name -> value from an order_rows() row and the lines by order id, in OrderReadSerializer's field order
+_ORDER_GETTERS = {
+    'id': lambda row, items: row['id'],
+    'user': lambda row, items: row['user__username'],
+    'delivery_crew': lambda row, items: row['delivery_crew__username'],
+    'status': lambda row, items: row['status'],
+    'total': lambda row, items: format_decimal(row['total']),
+    'date': lambda row, items: format_datetime(row['date']),
+    'items': lambda row, items: items.get(row['id'], []),
+}
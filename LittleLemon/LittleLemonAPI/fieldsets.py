@@ -0,0 +1,119 @@
+"""Sparse fieldsets for the menu, cart and order endpoints.
+
+``?fields=id,dish,price`` returns only those fields of each object, and
+``?expand=category`` adds a nested relation to such a selection (category on
+menu items, items on orders). Without ?fields= every field is returned,
+nested relations included, exactly as before.
+
+The selection narrows the query too. Only the columns behind the requested
+fields are read: only() for model instances, a narrower values() on the
+compiled list paths (fast_serializers.py). A relation is joined or
+prefetched only when a requested field needs it, so payload size and query
+cost both follow what the client asked for.
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+class SparseFieldset:
+    """The fields of one endpoint's objects and the columns each one reads.
+
+    ``columns`` maps field name -> model fields it needs, in output order;
+    ``rel__field`` joins ``rel`` (select_related). ``prefetch`` maps field
+    name -> a callable returning its prefetch_related() lookup. ``required``
+    columns are always read, e.g. those keyset pagination and access checks use.
+    """
+
+    def __init__(self, columns, expandable=(), prefetch=None, required=('id',)):
+        self.columns = columns
+        self.expandable = tuple(expandable)
+        self.prefetch = prefetch or {}
+        self.required = tuple(required)
+
+    def subset(self, *names, required=None):
+        """The same fieldset restricted to ``names`` (for a serializer with fewer fields)."""
+        return SparseFieldset({name: self.columns[name] for name in names},
+                              [name for name in self.expandable if name in names],
+                              {name: lookup for name, lookup in self.prefetch.items() if name in names},
+                              self.required if required is None else required)
+
+    def requested(self, request):
+        """Field names asked for in ``request``, in output order; None means all of them.
+
+        Raises ValidationError (400) for names the endpoint doesn't have.
+        """
+        fields = _names(request, FIELDS_PARAM)
+        expand = _names(request, EXPAND_PARAM)
+        errors = {}
+        unknown = [name for name in fields or () if name not in self.columns]
+        if unknown:
+            errors[FIELDS_PARAM] = [f'Unknown field(s): {", ".join(unknown)}. Choose from: {", ".join(self.columns)}.']
+        unknown = [name for name in expand or () if name not in self.expandable]
+        if unknown:
+            choices = ', '.join(self.expandable) or 'nothing'
+            errors[EXPAND_PARAM] = [f'Cannot expand: {", ".join(unknown)}. Choose from: {choices}.']
+        if errors:
+            raise ValidationError(errors)
+        if fields is None:
+            return None
+        wanted = set(fields) | set(expand or ())
+        return [name for name in self.columns if name in wanted]
+
+    def values(self, fields):
+        """Columns to read for ``fields`` (all of them for None)."""
+        names = self.columns if fields is None else fields
+        values = list(self.required)
+        for name in names:
+            values.extend(column for column in self.columns[name] if column not in values)
+        return values
+
+    def narrow(self, queryset, fields):
+        """``queryset`` reading only what ``fields`` need: only(), select_related, prefetch_related."""
+        if fields is None:
+            return queryset
+        columns = self.values(fields)
+        related = sorted({column.rsplit('__', 1)[0] for column in columns if '__' in column})
+        queryset = queryset.select_related(None).prefetch_related(None).only(*columns)
+        if related:
+            queryset = queryset.select_related(*related)
+        lookups = [self.prefetch[name]() for name in fields if name in self.prefetch]
+        return queryset.prefetch_related(*lookups) if lookups else queryset
+
+
+def _names(request, param):
+    names = [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+    return names or None
+
+
+class SparseFieldsMixin:
+    """Serializer mixin: drop the fields not listed in context['fields'] (None keeps all)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    """View mixin: ?fields=/?expand= on GET, applied to the serializer and the queryset."""
+    fieldset = None
+
+    def sparse_fields(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self.fieldset.requested(self.request)
+        return self._sparse_fields
+
+    def filter_queryset(self, queryset):
+        # Here rather than in get_queryset(), which most views override
+        return self.fieldset.narrow(super().filter_queryset(queryset), self.sparse_fields())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.sparse_fields()
+        return context
@@ -0,0 +1,153 @@
+"""A small job queue backed by the Job table.
+
+Jobs are registered by name with the @job decorator (see tasks.py) and
+enqueued as Job rows. ``manage.py run_jobs`` claims and runs them.
+
+Delivery is at least once:
+
+- a job is enqueued in the caller's transaction, so a committed checkout
+  always has its jobs and a rolled-back one has none;
+- a worker claims a job with a conditional UPDATE that leases it for
+  JOB_LEASE_SECONDS. If the worker dies, the lease runs out and another
+  worker picks the job up again. The late worker's outcome is then dropped;
+- a failed job is retried with exponential back-off until max_attempts.
+  That includes jobs that take their worker down with them (OOM, segfault):
+  a lease that runs out on the last attempt is not redelivered, and
+  fail_abandoned() marks the job failed.
+
+Handlers must therefore be idempotent (see tasks.roll_up_order).
+
+Finished jobs are kept for JOB_RETENTION_SECONDS (for inspection in the
+admin), then prune_finished() deletes them.
+"""
+import random
+import traceback
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+JOB_LEASE_SECONDS = 5 * 60
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 60 * 60
+JOB_RETENTION_SECONDS = 7 * 24 * 60 * 60
+# Deleted per statement, so claims never wait long for the write lock
+PRUNE_BATCH_SIZE = 1000
+
+_registry = {}  # name -> (handler, max_attempts)
+CHECKOUT_JOBS = []
+
+
+def job(name, max_attempts=5, on_checkout=False):
+    """Register ``handler(**payload)`` as job ``name``.
+
+    ``on_checkout`` jobs are enqueued for every new order with payload {"order_id": ...}.
+    """
+    def register(handler):
+        _registry[name] = (handler, max_attempts)
+        if on_checkout:
+            CHECKOUT_JOBS.append(name)
+        return handler
+    return register
+
+
+def _new_job(name, payload, run_at=None):
+    _, max_attempts = _registry[name]
+    return Job(name=name, payload=payload, max_attempts=max_attempts, run_at=run_at or timezone.now())
+
+
+def enqueue(name, run_at=None, **payload):
+    new_job = _new_job(name, payload, run_at)
+    new_job.save()
+    return new_job
+
+
+def enqueue_checkout_jobs(order):
+    """All post-checkout work for ``order`` in one INSERT, however many jobs there are."""
+    if CHECKOUT_JOBS:
+        Job.objects.bulk_create([_new_job(name, {'order_id': order.pk}) for name in CHECKOUT_JOBS])
+
+
+def _claimable(now):
+    return (Q(status=Job.QUEUED, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts')))
+
+
+def fail_abandoned():
+    """Mark failed the jobs whose lease ran out on their last attempt. Returns how many."""
+    now = timezone.now()
+    return Job.objects.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_until=None,
+        last_error='The lease of the last attempt ran out: the worker died or the job ran too long.')
+
+
+def claim(limit=1):
+    """Lease up to ``limit`` due jobs (oldest first) for this worker."""
+    now = timezone.now()
+    candidates = (Job.objects.filter(_claimable(now)).order_by('run_at', 'id')
+                  .values_list('id', flat=True)[:limit])
+    claimed = []
+    for job_id in candidates:
+        # Only one worker's UPDATE matches; the others move on to the next candidate
+        if Job.objects.filter(_claimable(now), pk=job_id).update(
+                status=Job.RUNNING, attempts=F('attempts') + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS)):
+            claimed.append(job_id)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def retry_delay(attempts):
+    """Exponential back-off with jitter, so failed jobs don't retry in lockstep."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run(claimed):
+    """Run a claimed job and record the outcome. Returns True if it succeeded.
+
+    The outcome is only written while this worker's claim stands: once the
+    lease has run out and another worker claimed the job again, that worker
+    owns the row.
+    """
+    handler, _ = _registry.get(claimed.name, (None, None))
+    row = Job.objects.filter(pk=claimed.pk, status=Job.RUNNING, attempts=claimed.attempts)
+    try:
+        if handler is None:
+            raise LookupError(f'No job named {claimed.name!r} is registered')
+        handler(**claimed.payload)
+    except Exception:
+        now = timezone.now()
+        if claimed.attempts >= claimed.max_attempts:
+            row.update(status=Job.FAILED, finished_at=now, locked_until=None, last_error=traceback.format_exc())
+        else:
+            row.update(status=Job.QUEUED, locked_until=None, last_error=traceback.format_exc(),
+                       run_at=now + timedelta(seconds=retry_delay(claimed.attempts)))
+        return False
+    row.update(status=Job.DONE, finished_at=timezone.now(), locked_until=None)
+    return True
+
+
+def prune_finished(now=None):
+    """Delete done and failed jobs that finished more than JOB_RETENTION_SECONDS ago. Returns how many."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=JOB_RETENTION_SECONDS)
+    finished = Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff)
+    deleted = 0
+    while True:
+        count, _ = Job.objects.filter(pk__in=list(finished.values_list('pk', flat=True)[:PRUNE_BATCH_SIZE])).delete()
+        deleted += count
+        if count < PRUNE_BATCH_SIZE:
+            return deleted
+
+
+def run_pending(limit=100):
+    """Claim and run due jobs one at a time until none are left (or ``limit`` ran). Returns the count."""
+    done = 0
+    while done < limit:
+        jobs = claim()
+        if not jobs:
+            break
+        run(jobs[0])
+        done += 1
+    return done
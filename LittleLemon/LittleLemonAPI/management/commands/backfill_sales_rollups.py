@@ -0,0 +1,17 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups from the Order/OrderItem tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-min', type=datetime.date.fromisoformat, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--date-max', type=datetime.date.fromisoformat, help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        days = rebuild_rollups(options['date_min'], options['date_max'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days'))
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI.benchmarking import scratch_database, summarize
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+
+ENDPOINTS = {
+    # name: (sync path, async path, authenticated)
+    'menu-items': ('/api/menu-items/', '/api/async/menu-items/', False),
+    'orders': ('/api/orders/', '/api/async/orders/', True),
+    'order-detail': ('/api/orders/{order}/', '/api/async/orders/{order}/', True),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare the WSGI deployment (sync views, fixed worker threads) with the ASGI deployment "
+            "(async views) at high connection counts, in-process against a scratch SQLite database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='orders')
+        parser.add_argument('--connections', type=int, default=200, help='Concurrent client connections')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=8, help='WSGI worker threads (e.g. gunicorn --threads)')
+        parser.add_argument('--orders', type=int, default=50, help='Orders of the benchmark customer')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Added to every query, to emulate a slow disk or a networked database')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            token, order_id = self._seed(options)
+            if options['db_latency_ms']:
+                delay = options['db_latency_ms'] / 1000
+                connection_created.connect(_slow_queries(delay), weak=False)
+            sync_path, async_path, authenticated = ENDPOINTS[options['endpoint']]
+            headers = {'authorization': f'Token {token}'} if authenticated else {}
+            self.stdout.write(f"{options['requests']} requests, {options['connections']} connections, "
+                              f"endpoint {options['endpoint']}, +{options['db_latency_ms']}ms per query")
+            self._report('WSGI', self._run_wsgi(sync_path.format(order=order_id), headers, options))
+            self._report('ASGI', asyncio.run(self._run_asgi(async_path.format(order=order_id), headers, options)))
+
+    def _seed(self, options):
+        category = Category.objects.create(slug='bench', title='Bench')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(name=f'Dish {i}', price=10, inventory=100, category=category) for i in range(20)
+        ])
+        customer = User.objects.create(username='customer')
+        orders = Order.objects.bulk_create([Order(user=customer, total='30.00') for _ in range(options['orders'])])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=items[(n + line) % len(items)], quantity=1, unit_price=10)
+            for n, order in enumerate(orders)
+            for line in range(3)
+        ])
+        return Token.objects.create(user=customer).key, orders[0].pk
+
+    def _run_wsgi(self, path, headers, options):
+        """A threaded WSGI server: ``workers`` threads, other connections wait in the backlog."""
+        from LittleLemon.wsgi import application
+
+        def request(submitted):
+            environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'HTTP_HOST': 'testserver'}
+            environ.update({f"HTTP_{name.upper()}": value for name, value in headers.items()})
+            setup_testing_defaults(environ)
+            status = []
+            body = application(environ, lambda code, response_headers: status.append(int(code.split()[0])))
+            try:
+                b''.join(body)
+            finally:
+                body.close()
+            slots.release()
+            return status[0], time.perf_counter() - submitted
+
+        slots = BoundedSemaphore(options['connections'])
+        futures = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in range(options['requests']):
+                slots.acquire()
+                futures.append(pool.submit(request, time.perf_counter()))
+        return [future.result() for future in futures], time.perf_counter() - started
+
+    async def _run_asgi(self, path, headers, options):
+        """The ASGI application driven directly, ``connections`` requests in flight."""
+        from LittleLemon.asgi import application
+
+        slots = asyncio.Semaphore(options['connections'])
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver')] + [(name.encode(), value.encode()) for name, value in headers.items()],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+
+        async def request():
+            async with slots:
+                submitted = time.perf_counter()
+                status = []
+                body_sent = False
+
+                async def receive():
+                    nonlocal body_sent
+                    if not body_sent:
+                        body_sent = True
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    await asyncio.Future()  # the client never disconnects early
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        status.append(message['status'])
+
+                await application(dict(scope), receive, send)
+                return status[0], time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    def _report(self, label, outcome):
+        results, elapsed = outcome
+        summary = summarize([duration for _, duration in results], elapsed)
+        statuses = ', '.join(f'{status}={count}' for status, count in sorted(Counter(s for s, _ in results).items()))
+        self.stdout.write(f"{label}: {summary['throughput_rps']} req/s, latency ms p50={summary['p50_ms']} "
+                          f"p95={summary['p95_ms']} p99={summary['p99_ms']} ({statuses})")
+
+
+def _slow_queries(delay):
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+    return install
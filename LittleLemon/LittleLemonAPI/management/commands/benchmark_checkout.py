@@ -0,0 +1,86 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from LittleLemonAPI import database
+from LittleLemonAPI.benchmarking import scratch_database, summarize
+from LittleLemonAPI.models import Category, MenuItem, CartItem, OrderItem
+
+
+class Command(BaseCommand):
+    help = "Benchmark many parallel checkouts (POST /api/orders/) against a scratch SQLite database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200, help='Customers checking out (one checkout each)')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent client threads')
+        parser.add_argument('--menu-items', type=int, default=20)
+        parser.add_argument('--lines', type=int, default=3, help='Cart lines per customer')
+        parser.add_argument('--stock', type=int, default=50, help='Initial inventory per menu item; keep it low to force shortages')
+        parser.add_argument('--plain-sqlite', action='store_true',
+                            help='Without the production SQLite profile (pragmas, BEGIN IMMEDIATE, persistent '
+                                 'connections) and lock retries, for comparison')
+
+    def handle(self, *args, **options):
+        if options['plain_sqlite']:
+            connection.settings_dict.update(OPTIONS={}, CONN_MAX_AGE=0)
+            database.LOCK_RETRY_ATTEMPTS = 1
+        with scratch_database():
+            customer_ids = self._seed(options)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                results = list(pool.map(self._checkout, customer_ids))
+            elapsed = time.perf_counter() - started
+            self._report(results, elapsed, options)
+
+    def _seed(self, options):
+        category = Category.objects.create(slug='bench', title='Bench')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(name=f'Dish {i}', price=10, inventory=options['stock'], category=category)
+            for i in range(options['menu_items'])
+        ])
+        customers = User.objects.bulk_create([User(username=f'customer{i}') for i in range(options['customers'])])
+        CartItem.objects.bulk_create([
+            CartItem(user=customer, menu_item=items[(n + line) % len(items)], quantity=1 + line, unit_price=10)
+            for n, customer in enumerate(customers)
+            for line in range(min(options['lines'], len(items)))
+        ])
+        return [customer.pk for customer in customers]
+
+    def _checkout(self, customer_id):
+        # Server errors (e.g. "database is locked") come back as 500 responses;
+        # re-raising is not thread-safe since the test client's hook is global.
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(User.objects.get(pk=customer_id))
+        started = time.perf_counter()
+        try:
+            status = client.post('/api/orders/').status_code
+        finally:
+            # Keeps the thread's connection if it is persistent (CONN_MAX_AGE)
+            connection.close_if_unusable_or_obsolete()
+        return status, time.perf_counter() - started
+
+    def _report(self, results, elapsed, options):
+        statuses = Counter(status for status, _ in results)
+        summary = summarize([duration for _, duration in results], elapsed)
+        sold = OrderItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
+        remaining = MenuItem.objects.aggregate(total=Sum('inventory'))['total']
+        initial = options['stock'] * options['menu_items']
+        negative = MenuItem.objects.filter(inventory__lt=0).count()
+
+        profile = 'plain' if options['plain_sqlite'] else 'production'
+        self.stdout.write(f"checkouts: {summary['requests']} with {options['threads']} threads in {elapsed:.2f}s "
+                          f"({profile} SQLite profile)")
+        self.stdout.write(f"throughput: {summary['throughput_rps']} checkouts/s")
+        self.stdout.write(f"latency ms: p50={summary['p50_ms']} p95={summary['p95_ms']} p99={summary['p99_ms']}")
+        self.stdout.write('statuses: ' + ', '.join(f'{status}={count}' for status, count in sorted(statuses.items())))
+        self.stdout.write(f'stock: initial={initial} sold={sold} remaining={remaining}')
+        if negative or sold + remaining != initial:
+            self.stdout.write(self.style.ERROR('Inventory is inconsistent (oversold)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Inventory is consistent, nothing oversold'))
@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
+
+from LittleLemonAPI.benchmarking import scratch_database
+from LittleLemonAPI.dispatch import DispatchEngine, DISPATCH_BATCH_MAX
+from LittleLemonAPI.models import Order
+
+
+class Command(BaseCommand):
+    help = ("Measure delivery-crew dispatch throughput at thousands of pending orders: the batch engine "
+            "against assigning one order at a time with a fresh load count (scratch SQLite database).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000, help='Unassigned orders waiting for dispatch')
+        parser.add_argument('--crew', type=int, default=25, help='Delivery crew members')
+        parser.add_argument('--open', type=int, default=20, help='Open orders already assigned to each crew member')
+        parser.add_argument('--batch', type=int, default=DISPATCH_BATCH_MAX, help='Orders per dispatch run')
+        parser.add_argument('--naive-orders', type=int, default=1000,
+                            help='Orders assigned one at a time for the baseline (it is slow)')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            crew = self._seed(options)
+            self._run('batch engine', lambda: self._batch(options['batch']))
+            self._unassign()
+            self._run('one at a time', lambda: self._one_at_a_time(crew, options['naive_orders']))
+            self._report_balance()
+
+    def _seed(self, options):
+        group = Group.objects.create(name='Delivery Crew')
+        customer = User.objects.create(username='customer')
+        crew = User.objects.bulk_create([User(username=f'crew{n}') for n in range(options['crew'])])
+        group.user_set.add(*crew)
+        Order.objects.bulk_create(
+            [Order(user=customer, delivery_crew=member, total='20.00') for member in crew for _ in range(options['open'])]
+            + [Order(user=customer, total='20.00') for _ in range(options['orders'])]
+        )
+        self.seeded_ids = set(Order.objects.filter(delivery_crew__isnull=True).values_list('id', flat=True))
+        return crew
+
+    def _unassign(self):
+        Order.objects.filter(pk__in=self.seeded_ids).update(delivery_crew=None)
+
+    def _batch(self, batch):
+        engine = DispatchEngine()
+        assigned = 0
+        while True:
+            assignments, _ = engine.dispatch(batch)
+            assigned += len(assignments)
+            if len(assignments) < batch:
+                return assigned
+
+    def _one_at_a_time(self, crew, limit):
+        """What a manager (or a naive job) does: count every member's open orders, assign the oldest order."""
+        member_ids = [member.pk for member in crew]
+        assigned = 0
+        for order in Order.objects.filter(delivery_crew__isnull=True, status=0).order_by('date', 'id')[:limit]:
+            member = (User.objects.filter(pk__in=member_ids)
+                    .annotate(open=Count('deliveries', filter=Q(deliveries__status=0))).order_by('open', 'id').first())
+            order.delivery_crew = member
+            order.save(update_fields=['delivery_crew', 'updated_at'])
+            assigned += 1
+        # Fewer than ``limit`` when fewer orders are waiting
+        return assigned
+
+    def _run(self, label, assign):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            assigned = assign()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label}: {assigned} orders in {elapsed:.2f}s = {assigned / elapsed:.0f} orders/s, '
+                          f'{len(queries)} queries')
+
+    def _report_balance(self):
+        self._unassign()
+        self._batch(DISPATCH_BATCH_MAX)
+        loads = Order.objects.filter(status=0).values('delivery_crew').annotate(open=Count('id')).values_list('open', flat=True)
+        self.stdout.write(f'balance after a full batch run: open orders per crew member min={min(loads)} max={max(loads)}')
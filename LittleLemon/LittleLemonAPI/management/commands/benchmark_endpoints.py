@@ -0,0 +1,256 @@
+import json
+import logging
+import platform
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import django
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from LittleLemonAPI import urls
+from LittleLemonAPI.benchmarking import compare_results, scratch_database, summarize
+from LittleLemonAPI.models import CartItem, MenuItem, Order
+from LittleLemonAPI.seeding import Scale, SEED_PASSWORD, seed
+
+
+@dataclass
+class Scenario:
+    route: str  # as written in LittleLemonAPI/urls.py
+    method: str = 'get'
+    role: str = 'anonymous'
+    path: Optional[str] = None  # route with its parameters (and query string) filled in from the refs
+    data: object = None
+    content_type: Optional[str] = None
+    setup: Optional[Callable] = field(default=None, repr=False)  # setup(refs), untimed, before every request
+
+    @property
+    def label(self):
+        return f'{self.method.upper()} /api/{self.path or self.route} as {self.role}'
+
+
+def _refill_cart(refs):
+    CartItem.objects.filter(user_id=refs['checkout_customer']).delete()
+    CartItem.objects.create(user_id=refs['checkout_customer'], menu_item_id=refs['menu_item'], quantity=1, unit_price=10)
+
+
+def _rejoin(group_name, user_ref):
+    return lambda refs: Group.objects.get(name=group_name).user_set.add(refs[user_ref])
+
+
+def _import_body(refs):
+    rows = MenuItem.objects.filter(pk__in=refs['menu_items'][:10]).values_list('name', 'price', 'inventory', 'category_id')
+    return 'dish,price,stock,category_id\n' + ''.join(f'{name},{price},{stock},{category}\n' for name, price, stock, category in rows)
+
+
+SCENARIOS = [
+    Scenario('categories/'),
+    Scenario('categories/<int:pk>/', path='categories/{category}/'),
+    Scenario('menu-items/'),
+    Scenario('menu-items/', path='menu-items/?search=dish&ordering=price'),
+    Scenario('menu-items/', path='menu-items/?pagination=cursor'),
+    Scenario('menu-items/', path='menu-items/?fields=id,dish,price'),
+    Scenario('menu-items/<int:pk>/', path='menu-items/{menu_item}/'),
+    Scenario('menu-items/import/', 'post', 'manager', data=_import_body, content_type='text/csv'),
+    Scenario('menu-items/export/', role='manager'),
+    Scenario('menu-items/item-of-the-day/'),
+    Scenario('menu-items/item-of-the-day/set/', 'post', 'manager', data={'menu_item_id': '{menu_item}'}),
+    Scenario('secret/', role='customer'),
+    Scenario('api-token-auth/', 'post', data={'username': '{customer_username}', 'password': SEED_PASSWORD}),
+    Scenario('manager/', role='manager'),
+    Scenario('throttle-check/'),
+    Scenario('throttle-check-auth/', role='customer'),
+    Scenario('me/', role='customer'),
+    Scenario('groups/manager/users', role='manager'),
+    Scenario('groups/manager/users/<int:user_id>/', 'delete', 'manager', path='groups/manager/users/{other_manager}/',
+             setup=_rejoin('Manager', 'other_manager')),
+    Scenario('groups/delivery-crew/users', role='manager'),
+    Scenario('groups/delivery-crew/users/<int:user_id>/', 'delete', 'manager', path='groups/delivery-crew/users/{other_crew}/',
+             setup=_rejoin('Delivery Crew', 'other_crew')),
+    Scenario('ratings/', path='ratings/?menu_item={menu_item}'),
+    Scenario('cart/menu-items/', role='customer'),
+    Scenario('cart/menu-items/', role='customer', path='cart/menu-items/?summary=only'),
+    Scenario('cart/menu-items/', 'post', 'customer', data={'menu_item_id': '{menu_item}', 'quantity': 1}),
+    Scenario('cart/menu-items/bulk/', 'post', 'customer',
+             data=lambda refs: [{'menu_item_id': pk, 'quantity': 1} for pk in refs['menu_items'][:10]]),
+    Scenario('cart/menu-items/<int:pk>/', role='customer', path='cart/menu-items/{cart_item}/'),
+    Scenario('orders/', role='customer'),
+    Scenario('orders/', role='manager'),
+    Scenario('orders/', role='manager', path='orders/?fields=id,user,total'),
+    Scenario('orders/', 'post', 'checkout_customer', setup=_refill_cart),
+    Scenario('orders/export/', role='manager'),
+    Scenario('orders/dispatch/', 'post', 'manager'),
+    Scenario('orders/<int:pk>/', role='customer', path='orders/{order}/'),
+    Scenario('analytics/sales/', role='manager'),
+    Scenario('metrics/', role='manager'),
+    Scenario('async/menu-items/'),
+    Scenario('async/menu-items/<int:pk>/', path='async/menu-items/{menu_item}/'),
+    Scenario('async/menu-items/item-of-the-day/'),
+    Scenario('async/categories/'),
+    Scenario('async/cart/menu-items/', role='customer'),
+    Scenario('async/orders/', role='customer'),
+    Scenario('async/orders/<int:pk>/', role='customer', path='async/orders/{order}/'),
+]
+
+SKIPPED = {
+    'async/orders/events/': 'a server-sent event stream never completes',
+}
+
+
+class Command(BaseCommand):
+    help = ("Seed a scratch SQLite database and drive every route of LittleLemonAPI/urls.py in-process, "
+            "reporting latency percentiles, throughput and SQL queries per request. Results can be written "
+            "to JSON and compared with an earlier run to catch regressions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario first (warms caches)')
+        parser.add_argument('--customers', type=int, default=Scale.customers)
+        parser.add_argument('--menu-items', type=int, default=Scale.menu_items)
+        parser.add_argument('--orders', type=int, default=Scale.orders)
+        parser.add_argument('--ratings', type=int, default=Scale.ratings)
+        parser.add_argument('--only', help='Only scenarios whose label contains this text')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Earlier JSON results; fail if any scenario regressed')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Allowed p95 latency increase in percent for --compare')
+
+    def handle(self, *args, **options):
+        scale = Scale(customers=max(options['customers'], 2), menu_items=max(options['menu_items'], 10),
+                      orders=options['orders'], ratings=options['ratings'])
+        scenarios = [s for s in SCENARIOS if not options['only'] or options['only'] in s.label]
+        # 4xx responses (e.g. the throttle checks' 429s) are expected here; don't log each one
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with scratch_database():
+            refs = self._refs(seed(scale))
+            clients = self._clients(refs)
+            results = [self._run(scenario, refs, clients, options) for scenario in scenarios]
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'git_commit': _git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests_per_scenario': options['requests'],
+                'warmup': options['warmup'],
+            },
+            'scale': scale.as_dict(),
+            'results': results,
+            'not_covered': _not_covered(),
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                regressions = compare_results(json.load(baseline), report, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
+
+    def _refs(self, ids):
+        """Ids the scenarios' paths and bodies refer to."""
+        customer = ids['users']['customer'][0]
+        order = Order.objects.filter(user_id=customer).values_list('id', flat=True).first()
+        if order is None:
+            order = Order.objects.create(user_id=customer, total=0).pk
+        cart_item = CartItem.objects.filter(user_id=customer).values_list('id', flat=True).first()
+        if cart_item is None:
+            cart_item = CartItem.objects.create(user_id=customer, menu_item_id=ids['menu_items'][0], unit_price=10).pk
+        return {
+            'customer': customer,
+            'customer_username': User.objects.get(pk=customer).username,
+            'checkout_customer': ids['users']['customer'][1],
+            'manager': ids['users']['manager'][0],
+            'other_manager': ids['users']['manager'][-1],
+            'crew': ids['users']['crew'][0],
+            'other_crew': ids['users']['crew'][-1],
+            'category': ids['categories'][0],
+            'menu_item': ids['menu_items'][0],
+            'menu_items': ids['menu_items'],
+            'order': order,
+            'cart_item': cart_item,
+        }
+
+    def _clients(self, refs):
+        clients = {'anonymous': APIClient(raise_request_exception=False)}
+        for role in ('customer', 'checkout_customer', 'manager', 'crew'):
+            client = APIClient(raise_request_exception=False)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user_id=refs[role]).key}')
+            clients[role] = client
+        return clients
+
+    def _run(self, scenario, refs, clients, options):
+        path = '/api/' + (scenario.path or scenario.route).format(**refs)
+        client = clients[scenario.role]
+        statuses = Counter()
+        latencies = []
+        queries = []
+        elapsed = 0.0
+        for n in range(options['warmup'] + options['requests']):
+            if scenario.setup:
+                scenario.setup(refs)
+            data = _fill(scenario.data(refs) if callable(scenario.data) else scenario.data, refs)
+            kwargs = {'data': data, 'content_type': scenario.content_type} if scenario.content_type else {'data': data, 'format': 'json'}
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, scenario.method)(path, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                duration = time.perf_counter() - started
+            if n < options['warmup']:
+                continue
+            elapsed += duration
+            latencies.append(duration)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+
+        result = {
+            'label': scenario.label,
+            'route': scenario.route,
+            'method': scenario.method.upper(),
+            'role': scenario.role,
+            'path': path,
+            **summarize(latencies, elapsed),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0,
+            'queries_max': max(queries, default=0),
+        }
+        self.stdout.write(f"{result['label']}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                          f"p99={result['p99_ms']}ms {result['throughput_rps']} req/s, "
+                          f"queries={result['queries_max']} statuses={result['statuses']}")
+        return result
+
+
+def _fill(data, refs):
+    """Format '{ref}' placeholders in a request body."""
+    if isinstance(data, str) and data.startswith('{') and data.endswith('}') and data[1:-1] in refs:
+        return refs[data[1:-1]]
+    if isinstance(data, dict):
+        return {key: _fill(value, refs) for key, value in data.items()}
+    return data
+
+
+def _not_covered():
+    covered = {scenario.route for scenario in SCENARIOS} | set(SKIPPED)
+    return sorted(str(pattern.pattern) for pattern in urls.urlpatterns if str(pattern.pattern) not in covered)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from LittleLemonAPI import fast_serializers
+from LittleLemonAPI.benchmarking import scratch_database
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderReadSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare DRF serializers with fast_serializers on catalog and order listings (scratch SQLite database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per listing (a large page)')
+        parser.add_argument('--lines', type=int, default=3, help='Lines per order')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._seed(options)
+            menu_items = MenuItem.objects.select_related('category').order_by('id')
+            orders = Order.objects.prefetch_related(fast_serializers.order_items_prefetch(), 'user', 'delivery_crew').order_by('-date')
+            self._compare('menu items', options['repeat'],
+                          lambda: MenuItemSerializer(menu_items.all(), many=True).data,
+                          lambda: fast_serializers.serialize_menu_items(fast_serializers.menu_item_rows(menu_items.all())))
+            self._compare('orders', options['repeat'],
+                          lambda: OrderReadSerializer(orders.all(), many=True).data,
+                          lambda: fast_serializers.serialize_orders(fast_serializers.order_rows(orders.all())))
+
+    def _seed(self, options):
+        category = Category.objects.create(slug='bench', title='Bench')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(name=f'Dish {i}', price=f'{5 + i % 20}.50', inventory=i, category=category)
+            for i in range(options['rows'])
+        ])
+        customer = User.objects.create(username='customer')
+        orders = Order.objects.bulk_create([Order(user=customer, total='0.00') for _ in range(options['rows'])])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=items[(n + line) % len(items)], quantity=1 + line, unit_price=items[(n + line) % len(items)].price)
+            for n, order in enumerate(orders)
+            for line in range(options['lines'])
+        ])
+
+    def _compare(self, label, repeat, regular, fast):
+        renderer = JSONRenderer()
+        if renderer.render(regular()) != renderer.render(fast()):
+            self.stdout.write(self.style.ERROR(f'{label}: fast path output differs'))
+            return
+        timings = {}
+        for name, build in (('serializer', regular), ('fast', fast)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                renderer.render(build())
+            timings[name] = (time.perf_counter() - started) / repeat * 1000
+        self.stdout.write(f"{label}: serializer={timings['serializer']:.2f}ms fast={timings['fast']:.2f}ms "
+                          f"speedup={timings['serializer'] / timings['fast']:.1f}x (query + serialize + render, per listing)")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.throttles import prune_buckets
+
+
+class Command(BaseCommand):
+    help = ("Delete throttle buckets untouched for longer than the longest throttle period. They are full, "
+            "the same as no bucket, and would otherwise pile up one per client. Run it periodically (e.g. hourly).")
+
+    def handle(self, *args, **options):
+        deleted = prune_buckets()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} throttle buckets'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute MenuItem.rating_count/rating_sum/rating_avg from the Rating table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('menu_item_ids', nargs='*', type=int, help='Only rebuild these menu items (default: all)')
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_aggregates(options['menu_item_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} menu items'))
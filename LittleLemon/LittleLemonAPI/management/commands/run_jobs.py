@@ -0,0 +1,57 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from LittleLemonAPI.jobs import fail_abandoned, prune_finished, run_pending
+
+# How often the first worker thread tidies up the queue
+HOUSEKEEPING_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = ("Run background jobs (post-checkout work and the like) from the Job table with a pool of worker "
+            "threads. Run as many of these processes as needed; each job is claimed by one worker at a time. "
+            "Finished jobs are deleted after JOB_RETENTION_SECONDS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due, then exit')
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: self.stopping.set())
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            done = sum(pool.map(lambda index: self._work(options, housekeeping=index == 0), range(options['workers'])))
+        self.stdout.write(f'Ran {done} jobs')
+
+    def _work(self, options, housekeeping=False):
+        done = 0
+        tidied = None
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                if housekeeping and (tidied is None or time.monotonic() - tidied >= HOUSEKEEPING_SECONDS):
+                    self._housekeeping()
+                    tidied = time.monotonic()
+                ran = run_pending(limit=10)
+                done += ran
+                if not ran:
+                    if options['once']:
+                        break
+                    self.stopping.wait(options['poll_interval'])
+        finally:
+            connection.close()
+        return done
+
+    def _housekeeping(self):
+        failed = fail_abandoned()
+        if failed:
+            self.stderr.write(f'{failed} jobs failed: their last attempt never finished')
+        prune_finished()
@@ -0,0 +1,29 @@
+import dataclasses
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.seeding import Scale, SEED_PASSWORD, SEED_PREFIX, clear_seeded, seed, seeded_exists
+
+
+class Command(BaseCommand):
+    help = ("Seed the configured database with a synthetic dataset (users in each group, categories, menu items, "
+            f"ratings, carts, orders). Seeded users are named {SEED_PREFIX}<role>-<n>, password {SEED_PASSWORD!r}.")
+
+    def add_arguments(self, parser):
+        for field in dataclasses.fields(Scale):
+            parser.add_argument(f"--{field.name.replace('_', '-')}", type=int, default=field.default)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='Remove a previously seeded dataset first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_seeded()
+        elif seeded_exists():
+            raise CommandError('The database already holds a seeded dataset; pass --clear to replace it.')
+        scale = Scale(**{field.name: options[field.name] for field in dataclasses.fields(Scale)})
+        ids = seed(scale, random.Random(options['random_seed']))
+        counts = ', '.join(f'{len(members)} {role}' for role, members in ids['users'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts} users, {len(ids['categories'])} categories, {len(ids['menu_items'])} menu items, "
+            f"{scale.ratings} ratings, {len(ids['orders'])} orders"))
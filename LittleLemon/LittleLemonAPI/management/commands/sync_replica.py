@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from LittleLemonAPI.replicas import REPLICA_DATABASE, record_sync
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary SQLite database into the replica file (DATABASES['replica']), the local "
+            "stand-in for replication. Use --interval to keep copying; the replica's lag is at most one interval "
+            "plus a copy, so keep it below REPLICA_PIN_SECONDS. Reads only use the replica with "
+            "READ_REPLICA_ENABLED and while its last copy is at most REPLICA_PIN_SECONDS old.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Copy again every this many seconds (default: copy once)')
+
+    def handle(self, *args, **options):
+        if REPLICA_DATABASE not in connections.settings:
+            raise CommandError(f"DATABASES has no '{REPLICA_DATABASE}' entry")
+        primary = connections[DEFAULT_DB_ALIAS]
+        replica = connections.settings[REPLICA_DATABASE]
+        if primary.vendor != 'sqlite' or not replica['ENGINE'].endswith('sqlite3'):
+            raise CommandError('sync_replica copies SQLite files; use the database server\'s replication instead')
+        try:
+            while True:
+                self._copy(primary, replica)
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _copy(self, primary, replica):
+        started, timer = time.time(), time.perf_counter()
+        primary.ensure_connection()
+        destination = sqlite3.connect(replica['NAME'])
+        try:
+            # One step: readers of the replica never see a half-copied database
+            primary.connection.backup(destination)
+            destination.execute('PRAGMA journal_mode=WAL')
+        finally:
+            destination.close()
+        # The router only reads a replica synced within REPLICA_PIN_SECONDS
+        record_sync(replica, started)
+        self.stdout.write(f'Copied {primary.settings_dict["NAME"]} to {replica["NAME"]} '
+                          f'in {(time.perf_counter() - timer) * 1000:.0f}ms')
@@ -0,0 +1,167 @@
+"""Per-endpoint request metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware records, for every request that resolved to a view:
+
+- total latency (middleware in to response out),
+- the number of SQL queries and the time spent in them (all connections),
+- render time: turning the response data into the body (DRF renderers).
+  Building that data (serializers, fast_serializers) happens in the view and
+  counts towards the total latency only.
+
+Observations go into in-process histograms labelled by URL route and method
+(``api/orders/<int:pk>/``, not the concrete path, to keep cardinality low).
+Each server process keeps its own registry, so scrape every worker. Queries
+run while a StreamingHttpResponse is consumed happen after the middleware
+returns and are not counted.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, documentation, buckets, labels=('view', 'method')):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # one counter per bucket, then sum and count
+                series = self._series[label_values] = [0] * len(self.buckets) + [0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for label_values, values in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{labels},le="{_number(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {_number(values[-2])}')
+            lines.append(f'{self.name}_count{{{labels}}} {values[-1]}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUEST_DURATION = Histogram('littlelemon_request_duration_seconds', 'Total request latency.', DURATION_BUCKETS)
+DB_DURATION = Histogram('littlelemon_db_duration_seconds', 'Time spent executing SQL per request.', DURATION_BUCKETS)
+DB_QUERIES = Histogram('littlelemon_db_queries', 'SQL queries executed per request.', QUERY_BUCKETS)
+RENDER_DURATION = Histogram('littlelemon_render_duration_seconds',
+                            'Time spent rendering the response body per request.', DURATION_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, RENDER_DURATION)
+
+
+def render_metrics():
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+class _RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_render(request, seconds):
+    """Add rendering time for views that render their own response (see async_views)."""
+    stats = getattr(request, '_metrics', None)
+    if stats is not None:
+        stats.render_time += seconds
+
+
+class MetricsMiddleware:
+    # Async-capable, so ASGI requests to async views stay on the event loop
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.measure(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def measure(self, request):
+        stats = request._metrics = _RequestStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            labels = (match.route or match.view_name, request.method)
+            REQUEST_DURATION.observe(labels, elapsed)
+            DB_DURATION.observe(labels, stats.db_time)
+            DB_QUERIES.observe(labels, stats.queries)
+            RENDER_DURATION.observe(labels, stats.render_time)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook; time the render
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                record_render(request, time.perf_counter() - started)
+
+        response.render = timed_render
+        return response
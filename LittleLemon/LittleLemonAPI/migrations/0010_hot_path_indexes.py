@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0009_menuitem_is_item_of_the_day'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'inventory'], name='menuitem_category_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['price'], name='menuitem_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['inventory'], name='menuitem_inventory_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(condition=models.Q(('is_item_of_the_day', True)), fields=['is_item_of_the_day'], name='menuitem_item_of_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-date'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_crew', '-date'], name='order_crew_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-date'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total'], name='order_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['menu_item', 'user'], name='rating_menu_item_user_idx'),
+        ),
+    ]
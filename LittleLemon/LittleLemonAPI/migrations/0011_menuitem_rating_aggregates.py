@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    Rating = apps.get_model('LittleLemonAPI', 'Rating')
+    totals = Rating.objects.values('menu_item_id').annotate(count=Count('id'), total=Sum('score'))
+    for row in totals:
+        MenuItem.objects.filter(pk=row['menu_item_id']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            rating_avg=row['total'] / row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['rating_avg'], name='menuitem_rating_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['rating_count'], name='menuitem_rating_count_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
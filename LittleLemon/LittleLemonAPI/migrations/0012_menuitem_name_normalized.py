@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+def populate_name_normalized(apps, schema_editor):
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    items = list(MenuItem.objects.only('id', 'name'))
+    for item in items:
+        item.name_normalized = item.name.strip().casefold()
+    MenuItem.objects.bulk_update(items, ['name_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0011_menuitem_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='name_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_name_normalized, migrations.RunPython.noop),
+    ]
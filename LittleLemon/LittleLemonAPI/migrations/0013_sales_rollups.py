@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0012_menuitem_name_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='LittleLemonAPI.category')),
+            ],
+            options={
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='LittleLemonAPI.menuitem')),
+            ],
+            options={
+                'unique_together': {('date', 'menu_item')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:12
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    Order.objects.update(updated_at=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0013_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
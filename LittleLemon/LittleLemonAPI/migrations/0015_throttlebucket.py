@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0014_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0015_throttlebucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('delivery_crew__isnull', True), ('status', 0)), fields=['date', 'id'], name='order_unassigned_idx'),
+        ),
+    ]
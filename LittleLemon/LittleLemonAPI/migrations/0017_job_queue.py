@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_orders_rolled_up(apps, schema_editor):
+    # Checkout added them to the rollups synchronously until now
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    Order.objects.update(rolled_up_at=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0016_order_dispatch_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_orders_rolled_up, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField()),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0017_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=32)),
+                ('data', models.JSONField()),
+                ('user_id', models.IntegerField()),
+                ('delivery_crew_ids', models.JSONField(default=list)),
+            ],
+        ),
+    ]
@@ -10,12 +10,44 @@ class Category(models.Model):
     def __str__(self):
         return self.title
     
+def normalize_name(name):
+    """Case-insensitive form of a dish name, used for duplicate checks."""
+    return name.strip().casefold()
+
 class MenuItem(models.Model):
     name = models.CharField(max_length=100)
+    # normalize_name(name), kept in sync by save(); indexed for the duplicate-name check
+    name_normalized = models.CharField(max_length=100, editable=False, db_index=True, default='')
     price = models.DecimalField(max_digits=6, decimal_places=2)
     inventory = models.IntegerField()
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     is_item_of_the_day = models.BooleanField(default=False, help_text="Marks this menu item as the item of the day (only one should be True)")
+    # Denormalized from Rating, maintained incrementally by LittleLemonAPI.ratings
+    # (rebuild with `manage.py rebuild_rating_aggregates`)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            # MenuItemFilterView: price/inventory ranges, alone or within a category
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+            models.Index(fields=['category', 'inventory'], name='menuitem_category_stock_idx'),
+            models.Index(fields=['price'], name='menuitem_price_idx'),
+            models.Index(fields=['inventory'], name='menuitem_inventory_idx'),
+            # ?ordering=-rating_avg / rating_min, ?ordering=-rating_count
+            models.Index(fields=['rating_avg'], name='menuitem_rating_avg_idx'),
+            models.Index(fields=['rating_count'], name='menuitem_rating_count_idx'),
+            # item_of_the_day: only the flagged row is indexed
+            models.Index(fields=['is_item_of_the_day'], condition=models.Q(is_item_of_the_day=True), name='menuitem_item_of_day_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_normalized'}
+        super().save(*args, **kwargs)
 
 class Rating(models.Model):
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='ratings')
@@ -23,6 +55,12 @@ class Rating(models.Model):
     comment = models.TextField(blank=True, null=True)  # Optional comment field
     user = models.ForeignKey(User, on_delete=models.CASCADE)  # To track which user gave the rating
 
+    class Meta:
+        indexes = [
+            # RatingsView ?menu_item= filter and the (user, menu_item) uniqueness check
+            models.Index(fields=['menu_item', 'user'], name='rating_menu_item_user_idx'),
+        ]
+
 class CartItem(models.Model):
     """Represents a MenuItem in a user's cart.
 
@@ -57,6 +95,25 @@ class Order(models.Model):
     status = models.IntegerField(choices=STATUS_CHOICES, default=0)
     total = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     date = models.DateTimeField(auto_now_add=True)
+    # Bumped by every save(); the version stamp behind orders/<pk>/ ETags
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set by the job that adds the order to the sales rollups, so a redelivered job adds it only once
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # OrdersView lists newest first, per role (customer / delivery crew / status filter)
+            models.Index(fields=['-date'], name='order_date_idx'),
+            models.Index(fields=['user', '-date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', '-date'], name='order_crew_date_idx'),
+            models.Index(fields=['status', '-date'], name='order_status_date_idx'),
+            # OrderFilterView total_min/total_max
+            models.Index(fields=['total'], name='order_total_idx'),
+            # Dispatch: orders changed since the last run, and the unassigned queue
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+            models.Index(fields=['date', 'id'], name='order_unassigned_idx',
+                         condition=models.Q(delivery_crew__isnull=True, status=0)),
+        ]
 
     def __str__(self):
         return f"Order #{self.pk} by {self.user.username}"
@@ -73,4 +130,81 @@ class OrderItem(models.Model):
 
     @property
     def total_price(self):
-        return self.unit_price * self.quantity
\ No newline at end of file
+        return self.unit_price * self.quantity
+
+
+# Sales rollups: maintained incrementally after checkout (LittleLemonAPI.rollups, run as a job),
+# rebuilt with `manage.py backfill_sales_rollups`. Dates are in TIME_ZONE.
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class DailyItemSales(models.Model):
+    date = models.DateField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menu_item')
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'category')
+
+
+# Token buckets of the API throttles (LittleLemonAPI.throttles), shared by all
+# worker processes through the database
+class ThrottleBucket(models.Model):
+    key = models.CharField(max_length=200, primary_key=True)
+    tokens = models.FloatField()
+    updated = models.FloatField()  # Unix time of the last refill
+
+
+# Background jobs (LittleLemonAPI.jobs), run by `manage.py run_jobs`
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Queued: not before run_at. Running: leased until locked_until, then redelivered
+    run_at = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# Order changes for the server-sent event streams (LittleLemonAPI.events). Written
+# in the transaction of the change, read by every ASGI process; the newest
+# EVENT_BUFFER_SIZE are kept for clients catching up with Last-Event-ID
+class OrderEvent(models.Model):
+    type = models.CharField(max_length=32)
+    data = models.JSONField()
+    # Who may see it: the customer and the assigned crew (before and after the change)
+    user_id = models.IntegerField()
+    delivery_crew_ids = models.JSONField(default=list)
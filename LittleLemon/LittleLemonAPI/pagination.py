@@ -1,4 +1,113 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination: no COUNT(*) and no OFFSET, so every page costs the same.
+
+    The ordering comes from the view's OrderingFilter (``?ordering=`` or the
+    view's ``ordering``) and always ends with the primary key. The cursor stores
+    the full (value, ..., id) key of the boundary row and the next page seeks
+    past it with a row-value comparison, which stays exact even when many rows
+    share the same date or price (DRF's stock cursor falls back to offsets there).
+    """
+    page_size = 10
+    page_size_query_param = 'number_pages'
+    max_page_size = 100
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    def page_queryset(self, queryset, request, view=None):
+        """The query for the requested page (plus one lookahead row); None if not paginating."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+        self.current_position = self.cursor.position if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.current_position is not None:
+            queryset = queryset.filter(self._seek_after(ordering, self.current_position))
+        # One extra row tells whether a following page exists
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        """Take the rows fetched from page_queryset() and set up the page and its links."""
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = self.current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = self.current_position is not None
+            self.next_position = following_position
+            self.previous_position = self.current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _seek_after(self, ordering, position):
+        """Q for rows strictly after ``position`` in ``ordering``:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            condition |= equal & Q(**{field + lookup: value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if field_name == 'pk':
+                field_name = 'id'
+            attr = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(str(attr))
+        return json.dumps(values)
+
+
+def _reverse_ordering(ordering):
+    return tuple(order[1:] if order.startswith('-') else '-' + order for order in ordering)
+
 
 class MenuItemsPagination(PageNumberPagination):
     # Default items per page if the client doesn't specify
@@ -7,3 +116,60 @@ class MenuItemsPagination(PageNumberPagination):
     page_size_query_param = 'number_pages'
     # Put a reasonable upper bound to avoid huge responses
     max_page_size = 100
+    # Clients opt in to keyset pagination with ?pagination=cursor; the
+    # next/previous links then carry ?cursor=... (and keep the opt-in param)
+    pagination_mode_query_param = 'pagination'
+    cursor_class = KeysetPagination
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.pagination_mode_query_param) == 'cursor'
+                or self.cursor_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            page = self.cursor_paginator.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.cursor_paginator.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() on the async ORM: same pages, same links."""
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            page_queryset = self.cursor_paginator.page_queryset(queryset, request, view)
+            if page_queryset is None:
+                return None
+            page = self.cursor_paginator.set_page([row async for row in page_queryset])
+            self.display_page_controls = self.cursor_paginator.display_page_controls
+            return page
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # pre-fills the cached_property
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        rows = [row async for row in queryset[bottom:bottom + page_size]]
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
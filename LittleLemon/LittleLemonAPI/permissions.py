@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .roles import is_manager, is_customer
+
 
 class IsManagerOrAdminOrReadOnly(BasePermission):
     """Allow read-only access to anyone, but write access only to superusers or users in the 'Manager' group.
@@ -12,12 +14,7 @@ class IsManagerOrAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-        user = request.user
-        if not user or not user.is_authenticated:
-            return False
-        if user.is_superuser:
-            return True
-        return user.groups.filter(name='Manager').exists()
+        return is_manager(request.user)
 
 
 class IsManagerOrAdmin(BasePermission):
@@ -27,22 +24,12 @@ class IsManagerOrAdmin(BasePermission):
     """
 
     def has_permission(self, request, view):
-        user = request.user
-        if not user or not user.is_authenticated:
-            return False
-        if user.is_superuser:
-            return True
-        return user.groups.filter(name='Manager').exists()
+        return is_manager(request.user)
 
 
 class IsCustomer(BasePermission):
     """Allow only authenticated users who are NOT managers, NOT delivery crew, and NOT superusers."""
 
     def has_permission(self, request, view):
-        user = request.user
-        if not user or not user.is_authenticated:
-            return False
-        if user.is_superuser:
-            return False
         # Customers are users not in Manager nor Delivery Crew groups
-        return not user.groups.filter(name__in=['Manager', 'Delivery Crew']).exists()
+        return is_customer(request.user)
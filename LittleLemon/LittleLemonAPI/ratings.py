@@ -0,0 +1,43 @@
+"""Incremental maintenance of the rating aggregates stored on MenuItem.
+
+Each Rating write applies a delta to its menu item with a single UPDATE, so the
+average and count are always available without aggregating the Rating table.
+The aggregates are live fields of the catalog cache (caching.py): writing them
+never invalidates cached catalog responses.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import MenuItem, Rating
+
+
+def apply_rating_delta(menu_item_id, count_delta, sum_delta):
+    """Atomically add ``count_delta`` ratings totalling ``sum_delta`` points."""
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    MenuItem.objects.filter(pk=menu_item_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, 0), 0.0),
+    )
+
+
+def rebuild_rating_aggregates(menu_item_ids=None):
+    """Recompute the aggregates from the Rating table. Returns the number of items updated."""
+    totals = Rating.objects.values('menu_item_id').annotate(count=Count('id'), total=Sum('score'))
+    items = MenuItem.objects.all()
+    if menu_item_ids is not None:
+        totals = totals.filter(menu_item_id__in=menu_item_ids)
+        items = items.filter(pk__in=menu_item_ids)
+    by_item = {row['menu_item_id']: (row['count'], row['total']) for row in totals}
+    updated = []
+    for item in items.only('id'):
+        count, total = by_item.get(item.pk, (0, 0))
+        item.rating_count = count
+        item.rating_sum = total
+        item.rating_avg = total / count if count else 0.0
+        updated.append(item)
+    with transaction.atomic():
+        MenuItem.objects.bulk_update(updated, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+    return len(updated)
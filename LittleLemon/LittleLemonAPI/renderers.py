@@ -0,0 +1,68 @@
+"""Line-oriented renderers used by the streaming import/export endpoints
+(and the plain-text metrics and event-stream endpoints).
+
+The export views stream their own body (see bulk.py); these renderers make
+``?format=csv`` / ``?format=ndjson`` and the matching Accept headers negotiate,
+and render small payloads such as error responses in the same format.
+"""
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(json.dumps(row, cls=JSONEncoder) + '\n' for row in rows).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Prometheus text exposition format; ``data`` is the already formatted text."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # error payloads, e.g. {"detail": ...}
+        return '\n'.join(f'# {key}: {value}' for key, value in (data or {}).items()).encode(self.charset)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets EventSource clients (Accept: text/event-stream) negotiate; the stream itself is written by the view."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # error payloads, e.g. {"detail": ...}
+        return f'event: error\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'.encode(self.charset)
@@ -0,0 +1,181 @@
+"""Read replica routing with read-your-writes.
+
+ReplicaRouter sends reads of the catalog, ratings and orders to the
+``replica`` database. This only happens while ReplicaMiddleware is handling a
+safe-method request (GET, HEAD, OPTIONS). All other queries use the primary:
+writes, reads in a transaction, reads outside requests (commands, the job
+worker) and reads of any other model (users, tokens, carts, throttles).
+
+Nothing is read from the replica unless settings.READ_REPLICA_ENABLED is set.
+
+The replica lags behind the primary, so reads stay on the primary for
+REPLICA_PIN_SECONDS:
+
+- for a user after any unsafe request of theirs, so a customer sees the order
+  they just placed (the pin lives in the cache, which must be shared by all
+  workers: ReplicaMiddleware refuses to start on a per-process cache);
+- for everybody after a catalog write. Otherwise a replica read could fill
+  the catalog cache (caching.py) with old data under the new version.
+
+Locally the replica is a second SQLite file that ``manage.py sync_replica``
+copies from the primary. Each copy records when it started (record_sync());
+while the last one is older than REPLICA_PIN_SECONDS, because it never ran or
+stopped running, every read uses the primary. Responses streamed after the
+middleware has returned (CSV exports, event streams) also read from the primary.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .caching import get_catalog_version, is_shared_cache
+
+REPLICA_DATABASE = 'replica'
+# Longer than the replica ever lags behind
+REPLICA_PIN_SECONDS = 10
+
+CATALOG_MODELS = {'LittleLemonAPI.Category', 'LittleLemonAPI.MenuItem'}
+REPLICATED_MODELS = CATALOG_MODELS | {'LittleLemonAPI.Rating', 'LittleLemonAPI.Order', 'LittleLemonAPI.OrderItem'}
+
+_request = ContextVar('replica_request', default=None)
+
+
+def replica_enabled():
+    return getattr(settings, 'READ_REPLICA_ENABLED', False)
+
+
+def replica_alias():
+    """The replica's alias, or None if reads can't use one.
+
+    That is the case unless READ_REPLICA_ENABLED, when none is configured,
+    when it is the primary itself (a test mirror) and when a SQLite replica
+    was last synced more than REPLICA_PIN_SECONDS ago.
+    """
+    if not replica_enabled():
+        return None
+    settings_dict = connections.settings.get(REPLICA_DATABASE)
+    if settings_dict is None or settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    if settings_dict['ENGINE'].endswith('sqlite3') and time.time() - last_sync(settings_dict) > REPLICA_PIN_SECONDS:
+        return None
+    return REPLICA_DATABASE
+
+
+def _sync_stamp(settings_dict):
+    # Its modification time is the start of the last complete copy
+    return f"{settings_dict['NAME']}.synced"
+
+
+def record_sync(settings_dict, started):
+    """Record that the SQLite replica holds the primary's data as of ``started`` (a Unix timestamp)."""
+    path = _sync_stamp(settings_dict)
+    with open(path, 'a'):
+        pass
+    os.utime(path, (started, started))
+
+
+def last_sync(settings_dict):
+    """Unix timestamp of the data in the SQLite replica; 0 if it was never synced."""
+    try:
+        return os.path.getmtime(_sync_stamp(settings_dict))
+    except OSError:
+        return 0
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Read ``user_id``'s data from the primary for the next REPLICA_PIN_SECONDS."""
+    cache.set(_pin_key(user_id), True, REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+def _catalog_recently_written():
+    return time.time_ns() - get_catalog_version() < REPLICA_PIN_SECONDS * 10 ** 9
+
+
+def _memoized(request, name, compute):
+    # One cache lookup per request, however many queries it runs
+    values = request.__dict__.setdefault('_replica', {})
+    if name not in values:
+        values[name] = compute()
+    return values[name]
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        request = _request.get()
+        if (request is None or request.method not in SAFE_METHODS
+                or model._meta.label not in REPLICATED_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        user = getattr(request, 'user', None)
+        # DRF sets request.user once it has authenticated the token
+        if user is not None and user.is_authenticated and _memoized(request, f'pinned:{user.pk}', lambda: is_pinned(user.pk)):
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in CATALOG_MODELS and _memoized(request, 'catalog', _catalog_recently_written):
+            return DEFAULT_DB_ALIAS
+        return _memoized(request, 'alias', replica_alias) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit: Django would otherwise write an instance back where it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary, schema included (sync_replica)
+        return db != REPLICA_DATABASE
+
+
+class ReplicaMiddleware:
+    """Lets ReplicaRouter see the current request; pins users to the primary after they write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replica_enabled() and not is_shared_cache():
+            raise ImproperlyConfigured('READ_REPLICA_ENABLED needs a cache shared by all worker processes '
+                                       '(CACHES): it holds the read-your-writes pins.')
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self._pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self._pin_writer(request)
+        return response
+
+    def _pin_writer(self, request):
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
@@ -0,0 +1,94 @@
+"""Role resolution shared by the permission classes and the views.
+
+A user's roles are derived from their groups once per request (memoized on the
+request's user object) and kept in the shared cache between requests. The cache
+is invalidated by the m2m_changed receivers in signals.py and by the group
+management endpoints, so steady-state role checks cost no queries.
+
+Like credentials, roles are only cached in a backend shared by all worker
+processes (caching.is_shared_cache()): with LocMemCache a removed manager would
+keep the role in every other worker. Otherwise they cost one query per request.
+"""
+import time
+
+from django.core.cache import cache
+
+from .caching import is_shared_cache
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery Crew'
+
+# Group name -> role. The seeded database uses 'DeliveryCrew' while the
+# groups/delivery-crew/users endpoints use 'Delivery Crew'; both mean the same role.
+GROUP_ROLES = {
+    'Manager': MANAGER,
+    'Delivery Crew': DELIVERY_CREW,
+    'DeliveryCrew': DELIVERY_CREW,
+}
+
+ROLES_GENERATION_KEY = 'roles:generation'
+ROLES_CACHE_TIMEOUT = 60 * 60
+
+
+def _generation():
+    generation = cache.get(ROLES_GENERATION_KEY)
+    if generation is None:
+        cache.add(ROLES_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(ROLES_GENERATION_KEY)
+    return generation
+
+
+def _roles_key(user_id, generation):
+    return f'roles:{generation}:{user_id}'
+
+
+def get_roles(user):
+    """Return the frozenset of roles of ``user`` (empty for anonymous users)."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_littlelemon_roles', None)
+    if roles is not None:
+        return roles
+    if not is_shared_cache():
+        roles = _load_roles(user)
+    else:
+        key = _roles_key(user.pk, _generation())
+        roles = cache.get(key)
+        if roles is None:
+            roles = _load_roles(user)
+            cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+    user._littlelemon_roles = roles
+    return roles
+
+
+def _load_roles(user):
+    names = user.groups.values_list('name', flat=True)
+    return frozenset(GROUP_ROLES[name] for name in names if name in GROUP_ROLES)
+
+
+def invalidate_roles(*user_ids):
+    generation = _generation()
+    cache.delete_many([_roles_key(user_id, generation) for user_id in user_ids])
+
+
+def invalidate_all_roles():
+    """Drop every cached role set (used when groups are renamed or deleted)."""
+    cache.set(ROLES_GENERATION_KEY, time.time_ns(), None)
+
+
+def is_manager(user):
+    """Superusers and members of the Manager group."""
+    if not user or not user.is_authenticated:
+        return False
+    return user.is_superuser or MANAGER in get_roles(user)
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def is_customer(user):
+    """Authenticated users who are not superusers, managers or delivery crew."""
+    if not user or not user.is_authenticated or user.is_superuser:
+        return False
+    return not get_roles(user)
@@ -0,0 +1,98 @@
+"""Precomputed sales rollups (per day, per day and menu item, per day and category).
+
+record_order() adds one completed order to the rollups with a handful of
+single-row UPDATEs, so the analytics endpoint never aggregates Order/OrderItem.
+It runs in the background after checkout (tasks.roll_up_order), so the rollups
+trail new orders by the job queue's latency. Deleting a rolled-up order takes
+it back out (remove_order(), from a pre_delete signal), whichever way it is
+deleted: the order endpoint, the admin, or a cascade from its user.
+rebuild_rollups() recomputes them from the order tables (backfill / repair).
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, DailySales, DailyItemSales, DailyCategorySales
+
+
+def _increment(model, keys, **deltas):
+    """UPDATE model SET f = f + delta WHERE keys; insert the row if it does not exist yet."""
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another checkout created the row first
+        model.objects.filter(**keys).update(**increments)
+
+
+def _order_deltas(order, order_items):
+    """(model, keys, deltas) of each rollup row ``order`` counts towards."""
+    day = timezone.localdate(order.date)
+    per_item = defaultdict(lambda: [0, 0])
+    per_category = defaultdict(lambda: [0, 0])
+    for oi in order_items:
+        line_total = oi.unit_price * oi.quantity
+        for totals in (per_item[oi.menu_item_id], per_category[oi.menu_item.category_id]):
+            totals[0] += oi.quantity
+            totals[1] += line_total
+    quantity = sum(q for q, _ in per_item.values())
+    yield DailySales, {'date': day}, {'orders': 1, 'quantity': quantity, 'revenue': order.total}
+    for menu_item_id, (q, revenue) in per_item.items():
+        yield DailyItemSales, {'date': day, 'menu_item_id': menu_item_id}, {'quantity': q, 'revenue': revenue}
+    for category_id, (q, revenue) in per_category.items():
+        yield DailyCategorySales, {'date': day, 'category_id': category_id}, {'quantity': q, 'revenue': revenue}
+
+
+def record_order(order, order_items):
+    """Add ``order`` and its lines (OrderItems with menu_item loaded) to the rollups."""
+    for model, keys, deltas in _order_deltas(order, order_items):
+        _increment(model, keys, **deltas)
+
+
+def remove_order(order, order_items):
+    """Subtract a rolled-up ``order`` and its lines from the rollups; rows left empty are deleted."""
+    for model, keys, deltas in _order_deltas(order, order_items):
+        model.objects.filter(**keys).update(**{field: F(field) - value for field, value in deltas.items()})
+        counter = 'orders' if model is DailySales else 'quantity'
+        model.objects.filter(**keys, **{counter: 0}).delete()
+
+
+@transaction.atomic
+def rebuild_rollups(date_min=None, date_max=None):
+    """Recompute the rollups for [date_min, date_max] (all dates by default). Returns the number of days."""
+    orders = Order.objects.annotate(day=TruncDate('date'))
+    lines = OrderItem.objects.annotate(day=TruncDate('order__date'))
+    rollups = [DailySales.objects, DailyItemSales.objects, DailyCategorySales.objects]
+    if date_min:
+        orders, lines = orders.filter(day__gte=date_min), lines.filter(day__gte=date_min)
+        rollups = [qs.filter(date__gte=date_min) for qs in rollups]
+    if date_max:
+        orders, lines = orders.filter(day__lte=date_max), lines.filter(day__lte=date_max)
+        rollups = [qs.filter(date__lte=date_max) for qs in rollups]
+    for qs in rollups:
+        qs.all().delete()
+    # Counted here; their pending roll-up jobs must not add them again
+    Order.objects.filter(pk__in=orders.filter(rolled_up_at__isnull=True).values('pk')).update(rolled_up_at=timezone.now())
+
+    line_total = ExpressionWrapper(F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    day_quantities = dict(lines.values_list('day').annotate(q=Sum('quantity')).order_by())
+    days = orders.values('day').annotate(orders=Count('id'), revenue=Sum('total')).order_by()
+    DailySales.objects.bulk_create([
+        DailySales(date=row['day'], orders=row['orders'], quantity=day_quantities.get(row['day'], 0), revenue=row['revenue'])
+        for row in days
+    ], batch_size=500)
+    DailyItemSales.objects.bulk_create([
+        DailyItemSales(date=row['day'], menu_item_id=row['menu_item_id'], quantity=row['q'], revenue=row['revenue'])
+        for row in lines.values('day', 'menu_item_id').annotate(q=Sum('quantity'), revenue=Sum(line_total)).order_by()
+    ], batch_size=500)
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(date=row['day'], category_id=row['menu_item__category_id'], quantity=row['q'], revenue=row['revenue'])
+        for row in lines.values('day', 'menu_item__category_id').annotate(q=Sum('quantity'), revenue=Sum(line_total)).order_by()
+    ], batch_size=500)
+    return len(days)
@@ -0,0 +1,135 @@
+"""Full-text search over menu items (SQLite FTS5).
+
+The FTS table mirrors MenuItem.name and the category title, keyed by the menu
+item id, and is kept in sync by triggers, so every write path (ORM, bulk
+operations, admin, raw SQL) updates it. ``install_menu_search`` (run after every
+``migrate``) creates the table and triggers if missing; SQLite drops a table's
+triggers whenever a migration rebuilds that table, in which case the index is
+rebuilt as well.
+
+On other databases, or SQLite builds without FTS5, MenuItemSearchFilter falls
+back to DRF's LIKE-based SearchFilter.
+"""
+import logging
+
+from django.db import connection, DatabaseError
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+MENU_ITEM_TABLE = 'LittleLemonAPI_menuitem'
+CATEGORY_TABLE = 'LittleLemonAPI_category'
+
+_CREATE_TABLE = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+    name, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)'''
+
+_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f'''
+CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ai" AFTER INSERT ON "{MENU_ITEM_TABLE}" BEGIN
+    INSERT INTO "{FTS_TABLE}"(rowid, name, category)
+    VALUES (new.id, new.name, (SELECT title FROM "{CATEGORY_TABLE}" WHERE id = new.category_id));
+END''',
+    f'{FTS_TABLE}_au': f'''
+CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_au" AFTER UPDATE OF name, category_id ON "{MENU_ITEM_TABLE}" BEGIN
+    DELETE FROM "{FTS_TABLE}" WHERE rowid = old.id;
+    INSERT INTO "{FTS_TABLE}"(rowid, name, category)
+    VALUES (new.id, new.name, (SELECT title FROM "{CATEGORY_TABLE}" WHERE id = new.category_id));
+END''',
+    f'{FTS_TABLE}_ad': f'''
+CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ad" AFTER DELETE ON "{MENU_ITEM_TABLE}" BEGIN
+    DELETE FROM "{FTS_TABLE}" WHERE rowid = old.id;
+END''',
+    f'{FTS_TABLE}_category_au': f'''
+CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_category_au" AFTER UPDATE OF title ON "{CATEGORY_TABLE}" BEGIN
+    UPDATE "{FTS_TABLE}" SET category = new.title
+    WHERE rowid IN (SELECT id FROM "{MENU_ITEM_TABLE}" WHERE category_id = new.id);
+END''',
+}
+
+_REBUILD = [
+    f'DELETE FROM "{FTS_TABLE}"',
+    f'''INSERT INTO "{FTS_TABLE}"(rowid, name, category)
+    SELECT m.id, m.name, c.title FROM "{MENU_ITEM_TABLE}" m JOIN "{CATEGORY_TABLE}" c ON c.id = m.category_id''',
+]
+
+
+def install_menu_search(using=connection):
+    """Create the FTS table and triggers if missing; rebuild the index when anything was missing."""
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       [f'{FTS_TABLE}%'])
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE in existing and existing.issuperset(_TRIGGERS):
+            return True
+        try:
+            cursor.execute(_CREATE_TABLE)
+        except DatabaseError:
+            logger.warning('SQLite FTS5 is not available; menu search falls back to LIKE queries')
+            return False
+        for sql in _TRIGGERS.values():
+            cursor.execute(sql)
+        for sql in _REBUILD:
+            cursor.execute(sql)
+    using._menu_search_available = True
+    return True
+
+
+def menu_search_available(using=connection):
+    if using.vendor != 'sqlite':
+        return False
+    if not hasattr(using, '_menu_search_available'):
+        with using.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            using._menu_search_available = cursor.fetchone() is not None
+    return using._menu_search_available
+
+
+def build_match_query(terms):
+    """Turn search terms into an FTS5 query: every term must match as a prefix.
+
+    Terms are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    phrases = []
+    for term in terms:
+        term = term.strip('"').replace('"', '""').strip()
+        if term:
+            phrases.append(f'"{term}"*')
+    return ' '.join(phrases)
+
+
+class MenuItemSearchFilter(SearchFilter):
+    """?search= backed by the FTS index: indexed prefix matching on dish and
+    category, ranked by relevance (bm25) unless the client passes ?ordering=.
+
+    Keyset pages (?pagination=cursor) seek on ordering columns and bm25 isn't
+    one, so a cursor-paginated search must pass ?ordering= (400 otherwise).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not menu_search_available():
+            return super().filter_queryset(request, queryset, view)
+        match = build_match_query(terms)
+        if not match:
+            return queryset
+        queryset = queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s', (match,)))
+        if api_settings.ORDERING_PARAM in request.query_params:
+            return queryset
+        paginator = getattr(view, 'paginator', None)
+        if paginator is not None and getattr(paginator, 'use_cursor', lambda request: False)(request):
+            raise ValidationError({self.search_param: [
+                'Results ranked by relevance cannot be paged with a cursor: '
+                f'pass ?{api_settings.ORDERING_PARAM}= or use page numbers.']})
+        rank = RawSQL(
+            f'SELECT rank FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s AND rowid = "{MENU_ITEM_TABLE}"."id"',
+            (match,),
+        )
+        return queryset.annotate(search_rank=rank).order_by('search_rank', 'id')
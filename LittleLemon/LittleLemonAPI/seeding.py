@@ -0,0 +1,128 @@
+"""Synthetic datasets at a configurable scale, for benchmarks and local load tests.
+
+seed() writes everything with bulk_create, which skips save() and the
+signals, and then brings the derived data up to date itself: rating
+aggregates, sales rollups and the catalog version. Seeded rows carry the
+SEED_PREFIX (usernames, category slugs) so clear_seeded() can remove them.
+"""
+import random
+from dataclasses import dataclass, asdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User, Group
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_catalog_version
+from .models import Category, MenuItem, Rating, CartItem, Order, OrderItem, normalize_name
+from .ratings import rebuild_rating_aggregates
+from .rollups import rebuild_rollups
+
+SEED_PREFIX = 'seed-'
+# Every seeded user can log in with this password (api-token-auth/, auth/token/login/)
+SEED_PASSWORD = 'littlelemon-seed'
+
+
+@dataclass
+class Scale:
+    customers: int = 100
+    managers: int = 2
+    crew: int = 10
+    categories: int = 5
+    menu_items: int = 200
+    ratings: int = 1000
+    cart_lines: int = 3  # per customer
+    orders: int = 1000
+    order_lines: int = 3
+    inventory: int = 1000000  # per menu item, so checkouts in load tests don't run out
+
+    def as_dict(self):
+        return asdict(self)
+
+
+@transaction.atomic
+def seed(scale, rng=None):
+    """Create a dataset of ``scale`` and return a dict of ids (users by role, sample rows)."""
+    rng = rng or random.Random(0)
+    # One hash for everybody: hashing per user would dominate seeding time
+    password = make_password(SEED_PASSWORD)
+    groups = {
+        'manager': Group.objects.get_or_create(name='Manager')[0],
+        'crew': Group.objects.get_or_create(name='Delivery Crew')[0],
+    }
+    users = {}
+    for role, count in (('customer', scale.customers), ('manager', scale.managers), ('crew', scale.crew)):
+        users[role] = User.objects.bulk_create([
+            User(username=f'{SEED_PREFIX}{role}-{n}', email=f'{role}{n}@example.com', password=password)
+            for n in range(count)
+        ])
+        if role in groups:
+            groups[role].user_set.add(*users[role])
+
+    categories = Category.objects.bulk_create([
+        Category(slug=f'{SEED_PREFIX}category-{n}', title=f'Category {n}') for n in range(scale.categories)
+    ])
+    has_item_of_the_day = MenuItem.objects.filter(is_item_of_the_day=True).exists()
+    items = MenuItem.objects.bulk_create([
+        MenuItem(name=f'Dish {n}', name_normalized=normalize_name(f'Dish {n}'),
+                 price=Decimal(rng.randrange(300, 3000)) / 100, inventory=scale.inventory,
+                 category=categories[n % len(categories)], is_item_of_the_day=(n == 0 and not has_item_of_the_day))
+        for n in range(scale.menu_items)
+    ], batch_size=500)
+
+    customers = users['customer']
+    Rating.objects.bulk_create([
+        Rating(menu_item=rng.choice(items), user=rng.choice(customers), score=rng.randint(1, 5))
+        for _ in range(scale.ratings)
+    ], batch_size=500)
+    CartItem.objects.bulk_create([
+        CartItem(user=customer, menu_item=item, quantity=rng.randint(1, 3), unit_price=item.price)
+        for customer in customers
+        for item in rng.sample(items, min(scale.cart_lines, len(items)))
+    ], batch_size=500)
+
+    now = timezone.now()
+    lines = []
+    orders = []
+    for n in range(scale.orders):
+        chosen = rng.sample(items, min(scale.order_lines, len(items)))
+        quantities = [rng.randint(1, 3) for _ in chosen]
+        delivered = rng.random() < 0.5
+        orders.append(Order(
+            user=rng.choice(customers), total=sum(item.price * q for item, q in zip(chosen, quantities)),
+            delivery_crew=rng.choice(users['crew']) if users['crew'] and (delivered or rng.random() < 0.5) else None,
+            status=1 if delivered else 0, rolled_up_at=now,
+        ))
+        lines.append(list(zip(chosen, quantities)))
+    orders = Order.objects.bulk_create(orders, batch_size=500)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, menu_item=item, quantity=quantity, unit_price=item.price)
+        for order, order_lines in zip(orders, lines)
+        for item, quantity in order_lines
+    ], batch_size=500)
+
+    rebuild_rating_aggregates()
+    rebuild_rollups()
+    transaction.on_commit(bump_catalog_version)
+    return {
+        'users': {role: [user.pk for user in members] for role, members in users.items()},
+        'categories': [category.pk for category in categories],
+        'menu_items': [item.pk for item in items],
+        'orders': [order.pk for order in orders],
+    }
+
+
+def seeded_exists():
+    return User.objects.filter(username__startswith=SEED_PREFIX).exists()
+
+
+@transaction.atomic
+def clear_seeded():
+    """Delete what seed() created (and whatever hangs off it: orders, carts, ratings)."""
+    # Users first: their orders hold (protected) references to the seeded dishes
+    User.objects.filter(username__startswith=SEED_PREFIX).delete()
+    categories = Category.objects.filter(slug__startswith=SEED_PREFIX)
+    MenuItem.objects.filter(category__in=categories).delete()
+    categories.delete()
+    transaction.on_commit(bump_catalog_version)
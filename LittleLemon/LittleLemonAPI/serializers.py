@@ -1,9 +1,19 @@
 from rest_framework import serializers
-from .models import MenuItem, Category, Rating, CartItem, Order, OrderItem
+from .models import MenuItem, Category, Rating, CartItem, Order, OrderItem, normalize_name
+from .cart import add_to_cart
+from .dispatch import DISPATCH_BATCH_SIZE, DISPATCH_BATCH_MAX
+from .fieldsets import SparseFieldsMixin
 from django.contrib.auth.models import User
 from rest_framework.validators import UniqueTogetherValidator
 from decimal import Decimal
 
+TAX_RATE = Decimal('0.10')  # 10% tax
+CENT = Decimal('0.01')
+
+
+def price_after_tax(price):
+    return (price + (price * TAX_RATE)).quantize(CENT)
+
 class CategoryMiniSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='title')
 
@@ -11,7 +21,7 @@ class CategoryMiniSerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name']
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     dish = serializers.CharField(source='name')
     stock = serializers.IntegerField(source='inventory', min_value=0)
     price = serializers.DecimalField(max_digits=6, decimal_places=2, coerce_to_string=True, min_value=2)
@@ -22,22 +32,23 @@ class MenuItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = MenuItem
-    fields = ['id', 'dish', 'price', 'price_after_tax', 'stock', 'category', 'category_id', 'is_item_of_the_day']
+        fields = ['id', 'dish', 'price', 'price_after_tax', 'stock', 'category', 'category_id', 'is_item_of_the_day',
+                  'rating_count', 'rating_sum', 'rating_avg']
+        read_only_fields = ['rating_count', 'rating_sum', 'rating_avg']
 
     def get_price_after_tax(self, obj):
-        tax_rate = Decimal('0.10')  # 10% tax
-        return (obj.price + (obj.price * tax_rate)).quantize(Decimal('0.01'))
+        return price_after_tax(obj.price)
     
     def validate_dish(self, value: str) -> str:
         # Prevent duplicate names (case-insensitive). Exclude current instance when updating.
-        qs = MenuItem.objects.filter(name__iexact=value)
+        qs = MenuItem.objects.filter(name_normalized=normalize_name(value))
         if self.instance:
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
             raise serializers.ValidationError('Ya existe un plato con ese nombre.')
         return value
         
-class SingleItemSerializer(serializers.ModelSerializer):
+class SingleItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     dish = serializers.CharField(source='name')
     category = CategoryMiniSerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True)
@@ -49,13 +60,24 @@ class SingleItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'dish', 'price', 'category', 'category_id', 'stock', 'is_item_of_the_day']
     
     def validate_dish(self, value: str) -> str:
-        qs = MenuItem.objects.filter(name__iexact=value)
+        qs = MenuItem.objects.filter(name_normalized=normalize_name(value))
         if self.instance:
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
             raise serializers.ValidationError('Ya existe un plato con ese nombre.')
         return value
 
+class MenuItemImportRowSerializer(serializers.Serializer):
+    """One row of a bulk menu import (same rules as MenuItemSerializer).
+
+    Duplicate names and category existence are checked per batch in bulk.py,
+    so validating a row never queries the database.
+    """
+    dish = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=2)
+    stock = serializers.IntegerField(min_value=0)
+    category_id = serializers.IntegerField()
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -88,7 +110,7 @@ class RatingSerializer(serializers.ModelSerializer):
         fields = ['id', 'menu_item', 'score', 'comment', 'user']
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     menu_item_id = serializers.PrimaryKeyRelatedField(source='menu_item', queryset=MenuItem.objects.all(), write_only=True)
     dish = serializers.CharField(source='menu_item.name', read_only=True)
     unit_price = serializers.DecimalField(max_digits=6, decimal_places=2, read_only=True)
@@ -102,24 +124,32 @@ class CartItemSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         menu_item = validated_data['menu_item']
         quantity = validated_data.get('quantity', 1)
-        # Try to get existing cart item
-        obj, created = CartItem.objects.get_or_create(user=user, menu_item=menu_item, defaults={
-            'quantity': quantity,
-            'unit_price': menu_item.price,
-        })
-        if not created:
-            # Update quantity (additive)
-            obj.quantity += quantity
-            obj.save()
-        return obj
+        # Insert, or add to the existing line's quantity in the same statement (additive, race-free)
+        add_to_cart(user, {menu_item.pk: quantity}, {menu_item.pk: menu_item.price})
+        return CartItem.objects.select_related('menu_item').get(user=user, menu_item=menu_item)
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['total_price'] = instance.total_price
-        data['unit_price'] = instance.unit_price
+        # line_total is annotated by the database where the cart is listed
+        if 'total_price' in data:
+            data['total_price'] = getattr(instance, 'line_total', None) or instance.total_price
+        if 'unit_price' in data:
+            data['unit_price'] = instance.unit_price
         return data
 
 
+class CartSummarySerializer(serializers.Serializer):
+    item_count = serializers.IntegerField()
+    total_quantity = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class CartLineSerializer(serializers.Serializer):
+    """One line of a bulk cart add; menu items are checked per request in the view."""
+    menu_item_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
 class OrderItemReadSerializer(serializers.ModelSerializer):
     dish = serializers.CharField(source='menu_item.name', read_only=True)
     total_price = serializers.SerializerMethodField()
@@ -132,7 +162,7 @@ class OrderItemReadSerializer(serializers.ModelSerializer):
         return obj.total_price
 
 
-class OrderReadSerializer(serializers.ModelSerializer):
+class OrderReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.CharField(source='user.username', read_only=True)
     delivery_crew = serializers.SerializerMethodField()
     items = OrderItemReadSerializer(many=True, read_only=True)
@@ -156,4 +186,14 @@ class ManagerOrderUpdateSerializer(serializers.ModelSerializer):
 class DeliveryCrewOrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['status']
\ No newline at end of file
+        fields = ['status']
+
+
+class DispatchSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=DISPATCH_BATCH_MAX, default=DISPATCH_BATCH_SIZE)
+
+
+class SalesAnalyticsQuerySerializer(serializers.Serializer):
+    date_min = serializers.DateField(required=False)
+    date_max = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=['day', 'item', 'category'], default='day')
@@ -0,0 +1,116 @@
+from django.apps import apps
+from django.contrib.auth.models import User, Group
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .caching import bump_catalog_version
+from .roles import invalidate_roles, invalidate_all_roles
+from .models import MenuItem, Category, Rating, Order, OrderItem
+from .dispatch import engine as dispatch_engine
+from .ratings import apply_rating_delta
+from .rollups import remove_order
+from .authentication import invalidate_user
+
+
+# Any catalog write (API, admin, shell) invalidates the cached catalog reads.
+# Queryset .update()/.bulk_create() calls bypass these signals and must call
+# bump_catalog_version() themselves, unless they only write live fields
+# (stock, ratings; see caching.py).
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+# Group membership changes from any side (user.groups / group.user_set / admin)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_cached_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_roles(instance.pk)
+    elif action == 'post_clear':
+        # The cleared members are no longer known here
+        invalidate_all_roles()
+    else:
+        invalidate_roles(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, **kwargs):
+    invalidate_all_roles()
+
+
+# Keep MenuItem.rating_* in step with Rating rows
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, raw, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        instance._previous_rating = Rating.objects.filter(pk=instance.pk).values('menu_item_id', 'score').first()
+
+
+@receiver(post_save, sender=Rating)
+def add_rating_to_aggregates(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous:
+        apply_rating_delta(previous['menu_item_id'], -1, -previous['score'])
+    apply_rating_delta(instance.menu_item_id, 1, instance.score)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    apply_rating_delta(instance.menu_item_id, -1, -instance.score)
+
+
+# The dispatch engine's load sees status changes through Order.updated_at, but
+# deleted orders leave no row behind
+@receiver(post_delete, sender=Order)
+def forget_dispatched_order(sender, instance, **kwargs):
+    dispatch_engine.forget(instance.pk)
+
+
+# Deleted orders leave the sales rollups. Before the delete, while its lines
+# still exist, and in its transaction: the roll-up job can't claim the order
+# in between, and one that runs later finds it gone. The stored row is what
+# was rolled up; the instance being deleted may be stale.
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.pk, rolled_up_at__isnull=False).first()
+    if order is not None:
+        remove_order(order, OrderItem.objects.filter(order_id=order.pk).select_related('menu_item'))
+
+
+# Cached token/JWT authentication: logout (djoser deletes the user's tokens),
+# deactivation and other account changes drop the user's cached credentials
+@receiver(post_delete, sender=Token)
+def invalidate_token_credentials(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_credentials(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Every login saves last_login; nothing the authenticators check changed
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_credentials(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    @receiver(post_save, sender=BlacklistedToken)
+    def invalidate_blacklisted_credentials(sender, instance, created, **kwargs):
+        # TokenBlacklistView blacklists a refresh token; its user's cached access is dropped too
+        if created:
+            invalidate_user(instance.token.user_id)
@@ -0,0 +1,18 @@
+"""Background jobs (see jobs.py). Imported by the app config, so every process knows them."""
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import job
+from .models import Order, OrderItem
+from .rollups import record_order
+
+
+@job('orders.roll_up', on_checkout=True)
+def roll_up_order(order_id):
+    """Add a new order to the sales rollups, exactly once however often the job runs."""
+    with transaction.atomic():
+        # Claiming the order and incrementing the rollups commit together
+        if not Order.objects.filter(pk=order_id, rolled_up_at__isnull=True).update(rolled_up_at=timezone.now()):
+            return  # already rolled up (a redelivered job), or deleted
+        order = Order.objects.get(pk=order_id)
+        record_order(order, OrderItem.objects.filter(order_id=order_id).select_related('menu_item'))
@@ -0,0 +1,25 @@
+"""Test helpers."""
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+class QueryBudgetMixin:
+    """assertQueryBudget(): an endpoint may run at most ``budget`` SQL queries.
+
+    Unlike assertNumQueries the budget is an upper bound, so an optimization
+    doesn't break the test but an N+1 regression does.
+    """
+
+    def assertQueryBudget(self, budget, path, method='get', user=None, status=200, using='default', **kwargs):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with CaptureQueriesContext(connections[using]) as context:
+            response = getattr(client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, status, getattr(response, 'data', response.content))
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(f"{n}. {query['sql']}" for n, query in enumerate(context.captured_queries, start=1))
+            self.fail(f'{method.upper()} {path} ran {executed} queries, budget is {budget}:\n{queries}')
+        return response
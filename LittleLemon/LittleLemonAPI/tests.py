@@ -1,3 +1,1480 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import re
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User, Group
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import views, async_views, database, events, jobs, replicas, seeding, throttles
+from . import fast_serializers
+from .metrics import reset_metrics
+from .models import Category, MenuItem, Rating, Order, OrderItem, CartItem, ThrottleBucket, Job, DailySales
+from .models import DailyItemSales, DailyCategorySales
+from .models import OrderEvent as OrderEventRecord
+from .serializers import MenuItemSerializer, OrderReadSerializer
+from .authentication import LRUCache, clear_auth_cache
+from .caching import bump_catalog_version
+from .ratings import rebuild_rating_aggregates
+from .rollups import rebuild_rollups
+from .tasks import roll_up_order
+from .benchmarking import compare_results
+from .bulk import export_orders
+from .dispatch import engine as dispatch_engine
+from .events import broadcaster
+from .testing import QueryBudgetMixin
+from .throttles import consume
+
+# "SCAN <table>" without "USING ... INDEX" is a full table scan in SQLite's plan output
+# (FTS5 lookups show up as "SCAN <fts table> VIRTUAL TABLE INDEX ...")
+FULL_SCAN = re.compile(r'\bSCAN (\S+)(?!.*\b(USING|VIRTUAL TABLE)\b)')
+
+# A cache all worker processes would share, for the code that only caches in one
+SHARED_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                             'LOCATION': os.path.join(tempfile.gettempdir(), 'littlelemon-test-cache')}}
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN of the hot endpoint querysets must not contain full table scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.crew = User.objects.create(username='crew')
+        cls.crew.groups.add(Group.objects.create(name='Delivery Crew'))
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.menu_item = MenuItem.objects.create(name='Carbonara', price=10, inventory=5, category=cls.category)
+
+    def endpoint_queryset(self, view_class, path, user=None):
+        """The queryset the view would run for ``path``, after its filter backends."""
+        request = APIRequestFactory().get(path)
+        request.user = user
+        view = view_class(request=Request(request), format_kwarg=None, kwargs={})
+        view.request.user = user
+        return view.filter_queryset(view.get_queryset())
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        scans = [line for line in plan.splitlines() if FULL_SCAN.search(line)]
+        self.assertFalse(scans, f'Full table scan in query plan:\n{plan}\n{queryset.query}')
+
+    def assertEndpointNoFullScan(self, method, path, user, status=200, **kwargs):
+        """Every SELECT the endpoint runs, as captured, must plan without a full scan."""
+        client = APIClient()
+        client.force_authenticate(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, status, response.content)
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            scans = [line for line in plan.splitlines() if FULL_SCAN.search(line)]
+            self.assertFalse(scans, f'Full table scan in query plan:\n{plan}\n{sql}')
+
+    def test_orders_by_role(self):
+        for user in (self.customer, self.crew, self.manager):
+            with self.subTest(user=user.username):
+                self.assertNoFullScan(self.endpoint_queryset(views.OrdersView, '/api/orders/', user)[:10])
+
+    def test_order_filters(self):
+        for query in ('status=0', f'delivery_crew={self.crew.pk}', f'user={self.customer.pk}', 'total_min=10&total_max=50',
+                      'date_min=2025-01-01T00:00:00Z&date_max=2025-02-01T00:00:00Z'):
+            with self.subTest(query=query):
+                queryset = self.endpoint_queryset(views.OrdersView, f'/api/orders/?{query}', self.manager)
+                self.assertNoFullScan(queryset[:10])
+
+    def test_menu_item_filters(self):
+        # Open-ended ranges (e.g. only inventory_min) may legitimately scan in id order
+        # when SQLite expects them to match most rows, so the budget covers bounded ranges
+        category = self.category.pk
+        for query in ('price_min=2&price_max=10', 'inventory_min=5&inventory_max=50',
+                      f'category={category}', f'category={category}&price_min=2&price_max=10',
+                      f'category={category}&inventory_max=3', 'rating_min=3&rating_max=5'):
+            with self.subTest(query=query):
+                queryset = self.endpoint_queryset(views.MenuItemsView, f'/api/menu-items/?{query}')
+                self.assertNoFullScan(queryset)
+                self.assertNoFullScan(queryset.order_by())  # the paginator's COUNT(*)
+
+    def test_menu_item_search(self):
+        for query in ('search=carb', 'search=carb&ordering=price', f'search=pasta&category={self.category.pk}'):
+            with self.subTest(query=query):
+                self.assertNoFullScan(self.endpoint_queryset(views.MenuItemsView, f'/api/menu-items/?{query}'))
+
+    def test_duplicate_dish_check(self):
+        data = {'dish': 'CARBONARA', 'price': '12.00', 'stock': 3, 'category_id': self.category.pk}
+        self.assertEndpointNoFullScan('post', '/api/menu-items/', self.manager, 400, data=data, format='json')
+
+    def test_item_of_the_day(self):
+        MenuItem.objects.filter(pk=self.menu_item.pk).update(is_item_of_the_day=True)
+        self.assertEndpointNoFullScan('get', '/api/menu-items/item-of-the-day/', self.customer)
+
+    def test_ratings_by_menu_item(self):
+        path = f'/api/ratings/?menu_item={self.menu_item.pk}'
+        self.assertNoFullScan(self.endpoint_queryset(views.RatingsView, path))
+        self.assertNoFullScan(Rating.objects.filter(menu_item=self.menu_item, user=self.customer))
+
+    def test_order_detail(self):
+        order = Order.objects.create(user=self.customer, total=10)
+        OrderItem.objects.create(order=order, menu_item=self.menu_item, quantity=1, unit_price=10)
+        for user in (self.customer, self.manager):
+            with self.subTest(user=user.username):
+                self.assertEndpointNoFullScan('get', f'/api/orders/{order.pk}/', user)
+
+    def test_dispatch(self):
+        self.assertNoFullScan(Order.objects.filter(delivery_crew__isnull=True, status=0).order_by('date', 'id')[:200])
+        self.assertNoFullScan(Order.objects.filter(updated_at__gte='2025-01-01T00:00:00Z'))
+
+
+class KeysetPaginationTests(TestCase):
+    """?pagination=cursor walks every row exactly once, however many share the ordering value."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        for i in range(11):
+            MenuItem.objects.create(name=f'Dish {i}', price=[5, 10, 10, 10, 7][i % 5], inventory=i,
+                                    category=category, rating_avg=[4.5, 3.0, 4.5][i % 3])
+        orders = [Order.objects.create(user=cls.manager, total=i) for i in range(9)]
+        same_time = timezone.now() - timedelta(days=1)
+        Order.objects.filter(pk__in=[order.pk for order in orders[2:7]]).update(date=same_time)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def walk(self, path):
+        """Ids of every page following the next links, then of every page back through the previous links."""
+        forward, backward, pages = [], [], []
+        while path:
+            page = self.client.get(path).json()
+            pages.append(page)
+            forward += [row['id'] for row in page['results']]
+            path = page['next']
+        path = pages[-1]['previous']
+        while path:
+            page = self.client.get(path).json()
+            backward = [row['id'] for row in page['results']] + backward
+            path = page['previous']
+        self.assertGreater(len(pages), 2)
+        return forward, backward + [row['id'] for row in pages[-1]['results']]
+
+    def test_ties(self):
+        for ordering, expected in (
+            ('price', MenuItem.objects.order_by('price', 'id')),
+            ('-price', MenuItem.objects.order_by('-price', '-id')),
+            ('-rating_avg', MenuItem.objects.order_by('-rating_avg', '-id')),
+            ('rating_avg', MenuItem.objects.order_by('rating_avg', 'id')),
+        ):
+            with self.subTest(ordering=ordering):
+                expected = list(expected.values_list('id', flat=True))
+                self.assertEqual(self.walk(f'/api/menu-items/?pagination=cursor&number_pages=2&ordering={ordering}'),
+                                 (expected, expected))
+
+    def test_orders_by_date(self):
+        for ordering, expected in (('', Order.objects.order_by('-date', '-id')),
+                                   ('&ordering=date', Order.objects.order_by('date', 'id'))):
+            with self.subTest(ordering=ordering):
+                expected = list(expected.values_list('id', flat=True))
+                self.assertEqual(self.walk(f'/api/orders/?pagination=cursor&number_pages=2{ordering}'), (expected, expected))
+        for path in ('/api/orders/', '/api/async/orders/'):
+            with self.subTest(path=path):
+                dates = [order['date'] for order in self.client.get(path).json()['results']]
+                self.assertEqual(dates, sorted(dates, reverse=True))  # newest first with page numbers too
+
+    def test_malformed_cursor(self):
+        bad_position = base64.b64encode(b'p=not-json').decode()
+        wrong_length = base64.b64encode(b'p=%5B%221%22%5D').decode()  # ["1"] for a (price, id) ordering
+        for cursor in ('garbage', bad_position, wrong_length):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/menu-items/?ordering=price&cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+
+class SearchTests(TestCase):
+    """?search= on the FTS index: kept in sync by triggers, prefix matching, bm25 ranking, inert user input."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pasta = Category.objects.create(slug='pasta', title='Pasta')
+        cls.mains = Category.objects.create(slug='mains', title='Mains')
+        cls.lasagna = MenuItem.objects.create(name='Lasagna', price=12, inventory=5, category=cls.pasta)
+        cls.carbonara = MenuItem.objects.create(name='Pasta Carbonara', price=10, inventory=5, category=cls.pasta)
+        cls.steak = MenuItem.objects.create(name='Steak', price=20, inventory=5, category=cls.mains)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def dishes(self, query):
+        response = self.client.get('/api/menu-items/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['dish'] for item in response.json()['results']]
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.dishes('carb'), ['Pasta Carbonara'])
+        self.assertEqual(self.dishes('stea mai'), ['Steak'])
+        self.assertEqual(self.dishes('arbonara'), [])
+
+    def test_ranked_by_relevance(self):
+        # Lasagna matches in its category only, and comes first by id
+        self.assertEqual(self.dishes('pasta'), ['Pasta Carbonara', 'Lasagna'])
+        self.assertEqual(self.client.get('/api/menu-items/?search=pasta&ordering=-price').json()['results'][0]['dish'],
+                         'Lasagna')
+
+    def test_index_follows_writes(self):
+        item = MenuItem.objects.create(name='Risotto', price=14, inventory=5, category=self.mains)
+        self.assertEqual(self.dishes('risot'), ['Risotto'])
+        item.name = 'Gnocchi'
+        item.save()
+        self.assertEqual(self.dishes('risot'), [])
+        self.assertEqual(self.dishes('gnoc'), ['Gnocchi'])
+        item.category = self.pasta
+        item.save()
+        self.assertEqual(self.dishes('gnocchi mains'), [])
+        self.assertEqual(self.dishes('gnocchi pasta'), ['Gnocchi'])
+        self.pasta.title = 'Primi'
+        self.pasta.save()
+        self.assertCountEqual(self.dishes('primi'), ['Pasta Carbonara', 'Lasagna', 'Gnocchi'])
+        item.delete()
+        self.assertEqual(self.dishes('gnoc'), [])
+        MenuItem.objects.filter(pk=self.steak.pk).update(name='Ribeye')
+        self.assertEqual(self.dishes('rib'), ['Ribeye'])
+
+    def test_fts_syntax_is_quoted(self):
+        for query, expected in (('"', ['Lasagna', 'Pasta Carbonara', 'Steak']), ('carb*', ['Pasta Carbonara']), ('"carb', ['Pasta Carbonara']),
+                                ('-carb', ['Pasta Carbonara']), ('(carb', ['Pasta Carbonara']),
+                                ('carb OR steak', []), ('NOT', []), ('name:steak', [])):
+            with self.subTest(query=query):
+                self.assertEqual(self.dishes(query), expected)
+
+    def test_cursor_pagination_needs_ordering(self):
+        response = self.client.get('/api/menu-items/?search=pasta&pagination=cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.json())
+        response = self.client.get('/api/menu-items/?search=pasta&pagination=cursor&ordering=price')
+        self.assertEqual([item['dish'] for item in response.json()['results']], ['Pasta Carbonara', 'Lasagna'])
+
+
+class FastSerializerEquivalenceTests(TestCase):
+    """fast_serializers must produce exactly what the DRF serializers produce."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create(username='customer')
+        crew = User.objects.create(username='crew')
+        pasta = Category.objects.create(slug='pasta', title='Pasta')
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        items = [
+            MenuItem.objects.create(name='Carbonara', price='12.50', inventory=5, category=pasta, is_item_of_the_day=True),
+            MenuItem.objects.create(name='Lasagne', price='0.05', inventory=0, category=pasta),
+            MenuItem.objects.create(name='Lemonade', price='3.00', inventory=40, category=drinks),
+            MenuItem.objects.create(name='Espresso', price='3.00', inventory=12, category=drinks),
+        ]
+        Rating.objects.create(menu_item=items[0], user=customer, score=4)
+        Rating.objects.create(menu_item=items[0], user=crew, score=5)
+        delivered = Order.objects.create(user=customer, delivery_crew=crew, status=1, total='28.00')
+        OrderItem.objects.create(order=delivered, menu_item=items[2], quantity=1, unit_price='3.00')
+        OrderItem.objects.create(order=delivered, menu_item=items[0], quantity=2, unit_price='12.50')
+        Order.objects.create(user=customer, total='0.00')
+
+    def test_menu_items(self):
+        queryset = MenuItem.objects.select_related('category').order_by('id')
+        expected = MenuItemSerializer(queryset, many=True).data
+        actual = fast_serializers.serialize_menu_items(fast_serializers.menu_item_rows(queryset))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+        self.assertEqual(actual, expected)
+
+    def test_orders(self):
+        queryset = Order.objects.prefetch_related(fast_serializers.order_items_prefetch(), 'user', 'delivery_crew').order_by('-id')
+        expected = OrderReadSerializer(queryset, many=True).data
+        actual = fast_serializers.serialize_orders(fast_serializers.order_rows(queryset))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+        self.assertEqual(actual, expected)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Upper bounds on SQL queries per endpoint, with cold caches and several rows per page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.crew = User.objects.create(username='crew')
+        cls.crew.groups.add(Group.objects.create(name='Delivery Crew'))
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        items = [MenuItem.objects.create(name=f'Dish {i}', price=10, inventory=5, category=category) for i in range(5)]
+        for n in range(3):
+            order = Order.objects.create(user=cls.customer, delivery_crew=cls.crew, total='20.00')
+            for item in items[n:n + 2]:
+                OrderItem.objects.create(order=order, menu_item=item, quantity=1, unit_price=10)
+        cls.order = order
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog(self):
+        self.assertQueryBudget(2, '/api/menu-items/')  # COUNT + page
+        self.assertQueryBudget(2, '/api/menu-items/?search=dish&ordering=price')
+        self.assertQueryBudget(1, '/api/menu-items/?pagination=cursor')
+        self.assertQueryBudget(1, '/api/categories/')
+
+    def test_orders(self):
+        # roles + COUNT + page + order lines
+        for user in (self.customer, self.crew, self.manager):
+            with self.subTest(user=user.username):
+                self.assertQueryBudget(4, '/api/orders/', user=user)
+        self.assertQueryBudget(2, f'/api/orders/{self.order.pk}/', user=self.customer)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+
+    def setUp(self):
+        reset_metrics()
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/categories/')
+        self.client.force_login(self.manager)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('littlelemon_db_queries_count{view="api/categories/",method="GET"} 1', text)
+        self.assertIn('# TYPE littlelemon_request_duration_seconds histogram', text)
+        self.assertIn('littlelemon_render_duration_seconds_bucket{view="api/categories/",method="GET",le="+Inf"} 1', text)
+
+    def test_metrics_require_manager(self):
+        self.client.force_login(User.objects.create(username='customer'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+
+class RatingAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.items = [MenuItem.objects.create(name=f'Dish {i}', price=10, inventory=5, category=category) for i in range(2)]
+
+    def aggregates(self, item):
+        return MenuItem.objects.filter(pk=item.pk).values_list('rating_count', 'rating_sum', 'rating_avg').get()
+
+    def test_create_update_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.post('/api/ratings/', {'menu_item': self.items[0].pk, 'score': 4}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        Rating.objects.create(menu_item=self.items[0], user=self.users[1], score=1)
+        self.assertEqual(self.aggregates(self.items[0]), (2, 5, 2.5))
+
+        rating = Rating.objects.get(user=self.users[1])
+        rating.score = 5
+        rating.save()
+        self.assertEqual(self.aggregates(self.items[0]), (2, 9, 4.5))
+        rating.menu_item = self.items[1]  # moved: leaves one item, joins the other
+        rating.save()
+        self.assertEqual((self.aggregates(self.items[0]), self.aggregates(self.items[1])), ((1, 4, 4.0), (1, 5, 5.0)))
+
+        Rating.objects.get(user=self.users[0]).delete()
+        self.assertEqual(self.aggregates(self.items[0]), (0, 0, 0.0))
+
+    def test_rebuild_matches_incremental(self):
+        for user, item, score in ((0, 0, 3), (1, 0, 4), (2, 0, 4), (0, 1, 1)):
+            Rating.objects.create(menu_item=self.items[item], user=self.users[user], score=score)
+        Rating.objects.filter(user=self.users[2]).delete()
+        incremental = [self.aggregates(item) for item in self.items]
+        self.assertEqual(incremental, [(2, 7, 3.5), (1, 1, 1.0)])
+        MenuItem.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+        self.assertEqual(rebuild_rating_aggregates(), 2)
+        self.assertEqual([self.aggregates(item) for item in self.items], incremental)
+
+    def test_ratings_keep_the_catalog_cache(self):
+        cache.clear()
+        client = APIClient()
+        self.assertEqual(client.get('/api/menu-items/').json()['results'][0]['rating_avg'], 0.0)
+        version = cache.get('catalog:version')
+        Rating.objects.create(menu_item=self.items[0], user=self.users[0], score=4)
+        self.assertEqual(cache.get('catalog:version'), version)
+        self.assertEqual(client.get('/api/menu-items/').json()['results'][0]['rating_avg'], 4.0)
+
+
+class CatalogCacheTests(TestCase):
+    """Every kind of catalog write shows up in the next cached GET."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.pasta = Category.objects.create(slug='pasta', title='Pasta')
+        cls.drinks = Category.objects.create(slug='drinks', title='Drinks')
+        cls.carbonara = MenuItem.objects.create(name='Carbonara', price=10, inventory=5, category=cls.pasta)
+        cls.lemonade = MenuItem.objects.create(name='Lemonade', price=3, inventory=5, category=cls.drinks)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def dishes(self, query=''):
+        return [item['dish'] for item in self.client.get(f'/api/menu-items/{query}').json()['results']]
+
+    def test_save_and_delete(self):
+        self.assertEqual(self.dishes(), ['Carbonara', 'Lemonade'])
+        self.carbonara.name = 'Gnocchi'
+        self.carbonara.save()
+        self.assertEqual(self.dishes(), ['Gnocchi', 'Lemonade'])
+        self.lemonade.delete()
+        self.assertEqual(self.dishes(), ['Gnocchi'])
+        self.pasta.title = 'Primi'
+        self.pasta.save()
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.carbonara.pk}/').json()['category']['name'], 'Primi')
+
+    def test_set_item_of_the_day(self):
+        self.assertEqual(self.client.get('/api/menu-items/item-of-the-day/').status_code, 404)
+        self.client.force_authenticate(self.manager)
+        for item in (self.carbonara, self.lemonade):
+            self.client.post('/api/menu-items/item-of-the-day/set/', {'menu_item_id': item.pk}, format='json')
+            self.assertEqual(self.client.get('/api/menu-items/item-of-the-day/').json()['dish'], item.name)
+        self.assertEqual([item['is_item_of_the_day'] for item in self.client.get('/api/menu-items/').json()['results']],
+                         [False, True])
+
+    def test_bulk_import(self):
+        self.assertEqual(self.dishes(), ['Carbonara', 'Lemonade'])
+        self.client.force_authenticate(self.manager)
+        body = f'dish,price,stock,category_id\nRisotto,14.00,3,{self.pasta.pk}\nlemonade,4.00,9,{self.drinks.pk}\n'
+        self.client.generic('POST', '/api/menu-items/import/', body, content_type='text/csv')
+        self.assertEqual(self.dishes(), ['Carbonara', 'lemonade', 'Risotto'])
+
+    def test_key_separates_query_strings(self):
+        self.assertEqual(self.dishes(f'?category={self.pasta.pk}'), ['Carbonara'])
+        self.assertEqual(self.dishes(f'?category={self.drinks.pk}'), ['Lemonade'])
+        self.assertEqual(self.dishes('?ordering=-price'), ['Carbonara', 'Lemonade'])
+        self.assertEqual(self.dishes('?ordering=price'), ['Lemonade', 'Carbonara'])
+        # Parameter order doesn't matter: served from the entry above (only the live fields are read)
+        self.assertEqual(self.dishes('?number_pages=1&ordering=price'), ['Lemonade'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.dishes('?ordering=price&number_pages=1'), ['Lemonade'])
+
+
+class BulkImportExportTests(TestCase):
+    """Streaming CSV/NDJSON import and export of the catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.pasta = Category.objects.create(slug='pasta', title='Pasta')
+        cls.drinks = Category.objects.create(slug='drinks', title='Drinks')
+        MenuItem.objects.create(name='Carbonara', price=10, inventory=5, category=cls.pasta)
+        MenuItem.objects.create(name='Lemonade', price=3, inventory=20, category=cls.drinks)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def post(self, body, content_type='text/csv'):
+        return self.client.generic('POST', '/api/menu-items/import/', body, content_type=content_type)
+
+    def export(self, path='/api/menu-items/export/', **headers):
+        response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def catalog(self):
+        return list(MenuItem.objects.order_by('name').values_list('name', 'price', 'inventory', 'category_id'))
+
+    def test_round_trip(self):
+        for path, content_type in (('/api/menu-items/export/', 'text/csv'),
+                                   ('/api/menu-items/export/?format=ndjson', 'application/x-ndjson')):
+            with self.subTest(content_type=content_type):
+                before = self.catalog()
+                body = self.export(path)[1]
+                MenuItem.objects.all().delete()
+                self.assertEqual(self.post(body, content_type).json(), {'created': 2, 'updated': 0, 'errors': []})
+                self.assertEqual(self.catalog(), before)
+                self.assertEqual(self.post(body, content_type).json(), {'created': 0, 'updated': 2, 'errors': []})
+                self.assertEqual(self.catalog(), before)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        body = (f'dish,price,stock,category_id\nRisotto,14.00,3,{self.pasta.pk}\nCheap,1.00,3,{self.pasta.pk}\n'
+                f'Ghost,5.00,3,999\nrisotto,15.00,3,{self.pasta.pk}\nCarbonara,11.00,-1,{self.pasta.pk}\n')
+        result = self.post(body).json()
+        self.assertEqual((result['created'], result['updated']), (1, 0))
+        self.assertEqual([(error['line'], sorted(error['errors'])) for error in result['errors']],
+                         [(3, ['price']), (4, ['category_id']), (5, ['dish']), (6, ['stock'])])
+        self.assertEqual([row[:3] for row in self.catalog()],
+                         [('Carbonara', Decimal('10.00'), 5), ('Lemonade', Decimal('3.00'), 20), ('Risotto', Decimal('14.00'), 3)])
+        result = self.post('{"dish": "Tea", "price": "3.00", "stock": 1, "category_id": %d}\n[1]\n{oops\n' % self.drinks.pk,
+                           'application/x-ndjson').json()
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3])
+
+    def test_batch_write_is_atomic(self):
+        body = f'dish,price,stock,category_id\nRisotto,14.00,3,{self.pasta.pk}\nCarbonara,11.00,4,{self.pasta.pk}\n'
+        with mock.patch.object(MenuItem.objects, 'bulk_update', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                self.post(body)
+        self.assertEqual([row[0] for row in self.catalog()], ['Carbonara', 'Lemonade'])
+        self.assertEqual(MenuItem.objects.get(name='Carbonara').price, Decimal('10.00'))
+
+    def test_many_batches(self):
+        rows = [f'Dish {i},{5 + i % 7}.00,{i},{self.pasta.pk if i % 2 else self.drinks.pk}' for i in range(1201)]
+        rows.append(f'dish 3,6.00,1,{self.pasta.pk}')  # a duplicate two batches later
+        with CaptureQueriesContext(connection) as queries:
+            result = self.post('dish,price,stock,category_id\n' + '\n'.join(rows) + '\n').json()
+        self.assertEqual((result['created'], result['updated']), (1201, 0))
+        self.assertEqual(result['errors'], [{'line': 1203, 'errors': {'dish': ['Duplicate dish in this import.']}}])
+        self.assertEqual(MenuItem.objects.count(), 1203)
+        self.assertEqual(MenuItem.objects.get(name='Dish 1200').inventory, 1200)
+        category_lookups = [query for query in queries.captured_queries
+                            if query['sql'].startswith('SELECT') and '"LittleLemonAPI_category"' in query['sql']]
+        self.assertEqual(len(category_lookups), 1)
+
+    def test_format_negotiation(self):
+        self.assertEqual(self.post('dish\n', 'application/json').status_code, 415)
+        for headers, media_type, extension in (({}, 'text/csv', 'csv'),
+                                               ({'HTTP_ACCEPT': 'application/x-ndjson'}, 'application/x-ndjson', 'ndjson')):
+            with self.subTest(media_type=media_type):
+                response, body = self.export(**headers)
+                self.assertEqual(response['Content-Type'].split(';')[0], media_type)
+                self.assertIn(f'menu-items.{extension}', response['Content-Disposition'])
+        response, body = self.export('/api/menu-items/export/?format=ndjson')
+        self.assertEqual(response['Content-Type'].split(';')[0], 'application/x-ndjson')
+        self.assertEqual(json.loads(body.splitlines()[0])['dish'], 'Carbonara')
+        response, body = self.export('/api/menu-items/export/?format=csv')
+        self.assertEqual(body.splitlines()[0], ','.join(['id', 'dish', 'price', 'stock', 'category_id', 'is_item_of_the_day']))
+        self.client.force_authenticate(User.objects.create(username='customer'))
+        self.assertEqual(self.client.get('/api/menu-items/export/').status_code, 403)
+
+
+class OrderExportTests(TestCase):
+    """orders/export/: manager-only, filtered like orders/, read in keyset chunks."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer = User.objects.create(username='customer')
+        cls.crew = User.objects.create(username='crew')
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        dishes = [MenuItem.objects.create(name=f'Dish {i}', price=5 + i, inventory=9, category=category) for i in range(2)]
+        for i, lines in enumerate((2, 0, 1, 2, 0)):
+            order = Order.objects.create(user=cls.customer if i % 2 else cls.manager, total=10 * i, status=i % 2,
+                                         delivery_crew=cls.crew if i == 3 else None)
+            for dish in dishes[:lines]:
+                OrderItem.objects.create(order=order, menu_item=dish, quantity=i + 1, unit_price=dish.price)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/orders/export/?format=ndjson{query}')
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_managers_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 401)
+
+    def test_filters(self):
+        ids = lambda query: [order['id'] for order in self.export(query)]
+        orders = list(Order.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(ids(''), orders)
+        self.assertEqual(ids('&status=1'), orders[1::2])
+        self.assertEqual(ids(f'&user={self.customer.pk}'), orders[1::2])
+        self.assertEqual(ids(f'&delivery_crew={self.crew.pk}'), [orders[3]])
+        self.assertEqual(ids('&total_min=15&total_max=30'), orders[2:4])
+        self.assertEqual(self.client.get('/api/orders/export/?total_min=abc').status_code, 400)
+
+    def test_chunk_boundaries(self):
+        whole = list(export_orders(Order.objects.all(), 'csv'))
+        for chunk_size in (1, 2, 3, 5):
+            with self.subTest(chunk_size=chunk_size):
+                with CaptureQueriesContext(connection) as queries:
+                    lines = list(export_orders(Order.objects.all(), 'csv', chunk_size))
+                self.assertEqual(lines, whole)
+                chunks = -(-5 // chunk_size)
+                self.assertEqual(len(queries), 2 * chunks + 1)  # orders and lines per chunk, then an empty read
+        self.assertEqual(len(whole), 1 + 2 + 1 + 1 + 2 + 1)  # header, then an empty row for orders without lines
+        records = self.export()
+        self.assertEqual([len(record['items']) for record in records], [2, 0, 1, 2, 0])
+        self.assertEqual(records[3]['items'][1]['total_price'], f'{6 * 4:.2f}')
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.item = MenuItem.objects.create(name='Carbonara', price=10, inventory=5, category=cls.category,
+                                           is_item_of_the_day=True)
+        cls.order = Order.objects.create(user=cls.customer, total='10.00')
+        OrderItem.objects.create(order=cls.order, menu_item=cls.item, quantity=1, unit_price=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_not_modified(self):
+        response = self.assertQueryBudget(1, '/api/categories/')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertQueryBudget(0, '/api/categories/', status=304, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertQueryBudget(0, '/api/categories/', status=304, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        # Menu items: the 304 re-reads the live stock and ratings; they have no Last-Modified
+        for path in ('/api/menu-items/', '/api/menu-items/item-of-the-day/', f'/api/menu-items/{self.item.pk}/'):
+            with self.subTest(path=path):
+                response = self.assertQueryBudget(3, path)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertNotIn('Last-Modified', response)
+                self.assertQueryBudget(1, path, status=304, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_stock_changes_etag(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        self.assertEqual(self.client.get('/api/menu-items/?inventory_min=5').json()['count'], 1)
+        MenuItem.objects.filter(pk=self.item.pk).update(inventory=4)
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['stock'], 4)
+        # Lists filtered on a live column are never cached
+        self.assertEqual(self.client.get('/api/menu-items/?inventory_min=5').json()['count'], 0)
+
+    def test_catalog_write_changes_etag(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        MenuItem.objects.create(name='Lasagne', price=12, inventory=5, category=self.category)
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_order_not_modified(self):
+        path = f'/api/orders/{self.order.pk}/'
+        etag = self.assertQueryBudget(2, path, user=self.customer)['ETag']
+        # just the stamp lookup, no order/serializer queries
+        self.assertQueryBudget(1, path, user=self.customer, status=304, HTTP_IF_NONE_MATCH=etag)
+        self.assertQueryBudget(2, path, user=User.objects.create(username='other'), status=404, HTTP_IF_NONE_MATCH=etag)
+        # Catalog writes are not order changes
+        self.item.save()
+        self.assertQueryBudget(1, path, user=self.customer, status=304, HTTP_IF_NONE_MATCH=etag)
+
+        self.client.force_login(self.manager)
+        self.client.patch(path, {'status': 1}, content_type='application/json')
+        self.assertQueryBudget(3, path, user=self.customer, HTTP_IF_NONE_MATCH=etag)
+
+
+class AsyncViewTests(TestCase):
+    """api/async/ endpoints answer exactly like their sync counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.other = User.objects.create(username='other')
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        items = [MenuItem.objects.create(name=f'Dish {i}', price=10 + i, inventory=5, category=category,
+                                         is_item_of_the_day=(i == 2)) for i in range(12)]
+        cls.order = Order.objects.create(user=cls.customer, total='21.00')
+        OrderItem.objects.create(order=cls.order, menu_item=items[0], quantity=1, unit_price=10)
+        OrderItem.objects.create(order=cls.order, menu_item=items[1], quantity=1, unit_price=11)
+        CartItem.objects.create(user=cls.customer, menu_item=items[3], quantity=2, unit_price=13)
+        cls.tokens = {user: Token.objects.create(user=user).key for user in (cls.customer, cls.other, cls.manager)}
+        cls.paths = ['menu-items/', 'menu-items/?page=2', 'menu-items/?pagination=cursor&ordering=-price',
+                     f'menu-items/?search=dish&category={category.pk}', 'menu-items/?page=7', f'menu-items/{items[0].pk}/',
+                     'menu-items/item-of-the-day/', 'categories/', 'cart/menu-items/', 'cart/menu-items/?summary=true',
+                     'cart/menu-items/?summary=only', 'orders/',
+                     f'orders/{cls.order.pk}/', 'orders/999/',
+                     'menu-items/?fields=id,dish,price', 'menu-items/?fields=dish&expand=category&pagination=cursor&ordering=-price',
+                     f'menu-items/{items[0].pk}/?fields=dish,category', 'menu-items/?fields=nope',
+                     'cart/menu-items/?fields=dish,total_price&summary=true', 'orders/?fields=id,total',
+                     f'orders/{cls.order.pk}/?fields=id,status&expand=items']
+
+    async def test_same_responses(self):
+        client = AsyncClient()
+        for user in (None, self.customer, self.other, self.manager):
+            headers = {'Authorization': f'Token {self.tokens[user]}'} if user else {}
+            for path in self.paths:
+                with self.subTest(user=user and user.username, path=path):
+                    await cache.aclear()
+                    expected = await sync_to_async(self.client.get)(
+                        f'/api/{path}', headers={'Accept': 'application/json', **headers})
+                    response = await client.get(f'/api/async/{path}', headers=headers)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    async def test_not_modified(self):
+        client = AsyncClient()
+        etag = (await client.get('/api/async/menu-items/'))['ETag']
+        self.assertEqual((await client.get('/api/async/menu-items/', headers={'If-None-Match': etag})).status_code, 304)
+        headers = {'Authorization': f'Token {self.tokens[self.customer]}'}
+        etag = (await client.get(f'/api/async/orders/{self.order.pk}/', headers=headers))['ETag']
+        response = await client.get(f'/api/async/orders/{self.order.pk}/', headers={'If-None-Match': etag, **headers})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_read_only(self):
+        response = await AsyncClient().post('/api/async/menu-items/', headers={'Authorization': f'Token {self.tokens[self.manager]}'})
+        self.assertEqual(response.status_code, 405)
+
+
+class ThrottleTests(QueryBudgetMixin, TestCase):
+
+    def test_token_bucket(self):
+        self.assertEqual(consume('bucket', 2, 60, 1000.0), (True, None))
+        self.assertEqual(consume('bucket', 2, 60, 1000.0), (True, None))
+        self.assertEqual(consume('bucket', 2, 60, 1000.0), (False, 30.0))
+        self.assertEqual(consume('bucket', 2, 60, 1030.0), (True, None))  # refilled one token
+        self.assertEqual(consume('bucket', 2, 60, 5000.0), (True, None))
+        self.assertEqual(ThrottleBucket.objects.get(key='bucket').tokens, 1.0)  # never above capacity
+
+    def test_ten_per_minute(self):
+        user = User.objects.create(username='customer')
+        self.assertQueryBudget(5, '/api/throttle-check-auth/', user=user)  # creates the bucket
+        for _ in range(9):
+            self.assertQueryBudget(1, '/api/throttle-check-auth/', user=user)
+        response = self.assertQueryBudget(2, '/api/throttle-check-auth/', user=user, status=429)
+        self.assertLessEqual(int(response['Retry-After']), 6)  # one token at 10/minute
+        self.assertTrue(ThrottleBucket.objects.filter(key=f'throttle_ten_{user.pk}').exists())
+
+    def test_prune_full_buckets(self):
+        now = time.time()
+        for i in range(5):
+            ThrottleBucket.objects.create(key=f'stale_{i}', tokens=0, updated=now - 61 - i)  # refilled since
+        ThrottleBucket.objects.create(key='recent', tokens=0, updated=now - 59)
+        with mock.patch.object(throttles, 'PRUNE_BATCH_SIZE', 2):
+            self.assertEqual(throttles.prune_buckets(now), 5)
+        self.assertEqual(list(ThrottleBucket.objects.values_list('key', flat=True)), ['recent'])
+        ThrottleBucket.objects.filter(key='recent').update(updated=now - 3600)
+        out = StringIO()
+        call_command('prune_throttle_buckets', stdout=out)
+        self.assertIn('Deleted 1 throttle buckets', out.getvalue())
+        self.assertFalse(ThrottleBucket.objects.exists())
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class CachedAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        clear_auth_cache()
+
+    def get_secret(self, header, queries):
+        with self.assertNumQueries(queries):
+            return self.client.get('/api/secret/', headers={'Authorization': header}).status_code
+
+    def test_token(self):
+        header = f'Token {self.token.key}'
+        self.assertEqual(self.get_secret(header, 1), 200)
+        self.assertEqual(self.get_secret(header, 0), 200)
+
+    def test_jwt(self):
+        header = f'Bearer {AccessToken.for_user(self.user)}'
+        self.assertEqual(self.get_secret(header, 1), 200)
+        self.assertEqual(self.get_secret(header, 0), 200)
+
+    def test_logout(self):
+        header = f'Token {self.token.key}'
+        self.assertEqual(self.get_secret(header, 1), 200)
+        self.assertEqual(self.client.post('/auth/token/logout/', headers={'Authorization': header}).status_code, 204)
+        self.assertEqual(self.client.get('/api/secret/', headers={'Authorization': header}).status_code, 401)
+
+    def test_deactivation(self):
+        headers = [f'Token {self.token.key}', f'Bearer {AccessToken.for_user(self.user)}']
+        for header in headers:
+            self.assertEqual(self.get_secret(header, 1), 200)
+        self.user.is_active = False
+        self.user.save()
+        for header in headers:
+            self.assertEqual(self.client.get('/api/secret/', headers={'Authorization': header}).status_code, 401)
+
+    def test_login_keeps_entries(self):
+        header = f'Token {self.token.key}'
+        self.assertEqual(self.get_secret(header, 1), 200)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.get_secret(header, 0), 200)
+
+    def test_not_cached_per_process(self):
+        header = f'Token {self.token.key}'
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(self.get_secret(header, 1), 200)
+            self.assertEqual(self.get_secret(header, 1), 200)
+
+    def test_lru_eviction(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class RoleCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.group = Group.objects.create(name='Manager')
+
+    def setUp(self):
+        cache.clear()
+
+    def manager_status(self):
+        return self.client.get('/api/manager/', headers={'Authorization': f'Token {self.token.key}'}).status_code
+
+    def test_membership_changes_apply_to_next_request(self):
+        self.assertEqual(self.manager_status(), 403)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.manager_status(), 403)
+        self.user.groups.add(self.group)
+        self.assertEqual(self.manager_status(), 200)
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.manager_status(), 403)
+        self.group.user_set.add(self.user)
+        self.assertEqual(self.manager_status(), 200)
+        self.group.user_set.clear()
+        self.assertEqual(self.manager_status(), 403)
+
+    def test_not_cached_per_process(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            for _ in range(2):
+                with self.assertNumQueries(2):  # token + roles
+                    self.assertEqual(self.manager_status(), 403)
+
+
+class CartTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.items = [MenuItem.objects.create(name=f'Dish {i}', price=10 + i, inventory=5, category=category) for i in range(3)]
+
+    def test_bulk_add_upserts(self):
+        CartItem.objects.create(user=self.customer, menu_item=self.items[0], quantity=2, unit_price='9.00')
+        lines = [{'menu_item_id': item.pk, 'quantity': 1} for item in self.items] + [{'menu_item_id': self.items[1].pk}]
+        # roles + prices + savepoint + upsert + release + cart, however many lines
+        response = self.assertQueryBudget(6, '/api/cart/menu-items/bulk/', method='post', user=self.customer,
+                                          data=lines, format='json')
+        self.assertEqual([(line['dish'], line['quantity'], line['unit_price']) for line in response.data], [
+            ('Dish 0', 3, Decimal('9.00')), ('Dish 1', 2, Decimal('11.00')), ('Dish 2', 1, Decimal('12.00')),
+        ])
+
+    def test_unknown_item_writes_nothing(self):
+        lines = [{'menu_item_id': self.items[0].pk}, {'menu_item_id': 9999}]
+        response = self.assertQueryBudget(2, '/api/cart/menu-items/bulk/', method='post', user=self.customer,
+                                          status=400, data=lines, format='json')
+        self.assertEqual(response.data[0], {})
+        self.assertIn('9999', response.data[1]['menu_item_id'][0])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_single_add_increments(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        for _ in range(2):
+            response = client.post('/api/cart/menu-items/', {'menu_item_id': self.items[0].pk, 'quantity': 2}, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(CartItem.objects.get(user=self.customer).quantity, 4)
+
+    def test_summary(self):
+        CartItem.objects.create(user=self.customer, menu_item=self.items[0], quantity=2, unit_price='9.50')
+        CartItem.objects.create(user=self.customer, menu_item=self.items[1], quantity=3, unit_price='11.00')
+        summary = {'item_count': 2, 'total_quantity': 5, 'subtotal': '52.00'}
+        # roles + one query for the lines and the totals
+        response = self.assertQueryBudget(2, '/api/cart/menu-items/?summary=true', user=self.customer)
+        self.assertEqual(response.data['summary'], summary)
+        self.assertEqual([line['total_price'] for line in response.data['items']], [Decimal('19.00'), Decimal('33.00')])
+        response = self.assertQueryBudget(2, '/api/cart/menu-items/?summary=only', user=self.customer)
+        self.assertEqual(response.data, summary)
+        self.assertIsInstance(self.assertQueryBudget(2, '/api/cart/menu-items/', user=self.customer).data, list)
+        CartItem.objects.all().delete()
+        response = self.assertQueryBudget(2, '/api/cart/menu-items/?summary=only', user=self.customer)
+        self.assertEqual(response.data, {'item_count': 0, 'total_quantity': 0, 'subtotal': '0.00'})
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.items = [MenuItem.objects.create(name=f'Dish {i}', price=10, inventory=5, category=category) for i in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def fill_cart(self, *quantities):
+        for item, quantity in zip(self.items, quantities):
+            CartItem.objects.create(user=self.customer, menu_item=item, quantity=quantity, unit_price=item.price)
+
+    def stock(self):
+        return list(MenuItem.objects.order_by('id').values_list('inventory', flat=True))
+
+    def test_places_order_without_invalidating_the_catalog(self):
+        self.fill_cart(2, 1)
+        cached = self.client.get('/api/menu-items/').json()['results']
+        version = cache.get('catalog:version')
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['total'], len(response.data['items'])), ('30.00', 2))
+        self.assertEqual(self.stock(), [3, 4])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(cache.get('catalog:version'), version)
+        # Still served from the cache, with the current stock
+        refreshed = self.client.get('/api/menu-items/').json()['results']
+        self.assertEqual([item['stock'] for item in refreshed], [3, 4])
+        self.assertEqual([item['dish'] for item in refreshed], [item['dish'] for item in cached])
+
+    def test_shortage_rolls_back(self):
+        self.fill_cart(2, 6)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['menu_items'], [self.items[1].pk])
+        self.assertEqual(self.stock(), [5, 5])
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart(self):
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_line_topped_up_during_checkout_stays(self):
+        self.fill_cart(2, 1)
+
+        def top_up(order):
+            CartItem.objects.filter(menu_item=self.items[0]).update(quantity=7)
+
+        with mock.patch.object(views, 'enqueue_checkout_jobs', side_effect=top_up):
+            response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([line['quantity'] for line in response.data['items']], [2, 1])
+        self.assertEqual(list(CartItem.objects.values_list('menu_item_id', 'quantity')), [(self.items[0].pk, 7)])
+
+
+class DispatchTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        crew = Group.objects.create(name='Delivery Crew')
+        cls.busy = User.objects.create(username='busy')
+        cls.idle = User.objects.create(username='idle')
+        crew.user_set.add(cls.busy, cls.idle)
+        for _ in range(2):
+            Order.objects.create(user=cls.customer, delivery_crew=cls.busy, total='10.00')
+        Order.objects.create(user=cls.customer, delivery_crew=cls.idle, status=1, total='10.00')
+        cls.pending = [Order.objects.create(user=cls.customer, total='10.00') for _ in range(5)]
+
+    def setUp(self):
+        dispatch_engine.reset()
+
+    def dispatch(self, **data):
+        return self.assertQueryBudget(10, '/api/orders/dispatch/', method='post', user=self.manager, data=data, format='json')
+
+    def test_balances_open_orders(self):
+        response = self.dispatch()
+        self.assertEqual(response.data['assigned'], 5)
+        # Oldest first; the idle member catches up before the busy one gets more
+        self.assertEqual([a['delivery_crew'] for a in response.data['assignments'][:2]], ['idle', 'idle'])
+        self.assertEqual(response.data['load'], {'busy': 4, 'idle': 3})
+        self.assertFalse(Order.objects.filter(delivery_crew__isnull=True).exists())
+        self.assertEqual(self.dispatch().data['assigned'], 0)
+
+    def test_load_follows_changes(self):
+        self.dispatch(limit=2)
+        # Delivered through the API (save), assigned by hand, deleted: no recount needed
+        order = Order.objects.filter(delivery_crew=self.idle, status=0).first()
+        order.status = 1
+        order.save()
+        Order.objects.filter(pk=self.pending[2].pk).update(delivery_crew=self.busy, updated_at=order.updated_at)
+        Order.objects.filter(delivery_crew=self.busy).first().delete()
+        response = self.dispatch(limit=1)
+        self.assertEqual(response.data['load'], {'busy': 2, 'idle': 2})
+        self.assertEqual(response.data['load'], {
+            user.username: Order.objects.filter(delivery_crew=user, status=0).count() for user in (self.busy, self.idle)
+        })
+
+    def test_orders_taken_meanwhile_are_left_out(self):
+        plan = dispatch_engine._plan
+
+        def plan_then_lose_one(pending, crew):
+            assignments = plan(pending, crew)
+            Order.objects.filter(pk=self.pending[0].pk).update(delivery_crew=self.busy)
+            return assignments
+
+        with mock.patch.object(dispatch_engine, '_plan', side_effect=plan_then_lose_one), \
+                mock.patch('LittleLemonAPI.dispatch.publish') as publish:
+            response = self.dispatch()
+        assigned = [order.pk for order in self.pending[1:]]
+        self.assertEqual([a['order'] for a in response.data['assignments']], assigned)
+        self.assertEqual([event.data['id'] for event in publish.call_args.args], assigned)
+        self.assertNotIn(self.pending[0].pk, dispatch_engine.open_orders)
+
+    def test_permissions_and_no_crew(self):
+        self.assertQueryBudget(5, '/api/orders/dispatch/', method='post', user=self.customer, status=403)
+        Group.objects.get(name='Delivery Crew').user_set.clear()
+        self.assertQueryBudget(5, '/api/orders/dispatch/', method='post', user=self.manager, status=400)
+
+
+class OrderEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.other = User.objects.create(username='other')
+        cls.crew = User.objects.create(username='crew')
+        cls.crew.groups.add(Group.objects.create(name='Delivery Crew'))
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.order = Order.objects.create(user=cls.customer, total='10.00')
+        cls.token = Token.objects.create(user=cls.customer).key
+
+    def setUp(self):
+        broadcaster.reset()
+
+    def recorded_events(self):
+        return list(OrderEventRecord.objects.order_by('id').values_list('type', 'data', 'user_id', 'delivery_crew_ids'))
+
+    def test_writes_record_events(self):
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        client.patch(f'/api/orders/{self.order.pk}/', {'delivery_crew': 'crew'}, format='json')
+        client.delete(f'/api/orders/{self.order.pk}/')
+        (updated_type, updated, _, updated_crew), deleted = self.recorded_events()
+        self.assertEqual((updated_type, updated['delivery_crew'], updated_crew), ('order.updated', 'crew', [self.crew.pk]))
+        self.assertEqual(deleted, ('order.deleted', {'id': self.order.pk}, self.customer.pk, [self.crew.pk]))
+
+    def test_failed_writes_record_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        item = MenuItem.objects.create(name='Carbonara', price=10, inventory=0,
+                                       category=Category.objects.create(slug='pasta', title='Pasta'))
+        CartItem.objects.create(user=self.customer, menu_item=item, quantity=1, unit_price=10)
+        self.assertEqual(client.post('/api/orders/').status_code, 409)
+        with mock.patch.object(Order, 'delete', side_effect=RuntimeError):
+            client.force_authenticate(self.manager)
+            with self.assertRaises(RuntimeError):
+                client.delete(f'/api/orders/{self.order.pk}/')
+        self.assertEqual(self.recorded_events(), [])
+
+    def test_prunes_old_events(self):
+        with mock.patch.object(events, 'EVENT_BUFFER_SIZE', 5), mock.patch.object(events, 'PRUNE_INTERVAL', 3):
+            for n in range(12):
+                events.publish(events.new_event('order.created', {'id': n}, self.customer.pk))
+        self.assertLessEqual(OrderEventRecord.objects.count(), 5 + 3)
+        self.assertEqual(OrderEventRecord.objects.order_by('-id').first().data, {'id': 11})
+
+    @mock.patch.object(events, 'POLL_SECONDS', 0.01)
+    async def test_stream_only_visible_orders(self):
+        publish = sync_to_async(lambda *args: events.publish(events.new_event(*args))[0])
+        first = await publish('order.created', {'id': 1}, self.customer.pk)
+        await publish('order.created', {'id': 2}, self.customer.pk)
+        await publish('order.created', {'id': 3}, self.other.pk)
+        response = await AsyncClient().get('/api/async/orders/events/', headers={
+            'Authorization': f'Token {self.token}', 'Accept': 'text/event-stream', 'Last-Event-ID': str(first.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            # Missed while disconnected: only the customer's own order after Last-Event-ID
+            self.assertIn(b'"id": 2', await anext(stream))
+            # Rows written by any process reach the stream through the poller
+            await publish('order.updated', {'id': 3}, self.other.pk, (self.crew.pk,))
+            latest = await publish('order.updated', {'id': 1}, self.customer.pk)
+            self.assertEqual(await anext(stream), events.encode_event(latest).encode())
+        finally:
+            await stream.aclose()
+
+    @mock.patch.object(events, 'POLL_SECONDS', 60)
+    async def test_reconnect_ahead_of_the_poller(self):
+        publish = sync_to_async(lambda *args: events.publish(events.new_event(*args))[0])
+        first = await publish('order.created', {'id': 1}, self.customer.pk)
+        seen = await publish('order.updated', {'id': 1}, self.customer.pk)
+        stream = async_views._event_stream(self.customer, seen.id)
+        try:
+            await anext(stream)
+            latest = await publish('order.updated', {'id': 1}, self.customer.pk)
+            # A poller of this loop that is still behind the client's Last-Event-ID
+            subscription, = broadcaster._subscriptions[asyncio.get_running_loop()]
+            for event in (first, seen, latest):
+                subscription.deliver(event)
+            self.assertEqual(await anext(stream), events.encode_event(latest))
+        finally:
+            await stream.aclose()
+
+    async def test_stream_unsubscribes_on_close(self):
+        stream = async_views._event_stream(self.customer, None)
+        await anext(stream)
+        self.assertEqual(sum(map(len, broadcaster._subscriptions.values())), 1)
+        self.assertEqual(len(broadcaster._pollers), 1)
+        await stream.aclose()  # what a client disconnect does
+        self.assertFalse(broadcaster._subscriptions)
+        self.assertFalse(broadcaster._pollers)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get('/api/async/orders/events/', headers={'Accept': 'text/event-stream'})
+        self.assertEqual(response.status_code, 401)
+
+
+@jobs.job('tests.flaky', max_attempts=2)
+def flaky_job(fail):
+    if fail:
+        raise ValueError('boom')
+
+
+class JobQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.item = MenuItem.objects.create(name='Carbonara', price=10, inventory=5, category=category)
+
+    def test_checkout_rolls_up_in_background(self):
+        CartItem.objects.create(user=self.customer, menu_item=self.item, quantity=2, unit_price=10)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        order_id = client.post('/api/orders/').data['id']
+        self.assertFalse(DailySales.objects.exists())
+        self.assertEqual(jobs.run_pending(), 1)
+        sales = DailySales.objects.get()
+        self.assertEqual((sales.orders, sales.quantity, sales.revenue), (1, 2, Decimal('20.00')))
+        # Redelivered (e.g. the worker died before marking it done): counted once
+        jobs.enqueue('orders.roll_up', order_id=order_id)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(DailySales.objects.get().orders, 1)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+    def test_retries_with_back_off_then_fails(self):
+        queued = jobs.enqueue('tests.flaky', fail=True)
+        self.assertEqual(jobs.run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.QUEUED, 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('boom', queued.last_error)
+        self.assertEqual(jobs.run_pending(), 0)  # not due yet
+        Job.objects.update(run_at=timezone.now())
+        jobs.run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+
+    def test_late_worker_leaves_the_new_claim_alone(self):
+        for fail, status in ((False, Job.DONE), (True, Job.FAILED)):  # the second of two attempts
+            with self.subTest(fail=fail):
+                Job.objects.all().delete()
+                jobs.enqueue('tests.flaky', fail=fail)
+                late, = jobs.claim()
+                Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+                current, = jobs.claim()
+                jobs.run(late)  # the first worker finishes after its lease ran out
+                self.assertEqual(Job.objects.values_list('status', 'attempts').get(), (Job.RUNNING, 2))
+                jobs.run(current)
+                self.assertEqual(Job.objects.get().status, status)
+
+    def test_expired_lease_is_redelivered(self):
+        queued = jobs.enqueue('tests.flaky', fail=False)
+        self.assertEqual([claimed.pk for claimed in jobs.claim()], [queued.pk])
+        self.assertEqual(jobs.claim(), [])  # leased
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([(claimed.pk, claimed.attempts) for claimed in jobs.claim()], [(queued.pk, 2)])
+
+
+    def test_lease_lost_on_the_last_attempt(self):
+        queued = jobs.enqueue('tests.flaky', fail=False)
+        for _ in range(2):  # max_attempts, each ending with the worker killed
+            self.assertEqual(len(jobs.claim()), 1)
+            Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim(), [])
+        self.assertEqual(jobs.fail_abandoned(), 1)  # run_jobs' housekeeping
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.locked_until), (Job.FAILED, 2, None))
+        self.assertIn('lease', queued.last_error)
+
+    def test_prune_finished(self):
+        now = timezone.now()
+        old = now - timedelta(seconds=jobs.JOB_RETENTION_SECONDS + 1)
+        for status, finished_at in ((Job.DONE, old), (Job.DONE, old), (Job.FAILED, old), (Job.DONE, now),
+                                    (Job.QUEUED, None), (Job.RUNNING, None)):
+            Job.objects.create(name='tests.flaky', status=status, finished_at=finished_at, run_at=old)
+        with mock.patch.object(jobs, 'PRUNE_BATCH_SIZE', 2):
+            self.assertEqual(jobs.prune_finished(now), 3)
+        self.assertEqual(sorted(Job.objects.values_list('status', flat=True)), [Job.DONE, Job.QUEUED, Job.RUNNING])
+
+class SalesRollupTests(TestCase):
+    """The incremental rollups match a rebuild from the order tables, deletions included."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer = User.objects.create(username='customer')
+        pasta = Category.objects.create(slug='pasta', title='Pasta')
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        cls.items = [MenuItem.objects.create(name='Carbonara', price=10, inventory=50, category=pasta),
+                     MenuItem.objects.create(name='Lasagna', price=12, inventory=50, category=pasta),
+                     MenuItem.objects.create(name='Lemonade', price=3, inventory=50, category=drinks)]
+        cls.orders = []
+        for day, lines in ((1, {0: 2, 2: 1}), (1, {1: 1}), (2, {0: 1, 1: 1, 2: 3}), (2, {2: 2})):
+            order = Order.objects.create(user=cls.customer, total=sum(cls.items[i].price * q for i, q in lines.items()))
+            Order.objects.filter(pk=order.pk).update(date=timezone.make_aware(timezone.datetime(2025, 3, day, 12)))
+            for i, quantity in lines.items():
+                OrderItem.objects.create(order=order, menu_item=cls.items[i], quantity=quantity, unit_price=cls.items[i].price)
+            cls.orders.append(order)
+
+    def rollups(self):
+        return (list(DailySales.objects.order_by('date').values_list('date', 'orders', 'quantity', 'revenue')),
+                list(DailyItemSales.objects.order_by('date', 'menu_item').values_list('date', 'menu_item', 'quantity', 'revenue')),
+                list(DailyCategorySales.objects.order_by('date', 'category').values_list('date', 'category', 'quantity', 'revenue')))
+
+    def roll_up_all(self):
+        for order in self.orders:
+            roll_up_order(order.pk)
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+        return incremental
+
+    def test_record_matches_rebuild(self):
+        self.roll_up_all()
+        days = self.assertMatchesRebuild()[0]
+        self.assertEqual([row[1:] for row in days], [(2, 4, Decimal('35.00')), (2, 7, Decimal('37.00'))])
+
+    def test_deleted_orders_are_subtracted(self):
+        self.roll_up_all()
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.delete(f'/api/orders/{self.orders[1].pk}/').status_code, 204)
+        self.orders[3].delete()  # a stale instance: its date is still the creation time
+        items, categories = self.assertMatchesRebuild()[1:]
+        lasagna_day_one = (date(2025, 3, 1), self.items[1].pk)
+        self.assertNotIn(lasagna_day_one, [row[:2] for row in items])  # emptied rows go
+        self.assertEqual(len(categories), 4)
+        self.customer.delete()
+        self.assertEqual(self.rollups(), ([], [], []))
+
+    def test_unrolled_order_deleted_before_its_job(self):
+        roll_up_order(self.orders[0].pk)
+        before = self.rollups()
+        self.orders[1].delete()
+        roll_up_order(self.orders[1].pk)
+        self.assertEqual(self.rollups(), before)
+
+    def test_analytics_endpoint(self):
+        self.roll_up_all()
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get('/api/analytics/sales/').status_code, 403)
+        client.force_authenticate(self.manager)
+        response = client.get('/api/analytics/sales/').json()
+        self.assertEqual(response['totals'], {'orders': 4, 'quantity': 11, 'revenue': '72.00'})
+        self.assertEqual([(row['date'], row['orders']) for row in response['results']], [('2025-03-01', 2), ('2025-03-02', 2)])
+        response = client.get('/api/analytics/sales/?group_by=item&date_min=2025-03-02').json()
+        self.assertEqual([(row['dish'], row['quantity'], row['revenue']) for row in response['results']],
+                         [('Lemonade', 5, '15.00'), ('Lasagna', 1, '12.00'), ('Carbonara', 1, '10.00')])
+        self.assertEqual(response['totals'], {'quantity': 7, 'revenue': '37.00'})
+        response = client.get('/api/analytics/sales/?group_by=category&date_max=2025-03-01').json()
+        self.assertEqual([(row['category_title'], row['revenue']) for row in response['results']],
+                         [('Pasta', '32.00'), ('Drinks', '3.00')])
+        self.assertEqual(client.get('/api/analytics/sales/?group_by=week').status_code, 400)
+
+
+class SeedingTests(TestCase):
+
+    def test_seed_and_clear(self):
+        ids = seeding.seed(seeding.Scale(customers=3, managers=1, crew=2, categories=2, menu_items=6,
+                                         ratings=10, orders=8))
+        self.assertEqual(len(ids['menu_items']), 6)
+        self.assertEqual(Order.objects.filter(user_id__in=ids['users']['customer']).count(), 8)
+        self.assertEqual(DailySales.objects.aggregate(orders=Sum('orders'))['orders'], 8)
+        self.assertTrue(self.client.login(username='seed-customer-0', password=seeding.SEED_PASSWORD))
+        seeding.clear_seeded()
+        self.assertFalse(seeding.seeded_exists())
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_compare_results(self):
+        def report(p95, queries):
+            return {'results': [{'label': 'GET /api/menu-items/ as anonymous', 'p95_ms': p95, 'queries_max': queries}]}
+        self.assertEqual(compare_results(report(10, 2), report(11.5, 2), 20), [])
+        self.assertEqual(compare_results(report(0.2, 2), report(0.9, 2), 20), [])  # within noise
+        self.assertEqual(len(compare_results(report(10, 2), report(13, 3), 20)), 2)
+
+
+@mock.patch('LittleLemonAPI.database.time.sleep')
+class LockRetryTests(SimpleTestCase):
+    databases = ['default']
+
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        @database.retry_on_lock
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+        return write
+
+    def test_retries_while_locked(self, sleep):
+        self.assertEqual(self.flaky(2)(), 3)
+        self.assertEqual(sleep.call_count, 2)
+        with self.assertRaises(OperationalError):
+            self.flaky(database.LOCK_RETRY_ATTEMPTS)()
+
+    def test_other_errors_and_outer_transactions_are_not_retried(self, sleep):
+        with self.assertRaises(OperationalError):
+            self.flaky(1, 'no such table: x')()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            self.flaky(1)()
+        sleep.assert_not_called()
+
+
+    def test_throttle_checks_are_retried(self, sleep):
+        bucket = mock.MagicMock()
+        bucket.filter.return_value.update.return_value = 1  # a token was taken
+        with mock.patch.object(ThrottleBucket.objects, 'filter',
+                               side_effect=[OperationalError('database is locked'), bucket]) as filter_buckets:
+            self.assertEqual(consume('bucket', 2, 60, 1000.0), (True, None))
+        self.assertEqual((filter_buckets.call_count, sleep.call_count), (2, 1))
+
+@mock.patch.object(replicas, 'replica_alias', return_value='replica')
+class ReplicaRouterTests(SimpleTestCase):
+    """Which database each read goes to; the test mirror itself is never read."""
+
+    def setUp(self):
+        cache.clear()
+        self.router = replicas.ReplicaRouter()
+        self.factory = APIRequestFactory()
+
+    def read_db(self, model, method='get', user=None):
+        request = getattr(self.factory, method)('/api/orders/')
+        request.user = user or AnonymousUser()
+        return replicas.ReplicaMiddleware(lambda request: self.router.db_for_read(model))(request)
+
+    def test_safe_reads_of_replicated_models(self, replica_alias):
+        self.assertEqual(self.read_db(Order), 'replica')
+        self.assertEqual(self.read_db(User), 'default')
+        self.assertEqual(self.read_db(Order, 'post'), 'default')
+        self.assertEqual(self.router.db_for_read(Order), 'default')  # outside a request
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def test_writer_is_pinned_to_primary(self, replica_alias):
+        customer, other = User(pk=1, username='customer'), User(pk=2, username='other')
+        self.read_db(Order, 'post', customer)
+        self.assertEqual(self.read_db(Order, user=customer), 'default')
+        self.assertEqual(self.read_db(Order, user=other), 'replica')
+
+    def test_catalog_reads_primary_after_catalog_write(self, replica_alias):
+        bump_catalog_version()
+        self.assertEqual(self.read_db(MenuItem), 'default')
+        self.assertEqual(self.read_db(Order), 'replica')
+        cache.set('catalog:version', time.time_ns() - replicas.REPLICA_PIN_SECONDS * 10 ** 9, None)
+        self.assertEqual(self.read_db(MenuItem), 'replica')
+
+
+class ReplicaSettingsTests(SimpleTestCase):
+
+    def test_enabled_and_recently_synced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica = {**connections.settings['default'], 'NAME': os.path.join(directory, 'replica.sqlite3')}
+            with mock.patch.dict(connections.settings, {'replica': replica}):
+                replicas.record_sync(replica, time.time())
+                self.assertIsNone(replicas.replica_alias())
+                with self.settings(READ_REPLICA_ENABLED=True):
+                    self.assertEqual(replicas.replica_alias(), 'replica')
+                    replicas.record_sync(replica, time.time() - replicas.REPLICA_PIN_SECONDS - 1)
+                    self.assertIsNone(replicas.replica_alias())
+
+    @override_settings(READ_REPLICA_ENABLED=True)
+    def test_needs_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            replicas.ReplicaMiddleware(lambda request: None)
+        with self.settings(CACHES=SHARED_CACHES):
+            replicas.ReplicaMiddleware(lambda request: None)
+
+
+class SparseFieldsetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='pasta', title='Pasta')
+        cls.item = MenuItem.objects.create(name='Dish', price='10.00', inventory=5, category=category)
+        cls.order = Order.objects.create(user=cls.customer, total='20.00')
+        OrderItem.objects.create(order=cls.order, menu_item=cls.item, quantity=2, unit_price=10)
+        CartItem.objects.create(user=cls.customer, menu_item=cls.item, quantity=2, unit_price=10)
+
+    def get_sql(self, path, user=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.assertQueryBudget(5, path, user=user)
+        return response, ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_menu_items(self):
+        response, sql = self.get_sql('/api/menu-items/?fields=id,dish,price')
+        self.assertEqual(response.data['results'], [{'id': self.item.pk, 'dish': 'Dish', 'price': '10.00'}])
+        self.assertNotIn('category', sql)
+        response, sql = self.get_sql(f'/api/menu-items/{self.item.pk}/?fields=dish&expand=category')
+        self.assertEqual(response.data, {'dish': 'Dish', 'category': {'id': self.item.category_id, 'name': 'Pasta'}})
+        self.assertNotIn('"inventory"', sql)
+
+    def test_cart_and_orders(self):
+        response, sql = self.get_sql('/api/cart/menu-items/?fields=quantity,total_price', self.customer)
+        self.assertEqual(response.data, [{'quantity': 2, 'total_price': Decimal('20.00')}])
+        self.assertNotIn('JOIN "LittleLemonAPI_menuitem"', sql)
+        response, sql = self.get_sql('/api/orders/?fields=id,total', self.customer)
+        self.assertEqual(response.data['results'], [{'id': self.order.pk, 'total': '20.00'}])
+        self.assertNotIn('orderitem', sql)
+        response, sql = self.get_sql(f'/api/orders/{self.order.pk}/?fields=status&expand=items', self.customer)
+        self.assertEqual(list(response.data), ['status', 'items'])
+        self.assertNotIn('"auth_user"."username"', sql)
+
+    def test_unknown_fields(self):
+        response = self.client.get('/api/menu-items/?fields=id,colour&expand=items')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
@@ -1,4 +1,102 @@
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+"""API throttles on a shared token bucket.
+
+DRF's throttles keep a list of request timestamps per client in the cache:
+the default LocMemCache is per process, so every worker allows the full rate,
+and each check rewrites the whole list. These classes keep DRF's names,
+scopes, rates (REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']) and cache keys, but
+store one token bucket per client in the ThrottleBucket table. All workers
+share it, and a check is a single conditional UPDATE.
+
+A rate of N/period gives a bucket of N tokens that refills at N per period,
+so a client may burst N requests and then sustain the rate. A bucket left
+alone for a whole period is full again, the same as no bucket at all;
+``manage.py prune_throttle_buckets`` deletes those (prune_buckets()).
+"""
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+from .database import retry_on_lock
+from .models import ThrottleBucket
+
+
+@retry_on_lock
+def consume(key, capacity, duration, now):
+    """Take one token from bucket ``key``; return (allowed, seconds until the next token).
+
+    Every check writes, so a locked database is retried like the other writes.
+    """
+    refill_rate = capacity / duration
+    available = Least(Value(float(capacity)), F('tokens') + (Value(now) - F('updated')) * Value(refill_rate))
+    bucket = ThrottleBucket.objects.filter(key=key)
+    if bucket.filter(GreaterThanOrEqual(available, Value(1.0))).update(tokens=available - Value(1.0), updated=Value(now)):
+        return True, None
+
+    state = bucket.values_list('tokens', 'updated').first()
+    if state is None:
+        try:
+            with transaction.atomic():
+                ThrottleBucket.objects.create(key=key, tokens=capacity - 1, updated=now)
+            return True, None
+        except IntegrityError:
+            # Another worker created the bucket first
+            return consume(key, capacity, duration, now)
+    tokens, updated = state
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    return False, max(0.0, (1 - tokens) / refill_rate)
+
+
+# Deleted per statement, so throttle checks never wait long for the write lock
+PRUNE_BATCH_SIZE = 1000
+
+
+def longest_period():
+    """Seconds in the longest period of REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']."""
+    # parse_rate() doesn't use the throttle instance
+    rates = [rate for rate in api_settings.DEFAULT_THROTTLE_RATES.values() if rate]
+    return max((throttling.SimpleRateThrottle.parse_rate(None, rate)[1] for rate in rates), default=0)
+
+
+def prune_buckets(now=None):
+    """Delete the buckets untouched for longer than any throttle period (they are full). Returns how many."""
+    cutoff = (time.time() if now is None else now) - longest_period()
+    stale = ThrottleBucket.objects.filter(updated__lt=cutoff)
+    deleted = 0
+    while True:
+        count, _ = ThrottleBucket.objects.filter(pk__in=list(stale.values_list('pk', flat=True)[:PRUNE_BATCH_SIZE])).delete()
+        deleted += count
+        if count < PRUNE_BATCH_SIZE:
+            return deleted
+
+
+class SharedBucketMixin:
+    """Replaces SimpleRateThrottle's cache history with consume()."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self.wait_seconds = consume(self.key, self.num_requests, self.duration, self.timer())
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonRateThrottle(SharedBucketMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SharedBucketMixin, throttling.UserRateThrottle):
+    pass
+
 
 class TenCallsPerMinuteUserThrottle(UserRateThrottle):
-    scope = 'ten' #This scope is put in the settings.py file
\ No newline at end of file
+    scope = 'ten' #This scope is put in the settings.py file
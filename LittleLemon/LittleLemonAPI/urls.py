@@ -1,11 +1,13 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 from rest_framework.authtoken.views import obtain_auth_token
 
 urlpatterns = [
     path('categories/', views.CategoriesView.as_view()),
     path('menu-items/', views.MenuItemsView.as_view()),
     path('menu-items/<int:pk>/', views.SingleItemView.as_view()),
+    path('menu-items/import/', views.menu_items_import),
+    path('menu-items/export/', views.menu_items_export),
     path('menu-items/item-of-the-day/', views.item_of_the_day),
     path('menu-items/item-of-the-day/set/', views.set_item_of_the_day),
     path('categories/<int:pk>/', views.SingleCategoryView.as_view()),
@@ -21,7 +23,21 @@ urlpatterns = [
     path('groups/delivery-crew/users/<int:user_id>/', views.delivery_crew_user_detail),
     path('ratings/', views.RatingsView.as_view()),
     path('cart/menu-items/', views.CartItemsView.as_view()),
+    path('cart/menu-items/bulk/', views.cart_bulk_add),
     path('cart/menu-items/<int:pk>/', views.CartItemDetailView.as_view()),
     path('orders/', views.OrdersView.as_view()),
+    path('orders/export/', views.orders_export),
+    path('orders/dispatch/', views.orders_dispatch),
     path('orders/<int:pk>/', views.OrderDetailView.as_view()),
+    path('analytics/sales/', views.sales_analytics),
+    path('metrics/', views.metrics),
+    # Async (ASGI) versions of the read-heavy endpoints; same auth, permissions and JSON
+    path('async/menu-items/', async_views.menu_items),
+    path('async/menu-items/<int:pk>/', async_views.single_item),
+    path('async/menu-items/item-of-the-day/', async_views.item_of_the_day),
+    path('async/categories/', async_views.categories),
+    path('async/cart/menu-items/', async_views.cart_items),
+    path('async/orders/', async_views.orders),
+    path('async/orders/<int:pk>/', async_views.order_detail),
+    path('async/orders/events/', async_views.order_events),
 ]
\ No newline at end of file
@@ -1,19 +1,45 @@
+from functools import reduce
+from operator import or_
+
 from django.shortcuts import get_object_or_404, render
+from django.db import transaction
+from django.db.models import F, Q
 from rest_framework import generics
 from django_filters import rest_framework as filters
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from rest_framework.filters import OrderingFilter
 from .models import MenuItem, Category, Rating
 from .serializers import MenuItemSerializer, SingleItemSerializer, RatingSerializer
 from .serializers import CategorySerializer
 from .permissions import IsManagerOrAdminOrReadOnly, IsManagerOrAdmin, IsCustomer
 from .pagination import MenuItemsPagination
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from .caching import CatalogCacheMixin, cached_catalog_response, bump_catalog_version
+from .conditional import make_etag, not_modified_response, set_validators
+from .search import MenuItemSearchFilter
+from .fast_serializers import menu_item_rows, serialize_menu_items, order_rows, serialize_orders, order_items_prefetch
+from .fast_serializers import MENU_ITEM_FIELDSET, ORDER_FIELDSET
+from .fieldsets import SparseFieldsetMixin
+from .roles import MANAGER, get_roles, invalidate_roles, is_manager, is_delivery_crew
+from rest_framework.decorators import api_view, permission_classes, throttle_classes, renderer_classes
+from .renderers import CSVRenderer, NDJSONRenderer, PrometheusRenderer
+from .metrics import render_metrics
+from .jobs import enqueue_checkout_jobs
+from .dispatch import engine as dispatch_engine, NoDeliveryCrew
+from .events import new_event, publish, publish_order_event
+from .cart import CART_ITEM_FIELDSET, add_to_cart, cart_summary, summary_from_lines, with_cart_totals
+from .bulk import import_menu_items, export_menu_items, export_orders, parse_rows
+from .database import retry_on_lock
+from django.http import StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from .throttles import TenCallsPerMinuteUserThrottle
+from .throttles import AnonRateThrottle, UserRateThrottle, TenCallsPerMinuteUserThrottle
 from django.contrib.auth.models import User, Group
 from .models import CartItem, Order, OrderItem
-from .serializers import CartItemSerializer, OrderReadSerializer, ManagerOrderUpdateSerializer, DeliveryCrewOrderUpdateSerializer
+from .serializers import CartItemSerializer, CartLineSerializer, CartSummarySerializer, OrderReadSerializer, ManagerOrderUpdateSerializer, DeliveryCrewOrderUpdateSerializer
+from .serializers import SalesAnalyticsQuerySerializer, DispatchSerializer
+from .models import DailySales, DailyItemSales, DailyCategorySales
+from django.db.models import Sum
 
 # Custom filter for MenuItem with range filters
 class MenuItemFilterView(filters.FilterSet):
@@ -21,6 +47,9 @@ class MenuItemFilterView(filters.FilterSet):
     price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
     inventory_min = filters.NumberFilter(field_name='inventory', lookup_expr='gte')
     inventory_max = filters.NumberFilter(field_name='inventory', lookup_expr='lte')
+    rating_min = filters.NumberFilter(field_name='rating_avg', lookup_expr='gte')
+    rating_max = filters.NumberFilter(field_name='rating_avg', lookup_expr='lte')
+    rating_count_min = filters.NumberFilter(field_name='rating_count', lookup_expr='gte')
     '''This does not filter; it's only to show an input in the browsable API so users can set the paginator page size via ?number_pages='''
     number_pages = filters.NumberFilter(method='noop', label='Items per page')
     
@@ -47,28 +76,95 @@ class OrderFilterView(filters.FilterSet):
         model = Order
         fields = ['status', 'user', 'delivery_crew']
 
+# Request body media types accepted by the bulk import endpoints
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
 # Create your views here.
-class MenuItemsView(generics.ListCreateAPIView):
-    queryset = MenuItem.objects.all()
+class FastListMixin(SparseFieldsetMixin):
+    """list() through fast_serializers: values() rows instead of model instances.
+
+    ``fast_rows`` turns the filtered queryset into rows and ``fast_serialize``
+    renders a page of them exactly like ``serializer_class`` would; both take
+    the requested ?fields=.
+    """
+    fast_rows = None
+    fast_serialize = None
+
+    def list(self, request, *args, **kwargs):
+        fields = self.sparse_fields()
+        queryset = self.fast_rows(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serialize(page, fields))
+        return Response(self.fast_serialize(queryset, fields))
+
+
+class MenuItemsView(CatalogCacheMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     pagination_class = MenuItemsPagination
     filterset_class = MenuItemFilterView  # Use custom filter
-    ordering_fields = ['price', 'inventory', 'id']  # Allows ordering by price, inventory, or id
-    search_fields = ['name']  # Allows text search in the name of the dish
+    ordering_fields = ['price', 'inventory', 'id', 'rating_avg', 'rating_count']  # Allows ordering by price, inventory, id or rating
+    ordering = ['id']  # Default ordering, also the keyset for ?pagination=cursor
+    search_fields = ['name']  # Allows text search in the name of the dish (LIKE fallback when FTS5 is unavailable)
+    filter_backends = [OrderingFilter, MenuItemSearchFilter, DjangoFilterBackend]  # Full-text ?search=
     permission_classes = [IsManagerOrAdminOrReadOnly]
+    fieldset = MENU_ITEM_FIELDSET
+    live_fields = True
+    fast_rows = staticmethod(menu_item_rows)
+    fast_serialize = staticmethod(serialize_menu_items)
     
-class SingleItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+class SingleItemView(CatalogCacheMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = SingleItemSerializer
+    # No pagination here, so no ordering columns to read
+    fieldset = MENU_ITEM_FIELDSET.subset('id', 'dish', 'price', 'category', 'stock', 'is_item_of_the_day', required=('id',))
+    live_fields = True
     permission_classes = [IsManagerOrAdminOrReadOnly]
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+def menu_items_import(request):
+    """Manager/Admin endpoint: bulk create/update menu items from a streamed body.
+
+    Content-Type: text/csv (header row) or application/x-ndjson (one object per line).
+    Columns: dish, price, stock, category_id. Existing dishes (same name,
+    case-insensitive) are updated. Valid rows are saved even if others fail;
+    the response lists errors by line number.
+    """
+    content_type = request.content_type.split(';')[0].strip()
+    fmt = IMPORT_FORMATS.get(content_type)
+    if fmt is None:
+        return Response({'detail': f'Unsupported media type "{content_type}". Use text/csv or application/x-ndjson.'}, status=415)
+    result = import_menu_items(parse_rows(request.stream or [], fmt))
+    return Response(result, status=200)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+@renderer_classes([CSVRenderer, NDJSONRenderer])
+def menu_items_export(request):
+    """Manager/Admin endpoint: stream the whole catalog as CSV (default) or NDJSON (?format=ndjson)."""
+    fmt = request.accepted_renderer.format
+    response = StreamingHttpResponse(export_menu_items(fmt), content_type=request.accepted_renderer.media_type)
+    response['Content-Disposition'] = f'attachment; filename="menu-items.{fmt}"'
+    return response
+
 @api_view(['GET'])
 def item_of_the_day(request):
     """Public endpoint: returns the current item of the day or 404 if none set."""
-    item = MenuItem.objects.filter(is_item_of_the_day=True).first()
-    if not item:
+    return cached_catalog_response(request, _item_of_the_day_response, live=True)
+
+def _item_of_the_day_response():
+    # Unordered on purpose: ORDER BY id would make SQLite scan the table
+    # instead of the partial index that only holds the flagged row
+    items = list(MenuItem.objects.filter(is_item_of_the_day=True).select_related('category')[:1])
+    if not items:
         return Response({'detail': 'No item of the day set.'}, status=404)
-    return Response(MenuItemSerializer(item).data)
+    return Response(MenuItemSerializer(items[0]).data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsManagerOrAdmin])
@@ -90,14 +186,16 @@ def set_item_of_the_day(request):
     MenuItem.objects.filter(is_item_of_the_day=True).update(is_item_of_the_day=False)
     item.is_item_of_the_day = True
     item.save(update_fields=['is_item_of_the_day'])
+    # The bulk update() above does not send post_save, so invalidate explicitly
+    bump_catalog_version()
     return Response(MenuItemSerializer(item).data, status=200)
     
-class CategoriesView(generics.ListCreateAPIView):
+class CategoriesView(CatalogCacheMixin, generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsManagerOrAdminOrReadOnly]
     
-class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCategoryView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsManagerOrAdminOrReadOnly]
@@ -111,7 +209,7 @@ def secret_view(request):
 @api_view()
 @permission_classes([IsAuthenticated])
 def manager_view(request):
-    if(request.user.groups.filter(name='Manager').exists()):
+    if MANAGER in get_roles(request.user):
         return Response({"message": "Some manager message for authenticated users only."})
     return Response({"message": "You do not have permission to view this."}, status=403)
 
@@ -149,6 +247,7 @@ def manager_users(request):
         return Response({"detail": "username is required"}, status=400)
     user = get_object_or_404(User, username=username)
     group.user_set.add(user)
+    invalidate_roles(user.id)
     return Response({"message": "Created", "user": {"id": user.id, "username": user.username}}, status=201)
 
 
@@ -159,6 +258,7 @@ def manager_user_detail(request, user_id: int):
     group, _ = Group.objects.get_or_create(name='Manager')
     user = get_object_or_404(User, pk=user_id)
     group.user_set.remove(user)
+    invalidate_roles(user.id)
     return Response({"message": "Success"}, status=200)
 
 
@@ -176,6 +276,7 @@ def delivery_crew_users(request):
         return Response({"detail": "username is required"}, status=400)
     user = get_object_or_404(User, username=username)
     group.user_set.add(user)
+    invalidate_roles(user.id)
     return Response({"message": "Created", "user": {"id": user.id, "username": user.username}}, status=201)
 
 
@@ -186,11 +287,13 @@ def delivery_crew_user_detail(request, user_id: int):
     group, _ = Group.objects.get_or_create(name='Delivery Crew')
     user = get_object_or_404(User, pk=user_id)
     group.user_set.remove(user)
+    invalidate_roles(user.id)
     return Response({"message": "Success"}, status=200)
 
 class RatingsView(generics.ListCreateAPIView):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
+    filterset_fields = ['menu_item']
     
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -198,19 +301,33 @@ class RatingsView(generics.ListCreateAPIView):
         return [IsAuthenticated()]
 
 
-class CartItemsView(generics.ListCreateAPIView):
+class CartItemsView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """Authenticated users manage their own cart items.
 
-    - GET: list current user's cart items
+    - GET: list current user's cart items (?fields=id,dish,quantity for fewer fields)
+      ?summary=true adds the cart totals: {"items": [...], "summary": {...}}
+      ?summary=only returns just the totals (item_count, total_quantity, subtotal)
     - POST: add an item {menu_item_id, quantity}
     - DELETE: remove ALL items from the current user's cart
     """
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
+    fieldset = CART_ITEM_FIELDSET
 
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user).select_related('menu_item')
 
+    def list(self, request, *args, **kwargs):
+        mode = cart_summary_mode(request)
+        if mode is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if mode == 'only':
+            return Response(CartSummarySerializer(cart_summary(queryset)).data)
+        # Lines and totals in one query: the totals ride along as window columns
+        lines = list(with_cart_totals(queryset))
+        return Response(cart_with_summary(self.get_serializer(lines, many=True).data, summary_from_lines(lines)))
+
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
         ctx['request'] = self.request
@@ -227,103 +344,229 @@ class CartItemsView(generics.ListCreateAPIView):
         return Response({"message": "Cart cleared", "deleted_items": deleted}, status=200)
 
 
-class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
+def cart_summary_mode(request):
+    """'only', 'include' or None (plain list) from ?summary=."""
+    value = request.query_params.get('summary', '').lower()
+    if value == 'only':
+        return 'only'
+    return 'include' if value in ('1', 'true', 'yes') else None
+
+
+def cart_with_summary(items, summary):
+    return {'items': items, 'summary': CartSummarySerializer(summary).data}
+
+
+class CartItemDetailView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update quantity, or delete a cart item of the current user."""
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
+    fieldset = CART_ITEM_FIELDSET
 
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user).select_related('menu_item')
 
 
+CART_BULK_MAX_LINES = 500
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsCustomer])
+def cart_bulk_add(request):
+    """Customer endpoint: add many lines to the cart at once, return the updated cart.
+
+    Body: [{ "menu_item_id": <id>, "quantity": <n> }, ...]
+    Quantities are added to existing lines (repeated ids are summed). Nothing is
+    written if any line is invalid or names an unknown menu item.
+    """
+    serializer = CartLineSerializer(data=request.data, many=True, allow_empty=False, max_length=CART_BULK_MAX_LINES)
+    serializer.is_valid(raise_exception=True)
+    lines = serializer.validated_data
+    quantities = {}
+    for line in lines:
+        quantities[line['menu_item_id']] = quantities.get(line['menu_item_id'], 0) + line['quantity']
+    prices = dict(MenuItem.objects.filter(pk__in=quantities).values_list('id', 'price'))
+    if len(prices) < len(quantities):
+        errors = [
+            {'menu_item_id': [f'Invalid pk "{line["menu_item_id"]}" - object does not exist.']}
+            if line['menu_item_id'] not in prices else {}
+            for line in lines
+        ]
+        return Response(errors, status=400)
+    add_to_cart(request.user, quantities, prices)
+    cart = CartItem.objects.filter(user=request.user).select_related('menu_item').order_by('id')
+    return Response(CartItemSerializer(cart, many=True, context={'request': request}).data, status=200)
+
+
 def _is_manager(user):
-    return user.is_superuser or user.groups.filter(name='Manager').exists()
+    return is_manager(user)
 
 
 def _is_delivery(user):
-    return user.groups.filter(name='DeliveryCrew').exists()
+    return is_delivery_crew(user)
 
 
-class OrdersView(generics.ListCreateAPIView):
+class OrdersView(FastListMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderReadSerializer
+    fieldset = ORDER_FIELDSET
     pagination_class = MenuItemsPagination
     filterset_class = OrderFilterView
     ordering_fields = ['total', 'date', 'status']
+    ordering = ['-date']  # Newest first (OrderingFilter); also the keyset for ?pagination=cursor
     search_fields = ['user__username', 'delivery_crew__username']
+    fast_rows = staticmethod(order_rows)
+    fast_serialize = staticmethod(serialize_orders)
 
     def get_queryset(self):
         user = self.request.user
         if _is_manager(user):
-            return Order.objects.all().prefetch_related('items__menu_item', 'user', 'delivery_crew')
+            return Order.objects.all().select_related('user', 'delivery_crew').prefetch_related(order_items_prefetch())
         if _is_delivery(user):
-            return Order.objects.filter(delivery_crew=user).prefetch_related('items__menu_item', 'user', 'delivery_crew')
+            return Order.objects.filter(delivery_crew=user).select_related('user', 'delivery_crew').prefetch_related(order_items_prefetch())
         # customer
-        return Order.objects.filter(user=user).prefetch_related('items__menu_item', 'user', 'delivery_crew')
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset().order_by('-date'))
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Order.objects.filter(user=user).select_related('user', 'delivery_crew').prefetch_related(order_items_prefetch())
 
     def create(self, request, *args, **kwargs):
         # Only customers can create orders from their cart
         user = request.user
         if _is_manager(user) or _is_delivery(user):
             return Response({"detail": "Only customers can create orders."}, status=403)
-        cart_items = CartItem.objects.filter(user=user).select_related('menu_item')
-        if not cart_items.exists():
+        try:
+            order = _place_order(user)
+        except _EmptyCart:
             return Response({"detail": "Cart is empty."}, status=400)
-        # Create order
-        order = Order.objects.create(user=user, status=0, total=0)
-        order_items = []
-        total = 0
-        for ci in cart_items:
-            oi = OrderItem(order=order, menu_item=ci.menu_item, quantity=ci.quantity, unit_price=ci.unit_price)
-            order_items.append(oi)
-            total += ci.unit_price * ci.quantity
-        OrderItem.objects.bulk_create(order_items)
-        order.total = total
-        order.save()
-        # Clear cart
-        cart_items.delete()
+        except _OutOfStock as exc:
+            return Response({"detail": "Not enough stock.", "menu_items": exc.menu_item_ids}, status=409)
         return Response(OrderReadSerializer(order).data, status=201)
 
 
-class OrderDetailView(generics.GenericAPIView):
+class _EmptyCart(Exception):
+    pass
+
+
+class _OutOfStock(Exception):
+    def __init__(self, menu_item_ids):
+        super().__init__(menu_item_ids)
+        self.menu_item_ids = menu_item_ids
+
+
+@retry_on_lock
+def _place_order(user):
+    with transaction.atomic():
+        return _checkout(user)
+
+
+def _checkout(user):
+    """Turn the user's cart into an order. Must run inside transaction.atomic().
+
+    Stock is reserved with conditional UPDATEs (inventory >= quantity), so two
+    concurrent checkouts can never oversell; any shortage raises _OutOfStock and
+    rolls the whole checkout back. The order is written once, with its final total,
+    together with its order.created event (events.py).
+    """
+    cart_items = list(CartItem.objects.filter(user=user).select_related('menu_item'))
+    if not cart_items:
+        raise _EmptyCart()
+    total = 0
+    short = []
+    for ci in cart_items:
+        total += ci.unit_price * ci.quantity
+        reserved = MenuItem.objects.filter(pk=ci.menu_item_id, inventory__gte=ci.quantity).update(inventory=F('inventory') - ci.quantity)
+        if not reserved:
+            short.append(ci.menu_item_id)
+    if short:
+        raise _OutOfStock(short)
+    order = Order.objects.create(user=user, status=0, total=total)
+    order_items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, menu_item=ci.menu_item, quantity=ci.quantity, unit_price=ci.unit_price)
+        for ci in cart_items
+    ])
+    # Rollups and other post-order work run in the job worker (manage.py run_jobs)
+    enqueue_checkout_jobs(order)
+    # Only the lines we ordered, as we read them. A line added or topped up
+    # meanwhile stays in the cart, so no quantity is dropped without being ordered
+    CartItem.objects.filter(reduce(or_, (Q(pk=ci.pk, quantity=ci.quantity) for ci in cart_items))).delete()
+    # No catalog version bump: stock is a live field (caching.py)
+    publish_order_event('created', order)
+    # Serialize the response from memory instead of re-reading the order
+    order._prefetched_objects_cache = {'items': order_items}
+    return order
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+@renderer_classes([CSVRenderer, NDJSONRenderer])
+def orders_export(request):
+    """Manager/Admin endpoint: stream orders and their lines as CSV (default) or NDJSON (?format=ndjson).
+
+    Accepts the same filters as OrdersView (OrderFilterView): status, user,
+    delivery_crew, total_min/total_max, date_min/date_max.
+    """
+    filterset = OrderFilterView(request.query_params, queryset=Order.objects.all(), request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    fmt = request.accepted_renderer.format
+    response = StreamingHttpResponse(export_orders(filterset.qs, fmt), content_type=request.accepted_renderer.media_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+    return response
+
+
+def can_view_order(user, user_id, delivery_crew_id):
+    # Ownership first: it needs no role lookup
+    return user_id == user.id or _is_manager(user) or (_is_delivery(user) and delivery_crew_id == user.id)
+
+
+def order_validators(pk, updated_at):
+    """(ETag, Last-Modified timestamp) of orders/<pk>/, from Order.updated_at alone."""
+    return make_etag('order', pk, updated_at.isoformat()), updated_at.timestamp()
+
+
+class OrderDetailView(SparseFieldsetMixin, generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderReadSerializer
+    fieldset = ORDER_FIELDSET
 
-    def get_object(self, pk):
-        return get_object_or_404(Order.objects.prefetch_related('items__menu_item', 'user', 'delivery_crew'), pk=pk)
+    def get_object(self, pk, fields=None):
+        queryset = Order.objects.select_related('user', 'delivery_crew').prefetch_related(order_items_prefetch())
+        return get_object_or_404(ORDER_FIELDSET.narrow(queryset, fields), pk=pk)
 
     def get(self, request, pk: int):
-        order = self.get_object(pk)
         user = request.user
-        if _is_manager(user) or (_is_delivery(user) and order.delivery_crew_id == user.id) or (order.user_id == user.id):
-            return Response(OrderReadSerializer(order).data)
-        return Response({"detail": "Not found."}, status=404)
+        fields = self.sparse_fields()
+        revalidating = 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+        if revalidating:
+            # Access check and validators from one narrow lookup, so a 304 never loads the order
+            order = None
+            user_id, delivery_crew_id, updated_at = get_object_or_404(
+                Order.objects.values_list('user_id', 'delivery_crew_id', 'updated_at'), pk=pk)
+        else:
+            order = self.get_object(pk, fields)
+            user_id, delivery_crew_id, updated_at = order.user_id, order.delivery_crew_id, order.updated_at
+        if not can_view_order(user, user_id, delivery_crew_id):
+            return Response({"detail": "Not found."}, status=404)
+        etag, last_modified = order_validators(pk, updated_at)
+        not_modified = not_modified_response(request, etag, last_modified, private=True)
+        if not_modified is not None:
+            return not_modified
+        response = Response(OrderReadSerializer(order or self.get_object(pk, fields), context={'fields': fields}).data)
+        return set_validators(request, response, etag, last_modified, private=True)
 
     def patch(self, request, pk: int):
         order = self.get_object(pk)
         user = request.user
+        previous_crew_id = order.delivery_crew_id
         if _is_manager(user):
             serializer = ManagerOrderUpdateSerializer(order, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(OrderReadSerializer(order).data)
-        if _is_delivery(user):
+        elif _is_delivery(user):
             if order.delivery_crew_id != user.id:
                 return Response({"detail": "This order is not assigned to you."}, status=403)
             serializer = DeliveryCrewOrderUpdateSerializer(order, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
+        else:
+            return Response({"detail": "Forbidden"}, status=403)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
             serializer.save()
-            return Response(OrderReadSerializer(order).data)
-        return Response({"detail": "Forbidden"}, status=403)
+            publish_order_event('updated', order, previous_crew_id)
+        return Response(OrderReadSerializer(order).data)
 
     def put(self, request, pk: int):
         # Treat PUT like manager full update of allowed fields
@@ -333,5 +576,81 @@ class OrderDetailView(generics.GenericAPIView):
         order = self.get_object(pk)
         if not _is_manager(request.user):
             return Response({"detail": "Forbidden"}, status=403)
-        order.delete()
-        return Response(status=204)
\ No newline at end of file
+        event = new_event('order.deleted', {'id': order.pk}, order.user_id, (order.delivery_crew_id,))
+        with transaction.atomic():
+            order.delete()
+            publish(event)
+        return Response(status=204)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+def orders_dispatch(request):
+    """Manager/Admin endpoint: assign unassigned open orders to the delivery crew in one batch.
+
+    Body (optional): { "limit": <n> } (default 200, max 500). Oldest orders go first,
+    each to the crew member with the fewest open orders. Call again while
+    "assigned" equals the limit to drain the queue.
+    """
+    query = DispatchSerializer(data=request.data)
+    query.is_valid(raise_exception=True)
+    try:
+        assignments, crew = dispatch_engine.dispatch(query.validated_data['limit'])
+    except NoDeliveryCrew:
+        return Response({'detail': 'There are no delivery crew members to assign orders to.'}, status=400)
+    return Response({
+        'assigned': len(assignments),
+        'assignments': [{'order': order_id, 'delivery_crew': crew[member]} for order_id, member in assignments],
+        'load': {crew[member]: dispatch_engine.load[member] for member in sorted(crew, key=crew.get)},
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+def sales_analytics(request):
+    """Manager/Admin endpoint: sales for a date range, answered from the daily rollups.
+
+    Query params: date_min, date_max (YYYY-MM-DD, inclusive), group_by=day|item|category (default day).
+    New orders are counted once their roll-up job has run; deleted orders are taken out.
+    """
+    query = SalesAnalyticsQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    group_by = params['group_by']
+    model = {'day': DailySales, 'item': DailyItemSales, 'category': DailyCategorySales}[group_by]
+    rows = model.objects.all()
+    if params.get('date_min'):
+        rows = rows.filter(date__gte=params['date_min'])
+    if params.get('date_max'):
+        rows = rows.filter(date__lte=params['date_max'])
+
+    if group_by == 'day':
+        results = list(rows.order_by('date').values('date', 'orders', 'quantity', 'revenue'))
+        totals = rows.aggregate(orders=Sum('orders'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+    elif group_by == 'item':
+        results = list(rows.values('menu_item_id', dish=F('menu_item__name'))
+                       .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue', 'menu_item_id'))
+        totals = rows.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+    else:
+        results = list(rows.values('category_id', category_title=F('category__title'))
+                       .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue', 'category_id'))
+        totals = rows.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+    totals = {name: value or 0 for name, value in totals.items()}
+    # Money as fixed-point strings, like the DecimalFields of the other endpoints
+    for row in [totals, *results]:
+        row['revenue'] = f"{row['revenue']:.2f}"
+    return Response({
+        'date_min': params.get('date_min'),
+        'date_max': params.get('date_max'),
+        'group_by': group_by,
+        'totals': totals,
+        'results': results,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManagerOrAdmin])
+@renderer_classes([PrometheusRenderer])
+def metrics(request):
+    """Per-endpoint latency, query and render time histograms (see metrics.py) for Prometheus."""
+    return Response(render_metrics())